@@ -0,0 +1,159 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+import discord
+from discord import app_commands
+
+from metrics import COMMANDS_THROTTLED, READS_COALESCED
+
+T = TypeVar("T")
+
+
+class RateLimiter:
+    """
+    Token buckets per key, e.g. per user.
+
+    Every key may make `rate` calls at once, and gets back one call every `per / rate` seconds. Checking a call is
+    O(1). Only the most recently used `max_keys` buckets are kept, a dropped bucket starts over full, which is what
+    it would have refilled to anyway unless its user is still calling.
+    """
+
+    def __init__(self, rate: int, per: float, max_keys: int = 10_000) -> None:
+        """
+        Initializes an instance of the RateLimiter.
+
+        Args:
+            rate (int): The number of calls allowed at once, the bucket size.
+            per (float): Seconds it takes an empty bucket to refill.
+            max_keys (int): The maximum number of buckets kept.
+        """
+        self.rate = rate
+        self.per = per
+        self.max_keys = max_keys
+        # key -> (tokens left, time of the last update)
+        self._buckets: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def retry_after(self, key: Hashable) -> float:
+        """
+        Takes a token from a key's bucket if one is left.
+
+        Args:
+            key (Hashable): The key, e.g. a user ID.
+
+        Returns:
+            float: 0.0 if the call is allowed, otherwise the seconds until the next token.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.rate, now))
+        tokens = min(self.rate, tokens + (now - updated) * self.rate / self.per)
+        retry = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry = (1 - tokens) * self.per / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry
+
+
+def parse_rate(value: str) -> Optional[Tuple[int, float]]:
+    """
+    Parses a rate limit written as "calls/seconds", e.g. "5/10".
+
+    Args:
+        value (str): The rate limit, "0" or an empty string for no limit.
+
+    Returns:
+        Optional[Tuple[int, float]]: The calls and seconds, or None for no limit.
+    """
+    calls, _, seconds = value.partition("/")
+    if not calls.strip() or int(calls) <= 0:
+        return None
+    return int(calls), float(seconds or 1)
+
+
+def rate_limit(env: str = "READ_RATE_LIMIT", default: str = "5/10") -> Callable[[T], T]:
+    """
+    App command check limiting how often each user may run the command, configured by an environment variable.
+
+    A throttled call fails with app_commands.CommandOnCooldown before the command touches the database.
+
+    Args:
+        env (str): The environment variable holding the limit as "calls/seconds", "0" turns the limit off.
+        default (str): The limit used when the variable is unset.
+
+    Returns:
+        Callable[[T], T]: The check decorator.
+    """
+    limit = parse_rate(os.environ.get(env, default))
+    if limit is None:
+        return lambda command: command
+    limiter = RateLimiter(*limit)
+    cooldown = app_commands.Cooldown(*limit)
+
+    def predicate(interaction: discord.Interaction) -> bool:
+        retry = limiter.retry_after(interaction.user.id)
+        if retry:
+            COMMANDS_THROTTLED.inc(interaction.command.qualified_name if interaction.command else "unknown")
+            raise app_commands.CommandOnCooldown(cooldown, retry)
+        return True
+
+    return app_commands.check(predicate)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads.
+
+    While a read for a key is in flight, further calls with the same key wait for it and share its result instead of
+    starting their own. Nothing is kept once the read finishes, so results are never older than the read itself.
+    """
+
+    def __init__(self, name: str) -> None:
+        """
+        Initializes an instance of the SingleFlight.
+
+        Args:
+            name (str): The name the coalesced calls are counted under in the metrics.
+        """
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs func, or joins the call already running for the key.
+
+        Args:
+            key (Hashable): Identifies the read, calls with equal keys must return equal results.
+            func (Callable[[], Awaitable[T]]): Starts the read.
+
+        Returns:
+            T: The read's result, shared between every caller of the same flight.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            READS_COALESCED.inc(self.name)
+            # Shielded so a caller giving up does not cancel the read for the others
+            return await asyncio.shield(future)
+
+        future = self._inflight[key] = asyncio.ensure_future(func())
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                del self._inflight[key]
+            else:
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import os
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Discord shows at most 25 autocomplete choices
+MAX_CHOICES = 25
+
+
+class PrefixIndex:
+    """
+    Names kept in a sorted array so name prefixes can be looked up with bisect instead of a database query.
+
+    Every word of a name is indexed, so "tut" finds "Python tutoring" as well as "Tutoring". Items are identified by
+    an ID, several items may share a name.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty PrefixIndex.
+        """
+        # (casefolded text from the start of a word to the end of the name, item ID)
+        self._entries: List[Tuple[str, int]] = []
+        self._names: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._names
+
+    @staticmethod
+    def _keys(name: str) -> List[str]:
+        folded = name.casefold()
+        return [folded[index:] for index, char in enumerate(folded)
+                if not char.isspace() and (index == 0 or folded[index - 1].isspace())]
+
+    def load(self, items: Iterable[Tuple[int, str]]) -> None:
+        """
+        Replaces the index contents.
+
+        Args:
+            items (Iterable[Tuple[int, str]]): The items as (ID, name).
+        """
+        self._names = {item_id: name for item_id, name in items if name}
+        self._entries = sorted((key, item_id) for item_id, name in self._names.items() for key in self._keys(name))
+
+    def set(self, item_id: int, name: Optional[str]) -> None:
+        """
+        Adds an item or changes its name. A None or empty name removes the item.
+
+        Args:
+            item_id (int): The item ID.
+            name (Optional[str]): The item's name.
+        """
+        current = self._names.get(item_id)
+        if current == name:
+            return
+        if current is not None:
+            for key in self._keys(current):
+                index = bisect_left(self._entries, (key, item_id))
+                if index < len(self._entries) and self._entries[index] == (key, item_id):
+                    del self._entries[index]
+            del self._names[item_id]
+        if name:
+            self._names[item_id] = name
+            for key in self._keys(name):
+                insort(self._entries, (key, item_id))
+
+    def remove(self, item_id: int) -> None:
+        self.set(item_id, None)
+
+    def complete(self, prefix: str, limit: int = MAX_CHOICES, distinct: bool = False) -> List[Tuple[int, str]]:
+        """
+        Returns items with a word starting with the prefix, in alphabetical order of the matching words.
+
+        Args:
+            prefix (str): The text typed so far, matched case-insensitively.
+            limit (int): The maximum number of items.
+            distinct (bool): Return only the first item of every name.
+
+        Returns:
+            List[Tuple[int, str]]: The matching items as (ID, name), each item at most once.
+        """
+        prefix = prefix.strip().casefold()
+        found: Dict[object, Tuple[int, str]] = {}
+        index = bisect_left(self._entries, (prefix, -1 << 63))
+        while index < len(self._entries) and len(found) < limit:
+            key, item_id = self._entries[index]
+            if not key.startswith(prefix):
+                break
+            name = self._names[item_id]
+            found.setdefault(name.casefold() if distinct else item_id, (item_id, name))
+            index += 1
+        return list(found.values())
+
+
+class Debouncer:
+    """
+    Lets only the last of a burst of calls from the same user go ahead.
+
+    Discord sends an autocomplete request for every keystroke. Each request waits a short delay, and if the same user
+    sent a newer one in the meantime the older request is answered with no choices instead of being looked up.
+    """
+
+    def __init__(self, delay: Optional[float] = None) -> None:
+        """
+        Initializes an instance of the Debouncer.
+
+        Args:
+            delay (Optional[float]): Seconds to wait for a newer call, AUTOCOMPLETE_DEBOUNCE by default.
+        """
+        self.delay = delay if delay is not None else float(os.environ.get("AUTOCOMPLETE_DEBOUNCE", 0.15))
+        self._tokens = itertools.count()
+        # Only users with a call in flight are tracked, the last call of a burst removes its entry
+        self._latest: Dict[int, int] = {}
+        self.suppressed = 0
+
+    async def settle(self, user_id: int) -> bool:
+        """
+        Waits out the debounce delay.
+
+        Args:
+            user_id (int): The ID of the user who made the call.
+
+        Returns:
+            bool: True if this is still the user's most recent call and should be served.
+        """
+        token = self._latest[user_id] = next(self._tokens)
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        if self._latest.get(user_id) != token:
+            self.suppressed += 1
+            return False
+        del self._latest[user_id]
+        return True
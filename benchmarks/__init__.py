@@ -0,0 +1,6 @@
+"""
+Offline load-test harness for the bot's cogs.
+
+Drives the real app command callbacks, DatabaseManager and style_manager against stub Discord objects, without any
+network access. Run it from the repository root with `python -m benchmarks.run --help`.
+"""
@@ -0,0 +1,345 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from db_manager import DatabaseManager
+from guild_config import GuildConfig
+from log_delivery import LogDelivery
+from metrics import RESPONSES_DEFERRED
+from style_registry import registry as style_registry
+from cogs.cuteness import Cuteness
+from cogs.professions import Professions
+from benchmarks.stubs import StubChannel, StubClient, StubInteraction, StubRole, StubUser
+
+GUILD_BASE_ID = 1000
+ROLE_ID = 4242
+LOG_CHANNEL_ID = 5151
+COMMAND_CHANNEL_ID = 6161
+COMMANDS = ("cute_give", "cute_give_bulk", "cute_points", "cute_leaderboard", "profession", "profession_search",
+            "autocomplete")
+SERVICE_WORDS = ("art", "commissions", "coding", "python", "bots", "music", "mixing", "video", "editing", "tutoring",
+                 "maths", "translation", "german", "french", "cooking", "baking", "design", "logos", "writing", "voice")
+
+logger = logging.getLogger(__name__)
+
+
+def seed_database(db_file: str, users: int, guilds: int, posts: int = 0, chunk_size: int = 50_000) -> None:
+    """
+    Fills cutePoints with random point holders, and professionPosts with random posts, spread over the benchmark
+    guilds.
+
+    Args:
+        db_file (str): The database file, its schema must already be migrated.
+        users (int): Number of users per guild.
+        guilds (int): Number of guilds.
+        posts (int): Number of profession posts per guild.
+        chunk_size (int): Rows inserted per executemany call.
+    """
+    conn = sqlite3.connect(db_file)
+    try:
+        for guild in range(guilds):
+            guild_id = GUILD_BASE_ID + guild
+            for start in range(0, users, chunk_size):
+                rows = ((guild_id, f"user{user_id}", random.randrange(0, 10_000), user_id)
+                        for user_id in range(start + 1, min(start + chunk_size, users) + 1))
+                conn.executemany("INSERT INTO cutePoints (guild_id, name, points, userid) VALUES (?, ?, ?, ?)", rows)
+            posts_rows = ((guild_id * posts + post, guild_id, COMMAND_CHANNEL_ID, random.randint(1, users),
+                           " ".join(random.sample(SERVICE_WORDS, 2)), " ".join(random.choices(SERVICE_WORDS, k=8)),
+                           ",".join(random.sample(SERVICE_WORDS, 3)), 0) for post in range(posts))
+            conn.executemany("INSERT INTO professionPosts (message_id, guild_id, channel_id, owner_id, name, "
+                             "description, requirements, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", posts_rows)
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of sorted samples.
+
+    Args:
+        samples (List[float]): The samples, sorted ascending.
+        fraction (float): The percentile as a fraction, 0.99 for p99.
+
+    Returns:
+        float: The percentile value, 0 if there are no samples.
+    """
+    if not samples:
+        return 0.0
+    index = min(len(samples) - 1, max(0, int(round(fraction * len(samples) + 0.5)) - 1))
+    return samples[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, float]:
+    """
+    Turns raw latencies, in seconds, into the reported statistics.
+    """
+    latencies.sort()
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 4),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "max_ms": round((latencies[-1] if latencies else 0.0) * 1000, 4),
+    }
+
+
+async def drive(name: str, requests: int, concurrency: int,
+                invoke: Callable[[int], Awaitable[StubInteraction]]) -> Dict[str, float]:
+    """
+    Calls a command repeatedly with bounded concurrency and measures each call.
+
+    Args:
+        name (str): The command name, used for logging.
+        requests (int): The total number of calls.
+        concurrency (int): The maximum number of calls in flight.
+        invoke (Callable[[int], Awaitable[StubInteraction]]): Performs call number i and returns its interaction.
+
+    Returns:
+        Dict[str, float]: The statistics for the command.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                interaction = await invoke(i)
+            except Exception as ex:
+                errors += 1
+                logger.debug(f"{name} call {i} raised {ex!r}")
+                return
+            latencies.append(time.perf_counter() - started)
+            embed = interaction.response.kwargs.get("embed") or interaction.followup.kwargs.get("embed")
+            if embed is not None and getattr(embed, "title", None) == "Error":
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Seeds a database, then drives every selected command against it.
+
+    Args:
+        args (argparse.Namespace): The parsed command line arguments.
+
+    Returns:
+        Dict[str, Any]: The run's metadata and per-command results.
+    """
+    db_file = args.db or os.path.join(tempfile.mkdtemp(prefix="owobench-"), "bench.db")
+    db = DatabaseManager(db_file, engine=args.engine)
+    db.setup_database()
+    seed_started = time.perf_counter()
+    seed_database(db_file, args.users, args.guilds, args.posts)
+    seed_seconds = time.perf_counter() - seed_started
+
+    log_channel = StubChannel(LOG_CHANNEL_ID, send_latency=args.send_latency)
+    command_channel = StubChannel(COMMAND_CHANNEL_ID)
+    client = StubClient(db, {LOG_CHANNEL_ID: log_channel, COMMAND_CHANNEL_ID: command_channel})
+    spool_path = os.path.join(tempfile.mkdtemp(prefix="owobench-"), "log_spool.jsonl")
+    client.log_delivery = LogDelivery(client, spool_path)
+    client.log_delivery.start()
+    guild_ids = [GUILD_BASE_ID + guild for guild in range(args.guilds)]
+    for guild_id in guild_ids:
+        await db.set_guild_config(GuildConfig(guild_id, ROLE_ID, LOG_CHANNEL_ID))
+    style_registry.load_all()
+
+    cuteness = Cuteness(client)
+    professions = Professions(client)
+    moderator = StubUser(10 ** 12, "moderator", role_ids=[ROLE_ID])
+
+    def interaction_for(user: StubUser) -> StubInteraction:
+        return StubInteraction(client, user, random.choice(guild_ids), command_channel)
+
+    def random_user() -> StubUser:
+        return StubUser(random.randint(1, args.users))
+
+    async def cute_give(i: int) -> StubInteraction:
+        interaction = interaction_for(moderator)
+        await cuteness.cute_give.callback(cuteness, interaction, random.randint(-5, 20), random_user())
+        return interaction
+
+    async def cute_give_bulk(i: int) -> StubInteraction:
+        interaction = interaction_for(moderator)
+        first = random.randint(1, max(args.users - args.bulk_size, 1))
+        role = StubRole(ROLE_ID, [StubUser(user_id) for user_id in range(first, first + args.bulk_size)])
+        await cuteness.cute_give_bulk.callback(cuteness, interaction, random.randint(1, 20), role)
+        return interaction
+
+    async def cute_points(i: int) -> StubInteraction:
+        interaction = interaction_for(random_user())
+        await cuteness.cute_points.callback(cuteness, interaction)
+        return interaction
+
+    async def cute_leaderboard(i: int) -> StubInteraction:
+        interaction = interaction_for(random_user())
+        await cuteness.cute_leaderboard.callback(cuteness, interaction)
+        return interaction
+
+    async def profession(i: int) -> StubInteraction:
+        interaction = interaction_for(random_user())
+        await professions.profession.callback(professions, interaction, f"Service {i}",
+                                              "A benchmark service description", "one,two,three")
+        return interaction
+
+    async def profession_search(i: int) -> StubInteraction:
+        interaction = interaction_for(random_user())
+        await professions.profession_search.callback(professions, interaction,
+                                                     " ".join(random.sample(SERVICE_WORDS, random.randint(1, 2))))
+        return interaction
+
+    async def autocomplete(i: int) -> StubInteraction:
+        # Every call comes from a different user, so the debounce delay is the only thing the debouncer adds
+        interaction = interaction_for(StubUser(i))
+        if i % 2:
+            await cuteness.member_autocomplete(interaction, f"user{random.randint(1, 99)}")
+        else:
+            await professions.profession_name_autocomplete(interaction, random.choice(SERVICE_WORDS)[:3])
+        return interaction
+
+    invokers = {"cute_give": cute_give, "cute_give_bulk": cute_give_bulk, "cute_points": cute_points,
+                "cute_leaderboard": cute_leaderboard, "profession": profession, "profession_search": profession_search,
+                "autocomplete": autocomplete}
+
+    results: Dict[str, Dict[str, float]] = {}
+    jobs: List[Dict[str, Any]] = []
+    try:
+        # The first call per guild loads its rank and profession name indexes, keep that out of the measured runs
+        for guild_id in guild_ids:
+            await db.get_rank_index(guild_id)
+            await db.complete_profession_names(guild_id, "")
+        for name in args.commands:
+            results[name] = await drive(name, args.requests, args.concurrency, invokers[name])
+            logger.info(f"{name}: {results[name]}")
+        if args.jobs:
+            # Last, since they change every balance. cute_give runs alongside the decay to show what it costs commands.
+            decay, results["cute_give_during_decay"] = await asyncio.gather(
+                db.decay_points(0.05), drive("cute_give_during_decay", args.requests, args.concurrency, cute_give))
+            for report in (decay, await db.reset_season()):
+                jobs.append({key: round(value, 4) if isinstance(value, float) else value
+                             for key, value in report._asdict().items()})
+                logger.info(f"{report.job}: {jobs[-1]}")
+    finally:
+        await client.log_delivery.close()
+        os.remove(spool_path)
+        await db.close()
+        if not args.db:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_file + suffix):
+                    os.remove(db_file + suffix)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "engine": db.engine,
+            "users": args.users,
+            "guilds": args.guilds,
+            "posts": args.posts,
+            "bulk_size": args.bulk_size,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "send_latency": args.send_latency,
+            "seed_seconds": round(seed_seconds, 3),
+            "log_messages_sent": log_channel.sent,
+            "log_embeds_delivered": client.log_delivery.delivered,
+            "reads_coalesced": {flight.name: flight.coalesced for flight in
+                                (cuteness.rank_reads, cuteness.leaderboard_reads, professions.search_reads)},
+            "responses_deferred": int(RESPONSES_DEFERRED.total()),
+            "jobs": jobs,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compares two runs and lists the commands whose latency or throughput regressed.
+
+    Args:
+        baseline (Dict[str, Any]): A previously saved run.
+        current (Dict[str, Any]): The run to check.
+        threshold (float): Allowed relative slowdown, 0.1 allows 10%.
+
+    Returns:
+        List[str]: A description of every regression found.
+    """
+    regressions = []
+    for name, now in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if before[metric] and now[metric] > before[metric] * (1 + threshold):
+                regressions.append(f"{name} {metric}: {before[metric]} -> {now[metric]}")
+        if before["throughput_per_s"] and now["throughput_per_s"] < before["throughput_per_s"] * (1 - threshold):
+            regressions.append(f"{name} throughput_per_s: {before['throughput_per_s']} -> {now['throughput_per_s']}")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run",
+                                     description="Offline load test for the OwOBot cogs.")
+    parser.add_argument("--users", type=int, default=10_000, help="point holders seeded per guild")
+    parser.add_argument("--guilds", type=int, default=1, help="number of guilds to spread load over")
+    parser.add_argument("--posts", type=int, default=10_000, help="profession posts seeded per guild")
+    parser.add_argument("--bulk-size", type=int, default=500, help="role members per cute_give_bulk call")
+    parser.add_argument("--requests", type=int, default=2_000, help="calls per command")
+    parser.add_argument("--concurrency", type=int, default=50, help="calls in flight at once")
+    parser.add_argument("--commands", nargs="+", choices=COMMANDS, default=list(COMMANDS))
+    parser.add_argument("--engine", choices=("async", "legacy"), default=None, help="database engine, DB_ENGINE "
+                                                                                   "by default")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="simulated log channel send latency, "
+                                                                        "in seconds")
+    parser.add_argument("--db", help="database file to use instead of a temporary one, it is not deleted")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative regression")
+    parser.add_argument("--jobs", action="store_true", help="also time a point decay, with cute_give running "
+                                                             "alongside, and a season reset")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # The cogs log every call at INFO or above, keep the output readable
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    report = asyncio.run(run_benchmark(args))
+    print(json.dumps(report, indent=2))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf8") as baseline_file:
+            regressions = compare(json.load(baseline_file), report, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
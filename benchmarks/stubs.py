@@ -0,0 +1,184 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import discord
+
+
+class StubAsset:
+    """
+    Stands in for discord.Asset, only the URL is used by the style renderers.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+
+
+class StubRole:
+    def __init__(self, role_id: int, members: Optional[List["StubUser"]] = None) -> None:
+        self.id = role_id
+        self.members = members or []
+
+
+class StubUser:
+    """
+    Stands in for discord.User and discord.Member.
+    """
+
+    def __init__(self, user_id: int, name: Optional[str] = None, role_ids: Optional[List[int]] = None) -> None:
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.avatar = StubAsset(f"https://cdn.example.invalid/avatars/{user_id}.png")
+        self.display_avatar = self.avatar
+        self.bot = False
+        self._roles = {role_id: StubRole(role_id) for role_id in role_ids or []}
+
+    def get_role(self, role_id: int) -> Optional[StubRole]:
+        return self._roles.get(role_id)
+
+
+class StubMessage:
+    def __init__(self, message_id: int, channel: "StubChannel", **kwargs: Any) -> None:
+        self.id = message_id
+        self.channel = channel
+        self.kwargs = kwargs
+
+    async def delete(self) -> None:
+        self.channel.deleted += 1
+
+    async def edit(self, **kwargs: Any) -> None:
+        self.kwargs.update(kwargs)
+
+
+class StubChannel:
+    """
+    Stands in for a text channel, messages are counted instead of sent.
+    """
+
+    def __init__(self, channel_id: int, send_latency: float = 0.0) -> None:
+        self.id = channel_id
+        self.send_latency = send_latency
+        self.sent = 0
+        self.deleted = 0
+        self._next_message_id = 1
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> StubMessage:
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent += 1
+        self._next_message_id += 1
+        return StubMessage(self._next_message_id, self, content=content, **kwargs)
+
+
+class StubResponse:
+    """
+    Stands in for discord.InteractionResponse.
+    """
+
+    def __init__(self, interaction: "StubInteraction") -> None:
+        self._interaction = interaction
+        self._done = False
+        self.kwargs: Dict[str, Any] = {}
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _respond(self, **kwargs: Any) -> None:
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        self._done = True
+        self.kwargs = kwargs
+
+    async def send_message(self, content: Optional[str] = None, **kwargs: Any) -> None:
+        self._respond(content=content, **kwargs)
+        self._interaction.message = StubMessage(self._interaction.id, self._interaction.channel, **kwargs)
+
+    async def edit_message(self, **kwargs: Any) -> None:
+        self._respond(**kwargs)
+
+    async def defer(self, **kwargs: Any) -> None:
+        self._respond(deferred=True, **kwargs)
+
+    async def send_autocomplete(self, choices: list) -> None:
+        self._respond(choices=choices)
+
+
+class StubWebhook:
+    """
+    Stands in for the interaction followup webhook.
+    """
+
+    def __init__(self, channel: "StubChannel") -> None:
+        self._channel = channel
+        self.kwargs: Dict[str, Any] = {}
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> StubMessage:
+        self.kwargs = kwargs
+        return await self._channel.send(content, **kwargs)
+
+
+class StubGuild:
+    """
+    Stands in for discord.Guild, every user ID is treated as a member.
+    """
+
+    def __init__(self, guild_id: int) -> None:
+        self.id = guild_id
+        self.chunked = True
+
+    def get_member(self, user_id: int) -> StubUser:
+        return StubUser(user_id)
+
+
+class StubClient:
+    """
+    Stands in for the bot, exposing the attributes the cogs use.
+    """
+
+    def __init__(self, db: Any, channels: Optional[Dict[int, StubChannel]] = None) -> None:
+        self.db = db
+        self.channels = channels or {}
+        self.user = StubUser(1, "OwOBot")
+
+    def get_channel(self, channel_id: int) -> Optional[StubChannel]:
+        return self.channels.get(channel_id)
+
+    async def wait_until_ready(self) -> None:
+        return None
+
+    def is_closed(self) -> bool:
+        return False
+
+
+class StubInteraction:
+    """
+    Stands in for discord.Interaction.
+    """
+
+    _next_id = 1
+
+    def __init__(self, client: StubClient, user: StubUser, guild_id: int, channel: StubChannel) -> None:
+        StubInteraction._next_id += 1
+        self.id = StubInteraction._next_id
+        self.client = client
+        self.user = user
+        self.guild_id = guild_id
+        self.guild = StubGuild(guild_id)
+        self.channel = channel
+        self.channel_id = channel.id
+        self.message: Optional[StubMessage] = None
+        self.response = StubResponse(self)
+        self.followup = StubWebhook(channel)
+        self.data: Dict[str, Any] = {}
+        self.namespace = None
+        self.type = discord.InteractionType.application_command
+        self.command = None
+        self.extras: Dict[str, Any] = {}
+
+    async def original_response(self) -> Optional[StubMessage]:
+        return self.message
+
+    async def edit_original_response(self, **kwargs: Any) -> None:
+        if self.message is not None:
+            await self.message.edit(**kwargs)
@@ -2,8 +2,23 @@ import discord
 import asyncio
 import os
 import logging
+import sqlite3
+import tempfile
+import time
+from typing import Awaitable, Callable
 from discord.ext import commands
-from db_manager import DatabaseManager
+import data_transfer
+from client_config import client_options, process_memory
+from command_sync import sync_command_tree
+from db_manager import BatchJobReport, DatabaseManager
+from log_delivery import LogDelivery
+from profile_cache import profiles
+from guild_config import command_guilds
+from style_registry import registry as style_registry
+from scheduler import Scheduler
+from stall_watchdog import StallWatchdog
+from tracing import tracer
+import metrics
 from dotenv import load_dotenv
 
 # Configure logging
@@ -16,23 +31,78 @@ if not TOKEN:
     logging.error("Discord token not found. Please set the DISCORD_TOKEN environment variable.")
     exit(1)
 
-intents = discord.Intents.all()
-bot = commands.Bot(intents=intents, command_prefix='!')
+# Intents and member/message caching come from INTENTS, MEMBER_CACHE, CHUNK_GUILDS_AT_STARTUP and MAX_MESSAGES
+options = client_options()
+# SHARDED=true runs the bot as an AutoShardedBot, SHARD_COUNT optionally fixes the number of shards and SHARD_IDS
+# the ones this process runs, so shards can be split across processes
+if os.environ.get("SHARDED", "false").lower() == "true":
+    shard_count = os.environ.get("SHARD_COUNT")
+    shard_ids = os.environ.get("SHARD_IDS")
+    bot = commands.AutoShardedBot(command_prefix='!', tree_cls=metrics.MetricsCommandTree,
+                                  shard_count=int(shard_count) if shard_count else None,
+                                  shard_ids=[int(shard) for shard in shard_ids.split(",")] if shard_ids else None,
+                                  **options)
+else:
+    bot = commands.Bot(command_prefix='!', tree_cls=metrics.MetricsCommandTree, **options)
 
 db = DatabaseManager()
+bot.db = db
+bot.log_delivery = LogDelivery(bot, os.environ.get("LOG_SPOOL_FILE", "log_spool.jsonl"))
+
+# Season resets every SEASON_LENGTH_DAYS and point decay by POINT_DECAY_RATE every POINT_DECAY_INTERVAL, both off by
+# default. A reset and a decay due at the same time run in that order.
+bot.scheduler = Scheduler(db)
+season_length_days = float(os.environ.get("SEASON_LENGTH_DAYS", 0))
+if season_length_days > 0:
+    bot.scheduler.add("season_reset", season_length_days * 86400, db.reset_season)
+point_decay_rate = float(os.environ.get("POINT_DECAY_RATE", 0))
+if point_decay_rate > 0:
+    bot.scheduler.add("decay", float(os.environ.get("POINT_DECAY_INTERVAL", 86400)),
+                      lambda due: db.decay_points(point_decay_rate, due))
+
+
+async def load_cog(filename: str) -> None:
+    """
+    Loads a single cog and logs how long it took.
+
+    Args:
+        filename (str): The cog's file name in the 'cogs' directory.
+    """
+    started = time.perf_counter()
+    try:
+        await bot.load_extension(f"cogs.{filename[:-3]}")
+        logging.info(f"Cog {filename} loaded successfully in {(time.perf_counter() - started) * 1000:.1f}ms.")
+    except commands.ExtensionError as e:
+        logging.error(f"Error loading cog {filename}: {e}")
 
 
 async def setup_cogs() -> None:
     """
-    Loads all cogs in the 'cogs' directory.
+    Loads all cogs in the 'cogs' directory one after another, so each cog's logged time is its own import and setup.
+    """
+    started = time.perf_counter()
+    filenames = sorted(filename for filename in os.listdir("cogs") if filename.endswith(".py"))
+    for filename in filenames:
+        await load_cog(filename)
+    logging.info(f"Loaded {len(filenames)} cogs in {(time.perf_counter() - started) * 1000:.1f}ms.")
+
+
+async def setup_hook() -> None:
     """
-    for filename in os.listdir("cogs"):
-        if filename.endswith(".py"):
-            try:
-                await bot.load_extension(f"cogs.{filename[:-3]}")
-                logging.info(f"Cog {filename} loaded successfully.")
-            except commands.ExtensionError as e:
-                logging.error(f"Error loading cog {filename}: {e}")
+    Runs once the bot is logged in, before it connects to the gateway.
+
+    Syncs the command tree of every command guild (or the global one) whose commands changed since the last sync,
+    unless AUTO_SYNC is false.
+    """
+    if os.environ.get("AUTO_SYNC", "true").lower() != "true":
+        return
+    try:
+        await sync_command_tree(bot.tree, db, command_guilds() or [None])
+    except discord.HTTPException as e:
+        logging.error(f"Error syncing commands: {e}")
+
+
+bot.setup_hook = setup_hook
 
 
 def check_if_owner(ctx: commands.Context) -> bool:
@@ -53,32 +123,288 @@ def check_if_owner(ctx: commands.Context) -> bool:
 async def sync(ctx: commands.Context) -> None:
     """
     Command to synchronize commands within the bot's command tree for the guild from which it was executed.
+    When commands are registered globally (no GUILD_IDS/GUILD_ID), the global command tree is synchronized instead.
+    Commands are synced even if they did not change, startup only syncs changed commands.
 
     Args:
         ctx (commands.Context): Required while using the @bot.command() decorator
     """
     try:
-        fmt = await ctx.bot.tree.sync(guild=ctx.guild)
-        logging.info(f"Synced {len(fmt)} commands.")
-        await ctx.send(f"Synced {len(fmt)} commands", delete_after=3)
+        synced, = await sync_command_tree(ctx.bot.tree, db, [ctx.guild if command_guilds() else None], force=True)
+        await ctx.send(f"Synced {synced} commands", delete_after=3)
         await ctx.message.delete()
 
     except commands.CommandError as e:
         logging.error(f"Error in sync command: {e}")
 
 
+@bot.command()
+@commands.check(check_if_owner)
+async def style_stats(ctx: commands.Context) -> None:
+    """
+    Command to report how often each style template was rendered and how long rendering took.
+
+    Args:
+        ctx (commands.Context): Required while using the @bot.command() decorator
+    """
+    lines = [f"{style}: {stats['renders']} renders, avg {(stats['avg_seconds'] or 0) * 1e6:.1f}µs"
+             for style, stats in style_registry.stats().items()]
+    lines.append(f"reloads: {style_registry.reloads}, rejected: {style_registry.failed_reloads}")
+    await ctx.send("\n".join(lines), delete_after=30)
+
+
+@bot.command()
+@commands.check(check_if_owner)
+async def cache_stats(ctx: commands.Context) -> None:
+    """
+    Command to report the size of the bot's caches and the process memory, to see what the cache settings cost.
+
+    Args:
+        ctx (commands.Context): Required while using the @bot.command() decorator
+    """
+    memory = process_memory()
+    chunked = sum(guild.chunked for guild in bot.guilds)
+    lines = [
+        f"intents: {', '.join(name for name, enabled in bot.intents if enabled)}",
+        f"member cache: {', '.join(name for name, enabled in options['member_cache_flags'] if enabled) or 'none'}",
+        f"guilds: {len(bot.guilds)} ({chunked} chunked), "
+        f"members: {sum(len(guild.members) for guild in bot.guilds)}, users: {len(bot.users)}",
+        f"channels: {sum(len(guild.channels) for guild in bot.guilds)}, "
+        f"messages: {len(bot.cached_messages)}/{options['max_messages'] or 0}",
+        f"profiles: {len(profiles)}/{profiles.max_size}, "
+        + ", ".join(f"{name}: {size}" for name, size in db.cache_stats().items()),
+        f"memory: {memory / 2 ** 20:.1f} MiB" if memory is not None else "memory: unavailable",
+    ]
+    await ctx.send("\n".join(lines), delete_after=30)
+
+
+def describe_job_report(report: BatchJobReport) -> str:
+    """
+    Describes how a batch job went in one line.
+
+    Args:
+        report (BatchJobReport): The job's report.
+
+    Returns:
+        str: The description.
+    """
+    return (f"{report.rows} rows changed in {report.chunks} chunks in {report.seconds:.2f}s, write lock held "
+            f"{report.lock_seconds * 1000:.0f}ms, at most {report.max_lock_seconds * 1000:.1f}ms at a time")
+
+
+@bot.command()
+@commands.check(check_if_owner)
+async def jobs(ctx: commands.Context) -> None:
+    """
+    Command to list the scheduled jobs with their next run and how their last run in this process went.
+
+    Args:
+        ctx (commands.Context): Required while using the @bot.command() decorator
+    """
+    lines = []
+    for job in bot.scheduler.jobs.values():
+        line = f"{job.name}: every {job.interval / 3600:g}h"
+        if job.due is not None:
+            line += f", next <t:{job.due}:R>"
+        if isinstance(job.last_result, BatchJobReport):
+            line += f", last <t:{int(job.last_run)}:R>: {describe_job_report(job.last_result)}"
+        lines.append(line)
+    await ctx.send("\n".join(lines) or "No jobs scheduled, see SEASON_LENGTH_DAYS and POINT_DECAY_RATE.",
+                   delete_after=30)
+
+
+@bot.command(name="run_job")
+@commands.check(check_if_owner)
+async def run_job(ctx: commands.Context, name: str) -> None:
+    """
+    Command to run a scheduled job now, e.g. to finish an interrupted season reset. The schedule is unchanged.
+
+    Args:
+        ctx (commands.Context): Required while using the @bot.command() decorator
+        name (str): The job to run, 'season_reset' or 'decay'.
+    """
+    try:
+        message = await ctx.send(f"Running {name}...")
+        report = await bot.scheduler.run_job(name)
+        await message.edit(content=f"{name}: {describe_job_report(report)}.")
+    except ValueError as e:
+        await ctx.send(str(e), delete_after=10)
+    except (sqlite3.Error, discord.HTTPException) as e:
+        logging.error(f"Error in run_job command: {e}")
+
+
+def progress_message(message: discord.Message, action: str,
+                     interval: float = 2.0) -> Callable[[int], Awaitable[None]]:
+    """
+    Creates a progress callback that edits a message with the number of rows done, at most once per interval.
+
+    Args:
+        message (discord.Message): The message to edit.
+        action (str): What is being done, e.g. 'Exported'.
+        interval (float): Minimum seconds between edits.
+
+    Returns:
+        Callable[[int], Awaitable[None]]: The callback.
+    """
+    last_edit = time.monotonic()
+
+    async def progress(rows: int) -> None:
+        nonlocal last_edit
+        if time.monotonic() - last_edit >= interval:
+            last_edit = time.monotonic()
+            await message.edit(content=f"{action} {rows} rows...")
+
+    return progress
+
+
+@bot.command(name="export")
+@commands.check(check_if_owner)
+async def export_data(ctx: commands.Context, table: str, fmt: str = "csv") -> None:
+    """
+    Command to export a table as a CSV or JSONL file, sent as an attachment. Tables too large for an attachment
+    can be exported with `python -m data_transfer export`.
+
+    Args:
+        ctx (commands.Context): Required while using the @bot.command() decorator
+        table (str): The table to export, see data_transfer.TABLES.
+        fmt (str): 'csv' or 'jsonl'.
+    """
+    try:
+        message = await ctx.send(f"Exporting {table}...")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f"{table}.{fmt.lower()}")
+            rows = await data_transfer.export_table(db, table, path, progress=progress_message(message, "Exported"))
+            limit = ctx.guild.filesize_limit if ctx.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+            if os.path.getsize(path) > limit:
+                await message.edit(content=f"Exported {rows} rows, too large to upload. "
+                                           f"Use `python -m data_transfer export {table} {table}.{fmt}`.")
+                return
+            await message.edit(content=f"Exported {rows} rows.", attachments=[discord.File(path)])
+    except ValueError as e:
+        await ctx.send(str(e), delete_after=10)
+    except (OSError, discord.HTTPException) as e:
+        logging.error(f"Error in export command: {e}")
+
+
+@bot.command(name="import")
+@commands.check(check_if_owner)
+async def import_data(ctx: commands.Context, table: str) -> None:
+    """
+    Command to import a CSV or JSONL file attached to the message into a table. Imported rows replace stored rows
+    with the same key.
+
+    Args:
+        ctx (commands.Context): Required while using the @bot.command() decorator
+        table (str): The table to import into, see data_transfer.TABLES.
+    """
+    if not ctx.message.attachments:
+        await ctx.send("Attach a .csv or .jsonl file to import.", delete_after=10)
+        return
+    attachment = ctx.message.attachments[0]
+    try:
+        message = await ctx.send(f"Importing {attachment.filename} into {table}...")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, os.path.basename(attachment.filename))
+            await attachment.save(path)
+            rows = await data_transfer.import_table(db, table, path, progress=progress_message(message, "Imported"))
+        await message.edit(content=f"Imported {rows} rows into {table}.")
+    except ValueError as e:
+        await ctx.send(f"Import stopped, the rows before the error were imported: {e}", delete_after=30)
+    except (OSError, sqlite3.Error, discord.HTTPException) as e:
+        logging.error(f"Error in import command: {e}")
+
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command) -> None:
+    """
+    Records the latency of every app command that completed.
+
+    Args:
+        interaction (discord.Interaction): The interaction context.
+        command: The app command or context menu that completed.
+    """
+    metrics.record_command(interaction)
+
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member) -> None:
+    """
+    Keeps cached profiles and stored names current when a member's nickname or guild avatar changes.
+
+    Args:
+        before (discord.Member): The member before the change.
+        after (discord.Member): The member after the change.
+    """
+    profiles.on_member_update(before, after)
+
+
+@bot.event
+async def on_user_update(before: discord.User, after: discord.User) -> None:
+    """
+    Keeps cached profiles and stored names current when a user's name or avatar changes.
+
+    Args:
+        before (discord.User): The user before the change.
+        after (discord.User): The user after the change.
+    """
+    profiles.on_user_update(before, after)
+
+
+async def start_metrics() -> None:
+    """
+    Starts the event loop lag monitor and the Prometheus endpoint, unless METRICS_PORT is 0.
+    """
+    port = int(os.environ.get("METRICS_PORT", 9108))
+    if port == 0:
+        return
+    bot.loop_monitor = asyncio.create_task(metrics.monitor_event_loop())
+    bot.metrics_server = await metrics.start_http_server(os.environ.get("METRICS_HOST", "127.0.0.1"), port)
+
+
 async def main() -> None:
     """
     Main function to set up the database, load cogs, and start the bot.
 
     This function sets up the database, loads cogs (extensions), and starts the bot using the provided TOKEN.
     """
+    # Started first so stalls during startup are caught as well, STALL_THRESHOLD=0 turns it off
+    stall_threshold = float(os.environ.get("STALL_THRESHOLD", 0.25))
+    bot.stall_watchdog = StallWatchdog(stall_threshold) if stall_threshold > 0 else None
+    if bot.stall_watchdog is not None:
+        bot.stall_watchdog.start()
     try:
         db.setup_database()
+        await db.load_guild_configs()
+        db.bus.start(db)
+        style_registry.load_all()
+        style_reload_interval = float(os.environ.get("STYLE_RELOAD_INTERVAL", 2.0))
+        bot.style_watcher = asyncio.create_task(style_registry.watch(style_reload_interval))
+        await start_metrics()
+        bot.ledger_compactor = asyncio.create_task(db.compact_ledger_periodically(
+            float(os.environ.get("LEDGER_COMPACT_INTERVAL", 3600)), int(os.environ.get("LEDGER_RETENTION_DAYS", 90))))
+        bot.name_flusher = asyncio.create_task(profiles.flush_periodically(
+            db, float(os.environ.get("NAME_FLUSH_INTERVAL", 30))))
+        try:
+            await db.finish_point_jobs()
+        except sqlite3.Error as e:
+            logging.error(f"Error finishing interrupted point jobs: {e}")
+        bot.scheduler.start()
+        bot.log_delivery.start()
         await setup_cogs()
         await bot.start(TOKEN)
     except commands.CommandError as e:
         logging.error(f"Error in main function: {e}")
+    finally:
+        await bot.scheduler.close()
+        await bot.log_delivery.close()
+        try:
+            await profiles.flush(db)
+        except Exception as e:
+            logging.error(f"Error writing pending name changes: {e}")
+        await db.close()
+        if bot.stall_watchdog is not None:
+            await bot.stall_watchdog.close()
+        tracer.close()
 
 
 asyncio.run(main())
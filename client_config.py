@@ -0,0 +1,103 @@
+import os
+import sys
+from typing import Any, Dict, Optional, Type, TypeVar
+
+import discord
+
+# What the bot needs: guilds for slash commands, guild messages and their content for the owner's ! commands, and
+# members for /cute_give_bulk by role and for keeping leaderboard names current
+DEFAULT_INTENTS = "guilds,guild_messages,message_content,members"
+# Only members the bot sees join are kept, plus those of guilds chunked on demand. discord.py only reports renames
+# of cached members, so stored names are also refreshed whenever a member is given points.
+DEFAULT_MEMBER_CACHE = "joined"
+
+F = TypeVar("F", discord.Intents, discord.MemberCacheFlags)
+
+
+def _flags(cls: Type[F], value: str) -> F:
+    """
+    Builds flags from a comma separated list of flag names, or 'all' or 'none'.
+
+    Raises:
+        ValueError: If a name is not a flag of cls.
+    """
+    names = [name.strip().lower() for name in value.split(",") if name.strip()]
+    if names == ["all"]:
+        return cls.all()
+    flags = cls.none()
+    for name in names:
+        if name == "none":
+            continue
+        if name not in cls.VALID_FLAGS:
+            raise ValueError(f"Unknown {cls.__name__} flag {name!r}, use one of {', '.join(cls.VALID_FLAGS)}")
+        setattr(flags, name, True)
+    return flags
+
+
+def intents_from_env() -> discord.Intents:
+    """
+    Returns the gateway intents set by INTENTS, a comma separated list of discord.Intents flags or 'all'.
+
+    Returns:
+        discord.Intents: The intents, DEFAULT_INTENTS if INTENTS is unset.
+    """
+    return _flags(discord.Intents, os.environ.get("INTENTS", DEFAULT_INTENTS))
+
+
+def member_cache_flags_from_env(intents: discord.Intents) -> discord.MemberCacheFlags:
+    """
+    Returns the member cache policy set by MEMBER_CACHE, a comma separated list of discord.MemberCacheFlags flags,
+    'all' or 'none'. Flags that need an intent the bot does not have are left out.
+
+    Args:
+        intents (discord.Intents): The intents the bot connects with.
+
+    Returns:
+        discord.MemberCacheFlags: The member cache flags.
+    """
+    flags = _flags(discord.MemberCacheFlags, os.environ.get("MEMBER_CACHE", DEFAULT_MEMBER_CACHE))
+    possible = discord.MemberCacheFlags.from_intents(intents)
+    return discord.MemberCacheFlags._from_value(flags.value & possible.value)
+
+
+def client_options() -> Dict[str, Any]:
+    """
+    Returns the cache related keyword arguments for the bot, read from the environment.
+
+    CHUNK_GUILDS_AT_STARTUP requests every guild's full member list on connect (default false), MAX_MESSAGES is the
+    number of messages kept in the message cache (default 0, no message cache).
+
+    Returns:
+        Dict[str, Any]: intents, member_cache_flags, chunk_guilds_at_startup and max_messages.
+    """
+    intents = intents_from_env()
+    max_messages = int(os.environ.get("MAX_MESSAGES", 0))
+    return {
+        "intents": intents,
+        "member_cache_flags": member_cache_flags_from_env(intents),
+        "chunk_guilds_at_startup": os.environ.get("CHUNK_GUILDS_AT_STARTUP", "false").lower() == "true",
+        "max_messages": max_messages or None,
+    }
+
+
+def process_memory() -> Optional[int]:
+    """
+    Returns the process's resident memory in bytes, the current value on Linux and the peak elsewhere.
+
+    Returns:
+        Optional[int]: The memory in bytes, or None where it cannot be measured.
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
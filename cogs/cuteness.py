@@ -1,18 +1,156 @@
+import csv
+import io
 import logging
 import discord
 from discord import app_commands
 from discord.ext import commands
-from db_manager import DatabaseManager
+from db_manager import DatabaseManager, PERIOD_DAY, PERIOD_WEEK
+from guild_config import command_guilds
 import style_manager
-import os
+from admission import SingleFlight, rate_limit
+from autocomplete import Debouncer
+from responses import Responder
+import re
+from typing import List, Optional, Tuple
+
+STYLE_DIR_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Mentions or raw IDs in the members option of /cute_give_bulk
+# A member mention, or a bare ID between whitespace or commas, never the ID inside a role, channel or emoji mention
+MEMBER_MENTION_PATTERN = re.compile(r"<@!?(\d{15,20})>|(?<![^\s,])(\d{15,20})(?![^\s,])")
+MAX_BULK_RECIPIENTS = 10_000
+MAX_BULK_CSV_BYTES = 1 << 20
+
+# Leaderboard periods as shown to users, None is the all-time leaderboard
+PERIOD_NAMES = {None: "All time", PERIOD_DAY: "Today", PERIOD_WEEK: "This week"}
+
+
+def has_cute_role(interaction: discord.Interaction) -> bool:
+    """
+    App command check allowing only members with the guild's configured cute role.
+
+    Args:
+        interaction (discord.Interaction): The interaction context.
+
+    Returns:
+        bool: True if the member has the role.
+
+    Raises:
+        app_commands.CheckFailure: If the guild has no cute role configured.
+        app_commands.MissingRole: If the member does not have the role.
+    """
+    config = interaction.client.db.guild_config(interaction.guild_id)
+    if config.cute_role_id is None:
+        raise app_commands.CheckFailure("No cute role is configured for this server.")
+    if not isinstance(interaction.user, discord.Member) or interaction.user.get_role(config.cute_role_id) is None:
+        raise app_commands.MissingRole(config.cute_role_id)
+    return True
+
+
+class LeaderboardView(discord.ui.View):
+    def __init__(self, db: DatabaseManager, guild_id: int, author: discord.User, start_rank: int,
+                 rows: List[Tuple[int, str, int]], has_next: bool, period: Optional[str] = None, *,
+                 timeout: Optional[float] = 180) -> None:
+        """
+        Initializes an instance of the LeaderboardView with the first page already loaded.
+
+        Args:
+            db (DatabaseManager): The database manager used to fetch further pages.
+            guild_id (int): The guild whose leaderboard is shown.
+            author (discord.User): The user who opened the leaderboard.
+            start_rank (int): The rank of the first row on the current page.
+            rows (List[Tuple[int, str, int]]): The rows on the current page as (userid, name, points).
+            has_next (bool): Whether a page exists after the current one.
+            period (Optional[str]): The leaderboard period, None for all-time points.
+            timeout (Optional[float]): The timeout for the view, in seconds.
+        """
+        super().__init__(timeout=timeout)
+        self.db = db
+        self.guild_id = guild_id
+        self.period = period
+        self.author = author
+        self.start_rank = start_rank
+        self.rows = rows
+        self.has_next = has_next
+        self._update_buttons()
+
+    def _update_buttons(self) -> None:
+        self.previous_button.disabled = self.start_rank <= 1
+        self.next_button.disabled = not self.has_next
+
+    def create_embed(self) -> discord.Embed:
+        """
+        Renders the current page.
+
+        Returns:
+            discord.Embed: The leaderboard embed for the current page.
+        """
+        return style_manager.create_leaderboard_embed([(name, points) for _, name, points in self.rows],
+                                                      self.author, self.start_rank,
+                                                      self.db.guild_config(self.guild_id).style_dir,
+                                                      PERIOD_NAMES[self.period])
+
+    async def _show_page(self, reply: Responder, forward: bool) -> None:
+        """
+        Fetches the page before or after the current one and edits the message to show it.
+
+        Args:
+            reply (Responder): Answers the button's interaction.
+            forward (bool): Whether to move to the next page or the previous one.
+        """
+        edge = self.rows[-1] if forward else self.rows[0]
+        start_rank, rows, has_more = await self.db.get_leaderboard_page(self.guild_id, (edge[2], edge[0]),
+                                                                        forward=forward, period=self.period)
+        if start_rank is None:
+            # Keyset queries don't count the rows they skip, so the rank carries over from the current page
+            start_rank = self.start_rank + len(self.rows) if forward else max(self.start_rank - len(rows), 1)
+        if rows:
+            self.start_rank, self.rows = start_rank, rows
+            self.has_next = has_more if forward else True
+            if not forward and not has_more:
+                self.start_rank = 1
+        self._update_buttons()
+        await reply.edit(embed=self.create_embed(), view=self)
+
+    @discord.ui.button(label="Prev", style=discord.ButtonStyle.gray)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        """
+        A button callback showing the previous leaderboard page.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            button (discord.ui.Button): The button that triggered the interaction.
+        """
+        async with Responder(interaction) as reply:
+            try:
+                await self._show_page(reply, forward=False)
+            except Exception as ex:
+                logging.error(f"Error in leaderboard previous page: {ex}")
+                await reply.error("Failed to retrieve leaderboard data")
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        """
+        A button callback showing the next leaderboard page.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            button (discord.ui.Button): The button that triggered the interaction.
+        """
+        async with Responder(interaction) as reply:
+            try:
+                await self._show_page(reply, forward=True)
+            except Exception as ex:
+                logging.error(f"Error in leaderboard next page: {ex}")
+                await reply.error("Failed to retrieve leaderboard data")
 
 
 class Cuteness(commands.Cog):
     """
     A Discord Cog for managing cute points.
 
-    This cog provides commands and functionality related to managing points for users within the Discord server.
-    It includes commands for giving and viewing cute points, as well as accessing a leaderboard.
+    This cog provides commands and functionality related to managing points for users within each Discord server.
+    It includes commands for giving and viewing cute points, accessing a leaderboard, and configuring the server.
     """
 
     def __init__(self, bot: commands.Bot) -> None:
@@ -24,12 +162,16 @@ class Cuteness(commands.Cog):
 
         Attributes:
             bot (commands.Bot): The Discord bot instance.
-            db (DatabaseManager): The database manager instance.
-            log_channel (int): The ID of the channel used for logging.
+            db (DatabaseManager): The database manager instance shared by the bot.
+            debouncer (Debouncer): Drops autocomplete requests superseded by a newer keystroke.
+            rank_reads (SingleFlight): Coalesces concurrent /cute_points lookups of the same member.
+            leaderboard_reads (SingleFlight): Coalesces concurrent requests for the same leaderboard page.
         """
         self.bot: commands.Bot = bot
-        self.db: DatabaseManager = DatabaseManager()
-        self.log_channel = int(os.environ.get("CUTE_CHANNEL"))
+        self.db: DatabaseManager = bot.db
+        self.debouncer = Debouncer()
+        self.rank_reads = SingleFlight("cute_points")
+        self.leaderboard_reads = SingleFlight("cute_leaderboard")
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
@@ -41,7 +183,8 @@ class Cuteness(commands.Cog):
         logging.info("Cuteness cog loaded successfully.")
 
     @app_commands.command(name="cute_give", description="Give cute points to a member (or take em away >:3)")
-    @app_commands.checks.has_role(int(os.environ.get("CUTE_ROLE_ID")))
+    @app_commands.guild_only()
+    @app_commands.check(has_cute_role)
     async def cute_give(self, interaction: discord.Interaction, points: int, user: discord.User) -> None:
         """
         Command to give cute points to a member.
@@ -51,51 +194,285 @@ class Cuteness(commands.Cog):
             points (int): The number of cute points to give.
             user (discord.User): The target user.
         """
-        try:
-            await self.db.give_points(user, points)
-            embed = style_manager.create_give_embed(points, interaction.user)
-            log_embed = style_manager.create_log_embed(points, interaction.user, user)
+        async with Responder(interaction, ephemeral=True) as reply:
+            try:
+                config = self.db.guild_config(interaction.guild_id)
+                await self.db.give_points(interaction.guild_id, user, points, durable=True, giver=interaction.user)
+                embed = style_manager.create_give_embed(points, interaction.user, config.style_dir)
+                log_embed = style_manager.create_log_embed(points, interaction.user, user, config.style_dir)
 
-            await interaction.response.send_message(embed=embed, ephemeral=True)
-            await self.bot.get_channel(self.log_channel).send(embed=log_embed)
-        except Exception as ex:
-            logging.error(f"Error in cute_give: {ex}")
-            await style_manager.send_error_embed(interaction, "Failed to give cute points")
+                await reply.send(embed=embed)
+                if config.log_channel_id:
+                    self.bot.log_delivery.enqueue(config.log_channel_id, log_embed)
+            except Exception as ex:
+                logging.error(f"Error in cute_give: {ex}")
+                await reply.error("Failed to give cute points")
+
+    @staticmethod
+    def _parse_bulk_csv(data: bytes, default_points: Optional[int]) -> List[Tuple[int, int]]:
+        """
+        Parses an attached CSV of user_id[,points] rows. A header row and blank lines are skipped.
+
+        Args:
+            data (bytes): The file content.
+            default_points (Optional[int]): The points for rows without a points column.
+
+        Returns:
+            List[Tuple[int, int]]: The grants as (userid, points).
+
+        Raises:
+            ValueError: If a row is malformed or lacks points while no default is given.
+        """
+        grants = []
+        for line, row in enumerate(csv.reader(io.StringIO(data.decode("utf-8-sig"))), start=1):
+            if not row or not row[0].strip():
+                continue
+            user_id = row[0].strip().lstrip("<@!").rstrip(">")
+            if not user_id.isdigit():
+                if line == 1:
+                    continue
+                raise ValueError(f"line {line}: {row[0]!r} is not a user ID")
+            if len(row) > 1 and row[1].strip():
+                try:
+                    points = int(row[1])
+                except ValueError:
+                    raise ValueError(f"line {line}: {row[1]!r} is not a number of points")
+            elif default_points is not None:
+                points = default_points
+            else:
+                raise ValueError(f"line {line}: no points given")
+            grants.append((int(user_id), points))
+        return grants
+
+    @app_commands.command(name="cute_give_bulk", description="Give cute points to a role, a list of members or a CSV")
+    @app_commands.guild_only()
+    @app_commands.check(has_cute_role)
+    @app_commands.describe(points="Points for every member, optional for CSV rows that have their own",
+                           role="Give to every member with this role", members="Mentions or IDs of members",
+                           csv_file="A CSV file of user_id,points rows")
+    async def cute_give_bulk(self, interaction: discord.Interaction, points: Optional[int] = None,
+                             role: Optional[discord.Role] = None, members: Optional[str] = None,
+                             csv_file: Optional[discord.Attachment] = None) -> None:
+        """
+        Command to give cute points to many members in one go, e.g. for event payouts.
+
+        Every change is applied in a single transaction and a single summary is posted to the log channel. A member
+        picked more than once, e.g. through both the role and a mention, gets points once, the last pick wins: CSV
+        rows over the role and mentions, later CSV rows over earlier ones.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            points (Optional[int]): The number of cute points every member gets.
+            role (Optional[discord.Role]): Give to every member with this role, bots excluded.
+            members (Optional[str]): Mentions or user IDs of members to give to.
+            csv_file (Optional[discord.Attachment]): A CSV of user_id[,points] rows.
+        """
+        async with Responder(interaction, ephemeral=True) as reply:
+            try:
+                if role is None and not members and csv_file is None:
+                    await reply.error("Pick a role, members or a CSV file")
+                    return
+                if points is None and (role is not None or members):
+                    await reply.error("Points are required for a role or members")
+                    return
+                if csv_file is not None and csv_file.size > MAX_BULK_CSV_BYTES:
+                    await reply.error("The CSV file is too large")
+                    return
+
+                if not interaction.guild.chunked and self.bot.intents.members:
+                    # Members are not cached up front, fetch this guild's member list once for role.members and
+                    # lookups
+                    await reply.defer()
+                    await interaction.guild.chunk()
+
+                picks: List[Tuple[int, int]] = []
+                if role is not None:
+                    picks.extend((member.id, points) for member in role.members if not member.bot)
+                if members:
+                    picks.extend((int(mention or user_id), points)
+                                 for mention, user_id in MEMBER_MENTION_PATTERN.findall(members))
+                if csv_file is not None:
+                    try:
+                        picks.extend(self._parse_bulk_csv(await csv_file.read(), points))
+                    except (ValueError, UnicodeDecodeError) as ex:
+                        await reply.error(f"Could not read the CSV file: {ex}")
+                        return
+
+                # One grant per member, a later pick replaces an earlier one
+                totals = dict(picks)
+                grants, skipped, zero = [], 0, 0
+                for user_id, delta in totals.items():
+                    member = interaction.guild.get_member(user_id)
+                    if member is None:
+                        skipped += 1
+                    elif delta:
+                        grants.append((user_id, member.display_name, delta))
+                    else:
+                        zero += 1
+                if not grants:
+                    await reply.error("Every picked member would get 0 points" if zero
+                                      else "None of the picked members are in this server")
+                    return
+                if len(grants) > MAX_BULK_RECIPIENTS:
+                    await reply.error(f"At most {MAX_BULK_RECIPIENTS} members can be given points at once")
+                    return
+
+                config = self.db.guild_config(interaction.guild_id)
+                await self.db.give_points_bulk(interaction.guild_id, grants, giver=interaction.user)
+                embed = style_manager.create_bulk_give_embed(grants, interaction.user, config.style_dir)
+                notes = []
+                if skipped:
+                    notes.append(f"Skipped {skipped} user(s) who are not in this server.")
+                if zero:
+                    notes.append(f"Skipped {zero} member(s) who would get 0 points.")
+                content = " ".join(notes) or None
+                await reply.send(content, embed=embed)
+                if config.log_channel_id:
+                    self.bot.log_delivery.enqueue(config.log_channel_id,
+                                                  style_manager.create_bulk_log_embed(grants, interaction.user,
+                                                                                      config.style_dir))
+            except Exception as ex:
+                logging.error(f"Error in cute_give_bulk: {ex}")
+                await reply.error("Failed to give cute points")
 
     @app_commands.command(name="cute_points", description="Look at your own points:3")
+    @app_commands.guild_only()
+    @rate_limit()
     async def cute_points(self, interaction: discord.Interaction) -> None:
         """
-        Command to check the cute points of the invoking user.
+        Command to check the cute points of the invoking user, along with their rank and distance to the next place.
 
         Args:
             interaction (discord.Interaction): The interaction context.
         """
-        try:
-            user_info = await self.db.get_or_create_user(interaction.user)
-            # user_info[2] represents the user's points
-            embed = style_manager.create_view_embed(user_info[2], interaction.user)
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+        async with Responder(interaction, ephemeral=True) as reply:
+            try:
+                points, rank, gap = await self.rank_reads.do(
+                    (interaction.guild_id, interaction.user.id),
+                    lambda: self.db.get_rank(interaction.guild_id, interaction.user))
+                embed = style_manager.create_view_embed(points, interaction.user, rank, gap,
+                                                        self.db.guild_config(interaction.guild_id).style_dir)
+                await reply.send(embed=embed)
 
-        except Exception as ex:
-            logging.error(f"Error in point_view command: {ex}")
-            await style_manager.send_error_embed(interaction, "Failed to retrieve your cute points")
+            except Exception as ex:
+                logging.error(f"Error in point_view command: {ex}")
+                await reply.error("Failed to retrieve your cute points")
+
+    async def _leaderboard_first_page(self, interaction: discord.Interaction, member_id: Optional[int],
+                                      period: Optional[str]) -> Tuple[int, List[Tuple[int, str, int]], bool,
+                                                                      discord.Embed]:
+        """
+        Fetches and renders the first leaderboard page a /cute_leaderboard call shows.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            member_id (Optional[int]): The user ID of a member whose page to open, None for the top of the board.
+            period (Optional[str]): The leaderboard period, None for all-time points.
+
+        Returns:
+            Tuple[int, List[Tuple[int, str, int]], bool, discord.Embed]: The first rank, the rows, whether a next
+                                                                         page exists and the rendered page.
+        """
+        if member_id is not None:
+            start_rank, rows, has_next = await self.db.get_leaderboard_page_of(interaction.guild_id, member_id,
+                                                                               period=period)
+        else:
+            start_rank, rows, has_next = await self.db.get_leaderboard_page(interaction.guild_id, period=period)
+        embed = style_manager.create_leaderboard_embed([(name, points) for _, name, points in rows],
+                                                       interaction.user, start_rank,
+                                                       self.db.guild_config(interaction.guild_id).style_dir,
+                                                       PERIOD_NAMES[period])
+        return start_rank, rows, has_next, embed
 
     @app_commands.command(name="cute_leaderboard", description="Look at the cute leaderboard :3")
-    async def cute_leaderboard(self, interaction: discord.Interaction) -> None:
+    @app_commands.guild_only()
+    @rate_limit()
+    @app_commands.describe(member="Open the page this member is on", period="Only count points given this day "
+                                                                           "or week")
+    @app_commands.choices(period=[app_commands.Choice(name=name, value=value)
+                                  for value, name in PERIOD_NAMES.items() if value])
+    async def cute_leaderboard(self, interaction: discord.Interaction, member: Optional[str] = None,
+                               period: Optional[app_commands.Choice[str]] = None) -> None:
+        """
+        Retrieves the first page of members with the highest cute points from the database
+        and displays their rankings and points in descending order, with buttons to move between pages.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            member (Optional[str]): The user ID of a member whose page to open, picked through autocomplete.
+            period (Optional[app_commands.Choice[str]]): Rank the points given today or this week instead of all
+                                                         points.
         """
-        Retrieves the top 10 members with the highest cute points from the database
-        and displays their rankings and points in descending order.
+        async with Responder(interaction, ephemeral=True) as reply:
+            try:
+                period_value = period.value if period else None
+                member_id = int(member) if member and member.isdigit() else None
+                # Everyone opening the same page at once shares one query and one rendered embed
+                start_rank, rows, has_next, embed = await self.leaderboard_reads.do(
+                    (interaction.guild_id, period_value, member_id),
+                    lambda: self._leaderboard_first_page(interaction, member_id, period_value))
+                view = LeaderboardView(self.db, interaction.guild_id, interaction.user, start_rank, rows, has_next,
+                                       period_value)
+                await reply.send(embed=style_manager.with_author(embed, interaction.user), view=view)
+            except Exception as ex:
+                logging.error(f"Error in cute_leaderboard: {ex}")
+                await reply.error("Failed to retrieve leaderboard data")
+
+    @cute_leaderboard.autocomplete("member")
+    async def member_autocomplete(self, interaction: discord.Interaction,
+                                  current: str) -> List[app_commands.Choice[str]]:
+        """
+        Suggests point holders of the server whose name matches what the user typed so far.
 
         Args:
             interaction (discord.Interaction): The interaction context.
+            current (str): The text typed so far.
+
+        Returns:
+            List[app_commands.Choice[str]]: The suggestions, valued by user ID.
         """
         try:
-            leaderboard_data = self.db.get_leaderboard_data()
-            embed = style_manager.create_leaderboard_embed(leaderboard_data, interaction.user)
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+            if not await self.debouncer.settle(interaction.user.id):
+                return []
+            members = await self.db.complete_member_names(interaction.guild_id, current)
+            return [app_commands.Choice(name=str(name)[:100], value=str(user_id)) for user_id, name in members]
         except Exception as ex:
-            logging.error(f"Error in cute_leaderboard: {ex}")
-            await style_manager.send_error_embed(interaction, "Failed to retrieve leaderboard data")
+            logging.error(f"Error in member autocomplete: {ex}")
+            return []
+
+    @app_commands.command(name="cute_config", description="Configure cute points for this server")
+    @app_commands.guild_only()
+    @app_commands.checks.has_permissions(manage_guild=True)
+    async def cute_config(self, interaction: discord.Interaction, role: Optional[discord.Role] = None,
+                          log_channel: Optional[discord.TextChannel] = None,
+                          style_dir: Optional[str] = None) -> None:
+        """
+        Command to set the server's cute role, log channel and style overrides. Omitted options keep their value.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            role (Optional[discord.Role]): The role allowed to distribute points.
+            log_channel (Optional[discord.TextChannel]): The channel point changes are logged to.
+            style_dir (Optional[str]): Subdirectory of styles/ with this server's style overrides.
+        """
+        async with Responder(interaction, ephemeral=True) as reply:
+            try:
+                if style_dir is not None and not STYLE_DIR_PATTERN.match(style_dir):
+                    await reply.error("Style directory may only contain letters, numbers, '-' and '_'")
+                    return
+
+                config = self.db.guild_config(interaction.guild_id)
+                config = config._replace(cute_role_id=role.id if role else config.cute_role_id,
+                                         log_channel_id=log_channel.id if log_channel else config.log_channel_id,
+                                         style_dir=style_dir if style_dir is not None else config.style_dir)
+                await self.db.set_guild_config(config)
+                await reply.send(
+                    f"Cute role: {f'<@&{config.cute_role_id}>' if config.cute_role_id else 'not set'}\n"
+                    f"Log channel: {f'<#{config.log_channel_id}>' if config.log_channel_id else 'not set'}\n"
+                    f"Style directory: {config.style_dir or 'default'}")
+            except Exception as ex:
+                logging.error(f"Error in cute_config: {ex}")
+                await reply.error("Failed to update the server configuration")
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -105,5 +482,5 @@ async def setup(bot: commands.Bot) -> None:
     Args:
         bot (commands.Bot): The Discord bot.
     """
-    # specifying a guild is essential, it doesnt register slash commands otherwise
-    await bot.add_cog(Cuteness(bot), guilds=[discord.Object(id=int(os.environ.get("GUILD_ID")))])
+    # commands are registered to GUILD_IDS/GUILD_ID when set, globally otherwise
+    await bot.add_cog(Cuteness(bot), guilds=command_guilds())
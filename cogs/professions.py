@@ -2,23 +2,109 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 import style_manager
+from admission import SingleFlight, rate_limit
+from autocomplete import Debouncer
+from responses import Responder
 import logging
-import os
-from typing import Optional
+from db_manager import DatabaseManager, PROFESSION_SEARCH_PAGE_SIZE
+from guild_config import command_guilds
+from typing import List, Optional, Tuple
+
+
+class ProfessionEditModal(discord.ui.Modal, title="Edit profession"):
+    """
+    Form for editing a stored profession post, prefilled with its current content.
+    """
+
+    def __init__(self, db: DatabaseManager, post: Tuple[int, str, str, str]) -> None:
+        """
+        Initializes an instance of the ProfessionEditModal.
+
+        Args:
+            db (DatabaseManager): The database the post is stored in.
+            post (Tuple[int, str, str, str]): The stored post as (owner_id, name, description, requirements).
+        """
+        super().__init__()
+        self.db = db
+        _, name, description, requirements = post
+        self.name = discord.ui.TextInput(label="Name", default=name, max_length=256)
+        self.description = discord.ui.TextInput(label="Description", default=description,
+                                                style=discord.TextStyle.paragraph, max_length=1024)
+        self.requirements = discord.ui.TextInput(label="Requirements, separated by commas", default=requirements,
+                                                 style=discord.TextStyle.paragraph, max_length=1024)
+        self.add_item(self.name)
+        self.add_item(self.description)
+        self.add_item(self.requirements)
+
+    async def on_submit(self, interaction: discord.Interaction) -> None:
+        """
+        Saves the edited post and updates its message.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+        """
+        async with Responder(interaction) as reply:
+            try:
+                await self.db.update_profession_post(interaction.message.id, self.name.value, self.description.value,
+                                                     self.requirements.value)
+                embed = style_manager.create_profession_embed(self.name.value, self.description.value,
+                                                              self.requirements.value, interaction.user,
+                                                              self.db.guild_config(interaction.guild_id).style_dir)
+                await reply.edit(embed=embed)
+            except Exception as ex:
+                logging.error(f"Error in profession edit: {ex}")
+                await reply.error("An error occurred while processing your request.")
+
 
 class ProfessionButtons(discord.ui.View):
-    def __init__(self, owner_id: int, *, timeout: Optional[float] = None) -> None:
+    """
+    The buttons under every profession post.
+
+    The custom IDs are fixed and the post's owner is looked up in the database by message ID, so a single instance
+    registered with bot.add_view handles the buttons of every post, including posts sent before a restart.
+    """
+
+    def __init__(self, db: DatabaseManager) -> None:
         """
         Initializes an instance of the ProfessionButtons view.
 
         Args:
-            owner_id (int): The ID of the user who owns the profession-related action.
-            timeout (Optional[float]): The timeout for the view, in seconds.
+            db (DatabaseManager): The database profession posts are stored in.
         """
-        self.owner_id = owner_id
-        super().__init__(timeout=timeout)
+        super().__init__(timeout=None)
+        self.db = db
+
+    async def _owned_post(self, interaction: discord.Interaction) -> Optional[Tuple[int, str, str, str]]:
+        """
+        Returns the post the button belongs to if the interacting user owns it, otherwise tells them why not.
+        """
+        post = await self.db.get_profession_post(interaction.message.id)
+        if post is None:
+            await style_manager.send_error_embed(interaction, "This profession post is no longer tracked.")
+            return None
+        if post[0] != interaction.user.id:
+            await style_manager.send_error_embed(interaction, "Only the author of this post can change it.")
+            return None
+        return post
+
+    @discord.ui.button(label="Edit", style=discord.ButtonStyle.gray, custom_id="profession:edit")
+    async def edit_button(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        """
+        A button callback for editing a profession message, only available to the user that created it.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            button (discord.ui.Button): The button that triggered the interaction.
+        """
+        try:
+            post = await self._owned_post(interaction)
+            if post is not None:
+                await interaction.response.send_modal(ProfessionEditModal(self.db, post))
+        except Exception as ex:
+            logging.error(f"Error in profession command: {ex}")
+            await style_manager.send_error_embed(interaction, "An error occurred while processing your request.")
 
-    @discord.ui.button(label="Delete", style=discord.ButtonStyle.gray)
+    @discord.ui.button(label="Delete", style=discord.ButtonStyle.gray, custom_id="profession:delete")
     async def delete_button(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
         """
         A button callback for deleting a profession message. It ensures that only the user that created the message is
@@ -29,13 +115,109 @@ class ProfessionButtons(discord.ui.View):
             button (discord.ui.Button): The button that triggered the interaction.
         """
         try:
-            if self.owner_id == interaction.user.id:
+            if await self._owned_post(interaction) is not None:
+                # Forget the post first, a failed delete leaves a message that is no longer tracked rather than a
+                # tracked post that is gone
+                await self.db.delete_profession_post(interaction.message.id)
                 await interaction.message.delete()
         except Exception as ex:
             logging.error(f"Error in profession command: {ex}")
             await style_manager.send_error_embed(interaction, "An error occurred while processing your request.")
 
 
+class ProfessionSearchView(discord.ui.View):
+    def __init__(self, db: DatabaseManager, guild_id: Optional[int], author: discord.User, query: str,
+                 results: List[Tuple[int, Optional[int], int, str, str]], has_next: bool, *,
+                 timeout: Optional[float] = 180) -> None:
+        """
+        Initializes an instance of the ProfessionSearchView with the first page already loaded.
+
+        Args:
+            db (DatabaseManager): The database manager used to fetch further pages.
+            guild_id (Optional[int]): The guild whose posts are searched.
+            author (discord.User): The user who searched.
+            query (str): The search text.
+            results (List[Tuple[int, Optional[int], int, str, str]]): The results on the first page.
+            has_next (bool): Whether a page exists after the first one.
+            timeout (Optional[float]): The timeout for the view, in seconds.
+        """
+        super().__init__(timeout=timeout)
+        self.db = db
+        self.guild_id = guild_id
+        self.author = author
+        self.query = query
+        self.offset = 0
+        self.results = results
+        self.has_next = has_next
+        self._update_buttons()
+
+    def _update_buttons(self) -> None:
+        self.previous_button.disabled = self.offset == 0
+        self.next_button.disabled = not self.has_next
+
+    def create_embed(self) -> discord.Embed:
+        """
+        Renders the current page.
+
+        Returns:
+            discord.Embed: The search results embed for the current page.
+        """
+        return style_manager.create_profession_search_embed(self.query, self.results, self.author, self.guild_id,
+                                                            self.offset // PROFESSION_SEARCH_PAGE_SIZE + 1,
+                                                            self.offset + 1,
+                                                            self.db.guild_config(self.guild_id).style_dir)
+
+    async def _show_page(self, reply: Responder, forward: bool) -> None:
+        """
+        Fetches the page before or after the current one and edits the message to show it.
+
+        Args:
+            reply (Responder): Answers the button's interaction.
+            forward (bool): Whether to move to the next page or the previous one.
+        """
+        step = PROFESSION_SEARCH_PAGE_SIZE
+        offset = self.offset + step if forward else max(self.offset - step, 0)
+        results, has_next = await self.db.search_professions(self.guild_id, self.query, offset)
+        if results:
+            self.offset, self.results, self.has_next = offset, results, has_next
+        else:
+            self.has_next = False
+        self._update_buttons()
+        await reply.edit(embed=self.create_embed(), view=self)
+
+    @discord.ui.button(label="Prev", style=discord.ButtonStyle.gray)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        """
+        A button callback showing the previous page of results.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            button (discord.ui.Button): The button that triggered the interaction.
+        """
+        async with Responder(interaction) as reply:
+            try:
+                await self._show_page(reply, forward=False)
+            except Exception as ex:
+                logging.error(f"Error in profession search previous page: {ex}")
+                await reply.error("An error occurred while processing your request.")
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.gray)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button) -> None:
+        """
+        A button callback showing the next page of results.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            button (discord.ui.Button): The button that triggered the interaction.
+        """
+        async with Responder(interaction) as reply:
+            try:
+                await self._show_page(reply, forward=True)
+            except Exception as ex:
+                logging.error(f"Error in profession search next page: {ex}")
+                await reply.error("An error occurred while processing your request.")
+
+
 class Professions(commands.Cog):
     """
     A Discord Cog for managing user professions.
@@ -49,6 +231,9 @@ class Professions(commands.Cog):
             bot (commands.Bot): The Discord bot instance.
         """
         self.bot: commands.Bot = bot
+        self.debouncer = Debouncer()
+        # Identical searches running at the same time share one query
+        self.search_reads = SingleFlight("profession_search")
 
     @commands.Cog.listener()
     async def on_ready(self) -> None:
@@ -59,6 +244,63 @@ class Professions(commands.Cog):
         """
         logging.info("Professions cog loaded successfully.")
 
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent) -> None:
+        """
+        Listener function called when a message is deleted, cached or not.
+
+        Forgets the message if it was a profession post, e.g. removed by a moderator.
+
+        Args:
+            payload (discord.RawMessageDeleteEvent): The deleted message.
+        """
+        # Posts are sent by the bot, other cached messages are skipped without a lookup
+        if payload.cached_message is not None and payload.cached_message.author != self.bot.user:
+            return
+        try:
+            await self.bot.db.forget_deleted_messages([payload.message_id])
+        except Exception as ex:
+            logging.error(f"Error in profession message delete: {ex}")
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent) -> None:
+        """
+        Listener function called when messages are purged.
+
+        Args:
+            payload (discord.RawBulkMessageDeleteEvent): The deleted messages.
+        """
+        try:
+            await self.bot.db.forget_deleted_messages(payload.message_ids)
+        except Exception as ex:
+            logging.error(f"Error in profession message delete: {ex}")
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel) -> None:
+        """
+        Listener function called when a channel is deleted, which deletes its messages without a delete event.
+
+        Args:
+            channel (discord.abc.GuildChannel): The deleted channel.
+        """
+        try:
+            await self.bot.db.forget_deleted_channel(channel.id)
+        except Exception as ex:
+            logging.error(f"Error in profession channel delete: {ex}")
+
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent) -> None:
+        """
+        Listener function called when a thread is deleted, cached or not.
+
+        Args:
+            payload (discord.RawThreadDeleteEvent): The deleted thread.
+        """
+        try:
+            await self.bot.db.forget_deleted_channel(payload.thread_id)
+        except Exception as ex:
+            logging.error(f"Error in profession channel delete: {ex}")
+
     @app_commands.command(name="profession", description="meowfession descwiption")
     async def profession(self, interaction: discord.Interaction, name: str, description: str,
                          requirements: str) -> None:
@@ -71,12 +313,65 @@ class Professions(commands.Cog):
             description (str): The description of the service.
             requirements (str): Requirements for the service, separated by commas.
         """
+        async with Responder(interaction) as reply:
+            try:
+                embed = style_manager.create_profession_embed(name, description, requirements, interaction.user,
+                                                              self.bot.db.guild_config(interaction.guild_id).style_dir)
+                view = ProfessionButtons(self.bot.db)
+                message = await reply.send(embed=embed, view=view)
+                # Clicks are handled by the persistent view registered in setup, drop the per-message copy
+                view.stop()
+                if message is None:
+                    message = await interaction.original_response()
+                await self.bot.db.add_profession_post(message.id, interaction.guild_id, interaction.channel_id,
+                                                      interaction.user.id, name, description, requirements)
+            except Exception as ex:
+                logging.error(f"Error in profession command: {ex}")
+                await reply.error("An error occurred while processing your request.")
+
+    @app_commands.command(name="profession_search", description="seawch fow a meowfession")
+    @rate_limit()
+    async def profession_search(self, interaction: discord.Interaction, query: str) -> None:
+        """
+        Command to search the profession posts of the server by name, description and requirements.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            query (str): The words to search for.
+        """
+        async with Responder(interaction, ephemeral=True) as reply:
+            try:
+                results, has_next = await self.search_reads.do(
+                    (interaction.guild_id, query), lambda: self.bot.db.search_professions(interaction.guild_id, query))
+                view = ProfessionSearchView(self.bot.db, interaction.guild_id, interaction.user, query, results,
+                                            has_next)
+                await reply.send(embed=view.create_embed(), view=view)
+            except Exception as ex:
+                logging.error(f"Error in profession_search command: {ex}")
+                await reply.error("An error occurred while processing your request.")
+
+    @profession.autocomplete("name")
+    @profession_search.autocomplete("query")
+    async def profession_name_autocomplete(self, interaction: discord.Interaction,
+                                           current: str) -> List[app_commands.Choice[str]]:
+        """
+        Suggests the names of the server's profession posts matching what the user typed so far.
+
+        Args:
+            interaction (discord.Interaction): The interaction context.
+            current (str): The text typed so far.
+
+        Returns:
+            List[app_commands.Choice[str]]: The suggestions.
+        """
         try:
-            embed = style_manager.create_profession_embed(name, description, requirements, interaction.user)
-            await interaction.response.send_message(embed=embed, view=ProfessionButtons(interaction.user.id))
+            if not await self.debouncer.settle(interaction.user.id):
+                return []
+            names = await self.bot.db.complete_profession_names(interaction.guild_id, current)
+            return [app_commands.Choice(name=name[:100], value=name[:100]) for name in names]
         except Exception as ex:
-            logging.error(f"Error in profession command: {ex}")
-            await style_manager.send_error_embed(interaction, "An error occurred while processing your request.")
+            logging.error(f"Error in profession autocomplete: {ex}")
+            return []
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -86,13 +381,14 @@ async def setup(bot: commands.Bot) -> None:
     Args:
         bot (commands.Bot): The Discord bot.
     """
-    # specifying a guild is essential, it doesnt register slash commands otherwise
-    await bot.add_cog(Professions(bot), guilds=[discord.Object(id=int(os.environ.get("GUILD_ID")))])
+    # One view serves the buttons of every profession post, past and future
+    bot.add_view(ProfessionButtons(bot.db))
+    # commands are registered to GUILD_IDS/GUILD_ID when set, globally otherwise
+    await bot.add_cog(Professions(bot), guilds=command_guilds())
 
 
 """
 TODO:
     Preview of the profession message before sending, needs a confirmation button
     Maybe limit the length of some strings, for example, "title"
-    Deletion/editing of post
 """
@@ -0,0 +1,62 @@
+import hashlib
+import json
+import logging
+from typing import List, Optional, Sequence
+
+import discord
+from discord import app_commands
+
+from db_manager import DatabaseManager
+
+
+def command_tree_hash(tree: app_commands.CommandTree, guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """
+    Hashes the commands registered for a guild, or the global commands, exactly as they would be synced.
+
+    The payload is serialized with sorted keys and commands in a fixed order, so the hash only changes when a
+    command's name, description, options, permissions or other synced fields change.
+
+    Args:
+        tree (app_commands.CommandTree): The bot's command tree.
+        guild (Optional[discord.abc.Snowflake]): The guild, None for global commands.
+
+    Returns:
+        str: The hex digest of the command payload.
+    """
+    payload = sorted((command.to_dict() for command in tree.get_commands(guild=guild)),
+                     key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf8")).hexdigest()
+
+
+async def sync_command_tree(tree: app_commands.CommandTree, db: DatabaseManager,
+                            guilds: Sequence[Optional[discord.abc.Snowflake]], force: bool = False) -> List[int]:
+    """
+    Syncs the command tree of every given scope whose commands changed since they were last synced.
+
+    Syncing is heavily rate limited by Discord, so the hash of the synced commands is stored per application and
+    scope, and a scope is only synced again when its hash differs. Restarts without command changes make no sync
+    requests at all.
+
+    Args:
+        tree (app_commands.CommandTree): The bot's command tree, its client must be logged in.
+        db (DatabaseManager): The database the hashes are stored in.
+        guilds (Sequence[Optional[discord.abc.Snowflake]]): The guilds to sync, None stands for global commands.
+        force (bool): Sync even if the commands did not change.
+
+    Returns:
+        List[int]: The number of commands synced per scope, 0 for scopes that were up to date.
+    """
+    synced = []
+    for guild in guilds:
+        scope = str(guild.id) if guild is not None else "global"
+        key = f"command_hash:{tree.client.application_id}:{scope}"
+        digest = command_tree_hash(tree, guild)
+        if not force and await db.get_state(key) == digest:
+            logging.info(f"Commands for {scope} are up to date, skipping sync.")
+            synced.append(0)
+            continue
+        commands = await tree.sync(guild=guild)
+        await db.set_state(key, digest)
+        logging.info(f"Synced {len(commands)} commands for {scope}.")
+        synced.append(len(commands))
+    return synced
@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Generator, List, NamedTuple, Optional, Sequence, Tuple
+
+from db_manager import DatabaseManager
+
+EXPORT_CHUNK_SIZE = 10_000
+IMPORT_BATCH_SIZE = 10_000
+
+FORMATS = ("csv", "jsonl")
+
+
+def _optional_int(value: Any) -> Optional[int]:
+    return None if value is None or value == "" else int(value)
+
+
+def _text(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+class Table(NamedTuple):
+    """
+    How a table is exported and imported.
+
+    Attributes:
+        columns (Tuple[str, ...]): The exported columns, in file order.
+        types (Tuple[Callable[[Any], Any], ...]): Per column, converts a value read from a file.
+        key (Tuple[str, ...]): Unique columns the export pages through, in index order.
+        conflict (str): The ON CONFLICT clause used on import.
+    """
+    columns: Tuple[str, ...]
+    types: Tuple[Callable[[Any], Any], ...]
+    key: Tuple[str, ...]
+    conflict: str
+
+
+# Imported rows replace the stored ones, except ledger entries, which are kept as they are
+TABLES: Dict[str, Table] = {
+    "cutePoints": Table(
+        ("guild_id", "userid", "name", "points"), (int, int, _text, int), ("guild_id", "userid"),
+        "ON CONFLICT(guild_id, userid) DO UPDATE SET name = excluded.name, points = excluded.points"),
+    "guildConfig": Table(
+        ("guild_id", "cute_role_id", "log_channel_id", "style_dir"), (int, _optional_int, _optional_int, _text),
+        ("guild_id",),
+        "ON CONFLICT(guild_id) DO UPDATE SET cute_role_id = excluded.cute_role_id, "
+        "log_channel_id = excluded.log_channel_id, style_dir = excluded.style_dir"),
+    "professionPosts": Table(
+        ("message_id", "guild_id", "channel_id", "owner_id", "name", "description", "requirements", "created_at"),
+        (int, _optional_int, _optional_int, int, str, str, str, int), ("message_id",),
+        "ON CONFLICT(message_id) DO UPDATE SET guild_id = excluded.guild_id, channel_id = excluded.channel_id, "
+        "owner_id = excluded.owner_id, name = excluded.name, description = excluded.description, "
+        "requirements = excluded.requirements, created_at = excluded.created_at"),
+    "pointLedger": Table(
+        ("id", "guild_id", "giver_id", "receiver_id", "delta", "created_at"),
+        (int, int, _optional_int, int, int, int), ("id",), "ON CONFLICT(id) DO NOTHING"),
+    "pointLedgerSnapshots": Table(
+        ("guild_id", "day_start", "giver_id", "receiver_id", "delta", "entries"), (int, int, int, int, int, int),
+        ("guild_id", "day_start", "giver_id", "receiver_id"),
+        "ON CONFLICT(guild_id, day_start, giver_id, receiver_id) DO UPDATE SET delta = excluded.delta, "
+        "entries = excluded.entries"),
+    "pointRollups": Table(
+        ("guild_id", "period", "period_start", "userid", "points"), (int, str, int, int, int),
+        ("guild_id", "period", "period_start", "userid"),
+        "ON CONFLICT(guild_id, period, period_start, userid) DO UPDATE SET points = excluded.points"),
+    "seasons": Table(
+        ("season", "started_at", "ended_at", "last_point_id", "users", "completed_at"),
+        (int, _optional_int, int, int, int, _optional_int), ("season",),
+        "ON CONFLICT(season) DO UPDATE SET started_at = excluded.started_at, ended_at = excluded.ended_at, "
+        "last_point_id = excluded.last_point_id, users = excluded.users, completed_at = excluded.completed_at"),
+    "seasonPoints": Table(
+        ("season", "guild_id", "userid", "name", "points"), (int, int, int, _text, int),
+        ("season", "guild_id", "userid"),
+        "ON CONFLICT(season, guild_id, userid) DO UPDATE SET name = excluded.name, points = excluded.points"),
+}
+
+
+def file_format(path: str, fmt: Optional[str] = None) -> str:
+    """
+    Returns the format of a file, given explicitly or taken from its extension.
+
+    Raises:
+        ValueError: If the format is not one of FORMATS.
+    """
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format {fmt!r}, use one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def _table(name: str) -> Table:
+    table = TABLES.get(name)
+    if table is None:
+        raise ValueError(f"Unknown table {name!r}, use one of {', '.join(TABLES)}")
+    return table
+
+
+_encode_json = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def _write_rows(out: Any, fmt: str, columns: Sequence[str], rows: List[tuple]) -> None:
+    if fmt == "csv":
+        csv.writer(out).writerows(rows)
+    else:
+        out.writelines(_encode_json(dict(zip(columns, row))) + "\n" for row in rows)
+
+
+async def _report(progress: Optional[Callable[[int], Any]], rows: int) -> None:
+    if progress is not None:
+        result = progress(rows)
+        if asyncio.iscoroutine(result):
+            await result
+
+
+async def export_table(db: DatabaseManager, table_name: str, path: str, fmt: Optional[str] = None,
+                       chunk_size: int = EXPORT_CHUNK_SIZE,
+                       progress: Optional[Callable[[int], Any]] = None) -> int:
+    """
+    Streams a table into a CSV or JSONL file.
+
+    Rows are read in key order one chunk at a time, each chunk in its own short read on the reader pool, so memory
+    use stays constant and no snapshot is held open for the whole export. Readers never block the writer in WAL
+    mode. Chunks are formatted and written on the reader thread as well, the event loop only waits.
+
+    Args:
+        db (DatabaseManager): The database to export from.
+        table_name (str): The table, one of TABLES.
+        path (str): The file to write.
+        fmt (Optional[str]): 'csv' or 'jsonl', taken from the file extension by default.
+        chunk_size (int): The number of rows read per query.
+        progress (Optional[Callable[[int], Any]]): Called, or awaited, with the number of rows written so far after
+                                                   every chunk.
+
+    Returns:
+        int: The number of rows written.
+    """
+    table = _table(table_name)
+    fmt = file_format(path, fmt)
+    columns = ", ".join(table.columns)
+    key = ", ".join(table.key)
+    first = f"SELECT {columns} FROM {table_name} ORDER BY {key} LIMIT ?"
+    after = (f"SELECT {columns} FROM {table_name} WHERE ({key}) > ({', '.join('?' * len(table.key))}) "
+             f"ORDER BY {key} LIMIT ?")
+    key_positions = [table.columns.index(column) for column in table.key]
+
+    with open(path, "w", encoding="utf8", newline="") as out:
+        if fmt == "csv":
+            csv.writer(out).writerow(table.columns)
+
+        def _chunk(conn: sqlite3.Connection, cursor: Optional[tuple]) -> Tuple[int, tuple]:
+            if cursor is None:
+                rows = conn.execute(first, (chunk_size,)).fetchall()
+            else:
+                rows = conn.execute(after, (*cursor, chunk_size)).fetchall()
+            _write_rows(out, fmt, table.columns, rows)
+            return len(rows), tuple(rows[-1][position] for position in key_positions) if rows else cursor
+
+        total, cursor = 0, None
+        while True:
+            count, cursor = await db.read(lambda conn, cursor=cursor: _chunk(conn, cursor))
+            total += count
+            await _report(progress, total)
+            if count < chunk_size:
+                return total
+
+
+def read_rows(path: str, table_name: str, fmt: Optional[str] = None) -> Generator[tuple, None, None]:
+    """
+    Lazily reads the rows of an exported file, converted to the table's column types.
+
+    CSV files need a header naming the columns, JSONL files one object per line. Columns may come in any order,
+    columns missing from the file are stored as NULL where the table allows it.
+
+    Args:
+        path (str): The file to read.
+        table_name (str): The table the rows belong to, one of TABLES.
+        fmt (Optional[str]): 'csv' or 'jsonl', taken from the file extension by default.
+
+    Yields:
+        tuple: The rows, with values in the order of the table's columns.
+
+    Raises:
+        ValueError: If a row cannot be converted, with the line it was found on.
+    """
+    table = _table(table_name)
+    fmt = file_format(path, fmt)
+    with open(path, encoding="utf-8-sig", newline="") as source:
+        if fmt == "csv":
+            reader = csv.reader(source)
+            header = next(reader, [])
+            positions = [header.index(column) if column in header else None for column in table.columns]
+            records = ((line, row) for line, row in enumerate(reader, start=2) if row)
+
+            def values(row: List[str]) -> List[Optional[str]]:
+                return [None if position is None else row[position] for position in positions]
+        else:
+            records = ((line, text) for line, text in enumerate(source, start=1) if text.strip())
+
+            def values(text: str) -> List[Any]:
+                record = json.loads(text)
+                return [record.get(column) for column in table.columns]
+
+        for line, record in records:
+            try:
+                yield tuple([convert(value) for convert, value in zip(table.types, values(record))])
+            except (AttributeError, IndexError, TypeError, ValueError) as ex:
+                raise ValueError(f"{path} line {line}: {ex}") from None
+
+
+async def import_table(db: DatabaseManager, table_name: str, path: str, fmt: Optional[str] = None,
+                       batch_size: int = IMPORT_BATCH_SIZE,
+                       progress: Optional[Callable[[int], Any]] = None) -> int:
+    """
+    Loads a CSV or JSONL file into a table, in batches of upserts.
+
+    Every batch is read from the file and written with executemany in a single transaction on the writer thread,
+    so point changes made meanwhile only wait for the batch in progress, never for the whole import. A failed batch
+    is rolled back, earlier batches stay imported. The in-memory caches are dropped afterwards, so rankings and
+    names are read again from the imported data.
+
+    Args:
+        db (DatabaseManager): The database to import into.
+        table_name (str): The table, one of TABLES.
+        path (str): The file to read.
+        fmt (Optional[str]): 'csv' or 'jsonl', taken from the file extension by default.
+        batch_size (int): The number of rows written per transaction.
+        progress (Optional[Callable[[int], Any]]): Called, or awaited, with the number of rows imported so far after
+                                                   every batch.
+
+    Returns:
+        int: The number of rows imported.
+    """
+    table = _table(table_name)
+    rows = read_rows(path, table_name, fmt)
+    upsert = (f"INSERT INTO {table_name} ({', '.join(table.columns)}) "
+              f"VALUES ({', '.join('?' * len(table.columns))}) {table.conflict}")
+
+    def _batch(conn: sqlite3.Connection) -> int:
+        batch = list(islice(rows, batch_size))
+        conn.executemany(upsert, batch)
+        return len(batch)
+
+    total = 0
+    try:
+        while True:
+            count = await db.run(_batch)
+            total += count
+            await _report(progress, total)
+            if count < batch_size:
+                return total
+    finally:
+        rows.close()
+        await db.drop_caches()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    db = DatabaseManager(args.db)
+    db.setup_database()
+    started = time.perf_counter()
+
+    def progress(rows: int) -> None:
+        print(f"\r{rows} rows", end="", file=sys.stderr, flush=True)
+
+    try:
+        if args.command == "export":
+            total = await export_table(db, args.table, args.path, args.format, args.chunk_size, progress)
+        else:
+            total = await import_table(db, args.table, args.path, args.format, args.chunk_size, progress)
+    finally:
+        await db.close()
+    print(f"\r{args.command.capitalize()}ed {total} {args.table} rows in {time.perf_counter() - started:.2f}s",
+          file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Command line entry point, run `python -m data_transfer --help` for usage.
+    """
+    parser = argparse.ArgumentParser(prog="python -m data_transfer",
+                                     description="Export tables to CSV or JSONL files, or import them back.")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("table", choices=list(TABLES))
+    parser.add_argument("path", help="the file to write or read, .csv or .jsonl")
+    parser.add_argument("--format", choices=FORMATS, help="file format, taken from the extension by default")
+    parser.add_argument("--db", default="owodb.db", help="database file (default owodb.db)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE, help="rows per query or transaction")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        asyncio.run(_main(args))
+    except (OSError, ValueError, sqlite3.Error) as ex:
+        parser.exit(1, f"\nError: {ex}\n")
+
+
+if __name__ == "__main__":
+    main()
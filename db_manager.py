@@ -1,7 +1,367 @@
 import discord
 import sqlite3
-from typing import Optional, Type, Any, List, Tuple
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Type, Any, List, Tuple, Callable, TypeVar, Dict, Iterable, NamedTuple, Set
 import logging
+from write_queue import LedgerEntry, PointWriteQueue
+from rank_index import RankIndex
+from autocomplete import MAX_CHOICES, PrefixIndex
+from guild_config import GuildConfig, legacy_guild_config
+from metrics import BATCH_JOB_LOCK_SECONDS, BATCH_JOB_SECONDS, DB_QUERY_SECONDS, DB_QUEUE_SECONDS
+from tracing import tracer
+from invalidation import (Event, InvalidationBus, PointRow, TOPIC_ALL, TOPIC_CONFIG, TOPIC_POINTS, TOPIC_PROFESSIONS,
+                          bus_from_env)
+
+T = TypeVar("T")
+
+# Pragmas applied to every long-lived connection opened by the async engine.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=67108864",
+)
+
+ENGINE_ASYNC = "async"
+ENGINE_LEGACY = "legacy"
+
+# Adds a delta to a user's points in one statement, creating the row on first use. The stored name is refreshed
+# too, rename events only arrive for members in the member cache.
+UPSERT_POINTS = """
+    INSERT INTO cutePoints (guild_id, name, points, userid) VALUES (?, ?, ?, ?)
+    ON CONFLICT(guild_id, userid) DO UPDATE SET points = points + excluded.points, name = excluded.name
+"""
+
+LEADERBOARD_PAGE_SIZE = 10
+
+# Leaderboard periods backed by rollups, the all-time board is served from cutePoints
+PERIOD_DAY = "day"
+PERIOD_WEEK = "week"
+ROLLUP_PERIODS = (PERIOD_DAY, PERIOD_WEEK)
+
+UPSERT_ROLLUP = """
+    INSERT INTO pointRollups (guild_id, period, period_start, userid, points) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(guild_id, period, period_start, userid) DO UPDATE SET points = points + excluded.points
+"""
+
+# Ledger rows older than the cutoff are folded into per day, per giver and receiver snapshots. Givers are stored as 0
+# in snapshots when unknown, because NULLs never conflict in the primary key.
+COMPACT_LEDGER = """
+    INSERT INTO pointLedgerSnapshots (guild_id, day_start, giver_id, receiver_id, delta, entries)
+    SELECT guild_id, created_at / 86400 * 86400, COALESCE(giver_id, 0), receiver_id, SUM(delta), COUNT(*)
+    FROM pointLedger WHERE id <= ? GROUP BY 1, 2, 3, 4
+    ON CONFLICT(guild_id, day_start, giver_id, receiver_id)
+    DO UPDATE SET delta = delta + excluded.delta, entries = entries + excluded.entries
+"""
+
+# Batch jobs over cutePoints work through it in chunks of consecutive row IDs, every chunk is one transaction. Larger
+# chunks rewrite the points index less often, 10000 rows hold the write lock for roughly 50ms.
+POINT_JOB_CHUNK_SIZE = int(os.environ.get("POINT_JOB_CHUNK_SIZE", 10_000))
+
+# The next chunk of a batch job: the highest row ID of the next chunk_size rows after the last chunk, up to the last
+# row that existed when the job started
+NEXT_POINT_CHUNK = """
+    SELECT MAX(id) FROM (SELECT id FROM cutePoints WHERE id > ? AND id <= ? ORDER BY id LIMIT ?)
+"""
+
+# botState key of the last decay: its due time, the share kept, and how far it got (None once finished)
+DECAY_STATE_KEY = "point_decay"
+
+PROFESSION_SEARCH_PAGE_SIZE = 5
+
+# Rows read per query when refreshing rows another process changed, well below SQLite's parameter limit
+REFRESH_CHUNK_SIZE = 500
+
+# bm25 column weights for guild_id, name, description and requirements, a match in the name counts the most
+PROFESSION_SEARCH_WEIGHTS = (0.0, 10.0, 2.0, 4.0)
+# Only the most recent matches are ranked, which bounds the cost of searching for very common words
+PROFESSION_SEARCH_CANDIDATES = 500
+
+# Ordered schema migrations as (version, script). Each script runs in its own transaction and the database's
+# user_version records the last one applied, so existing owodb.db files are upgraded on startup.
+# {legacy_guild_id} is replaced with GUILD_ID, the guild that owned the data before it was partitioned per guild.
+MIGRATIONS: List[Tuple[int, str]] = [
+    (1, """
+        CREATE TABLE IF NOT EXISTS cutePoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            points INTEGER,
+            userid INTEGER NOT NULL UNIQUE
+        );
+    """),
+    (2, """
+        CREATE INDEX IF NOT EXISTS idx_cutePoints_points_userid ON cutePoints (points DESC, userid);
+    """),
+    (3, """
+        CREATE TABLE cutePoints_partitioned (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            name TEXT,
+            points INTEGER,
+            userid INTEGER NOT NULL,
+            UNIQUE (guild_id, userid)
+        );
+        INSERT INTO cutePoints_partitioned (id, guild_id, name, points, userid)
+            SELECT id, {legacy_guild_id}, name, points, userid FROM cutePoints;
+        DROP TABLE cutePoints;
+        ALTER TABLE cutePoints_partitioned RENAME TO cutePoints;
+        CREATE INDEX idx_cutePoints_guild_points_userid ON cutePoints (guild_id, points DESC, userid);
+
+        CREATE TABLE guildConfig (
+            guild_id INTEGER PRIMARY KEY,
+            cute_role_id INTEGER,
+            log_channel_id INTEGER,
+            style_dir TEXT
+        );
+    """),
+    (4, """
+        CREATE TABLE professionPosts (
+            message_id INTEGER PRIMARY KEY,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            owner_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            requirements TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        );
+        CREATE INDEX idx_professionPosts_guild_owner ON professionPosts (guild_id, owner_id);
+    """),
+    (5, """
+        CREATE VIRTUAL TABLE professionSearch USING fts5(
+            guild_id, name, description, requirements,
+            content='professionPosts', content_rowid='message_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        );
+        INSERT INTO professionSearch (professionSearch) VALUES ('rebuild');
+
+        CREATE TRIGGER professionPosts_search_insert AFTER INSERT ON professionPosts BEGIN
+            INSERT INTO professionSearch (rowid, guild_id, name, description, requirements)
+                VALUES (new.message_id, new.guild_id, new.name, new.description, new.requirements);
+        END;
+        CREATE TRIGGER professionPosts_search_delete AFTER DELETE ON professionPosts BEGIN
+            INSERT INTO professionSearch (professionSearch, rowid, guild_id, name, description, requirements)
+                VALUES ('delete', old.message_id, old.guild_id, old.name, old.description, old.requirements);
+        END;
+        CREATE TRIGGER professionPosts_search_update AFTER UPDATE ON professionPosts BEGIN
+            INSERT INTO professionSearch (professionSearch, rowid, guild_id, name, description, requirements)
+                VALUES ('delete', old.message_id, old.guild_id, old.name, old.description, old.requirements);
+            INSERT INTO professionSearch (rowid, guild_id, name, description, requirements)
+                VALUES (new.message_id, new.guild_id, new.name, new.description, new.requirements);
+        END;
+    """),
+    (6, """
+        CREATE TABLE pointLedger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            guild_id INTEGER NOT NULL,
+            giver_id INTEGER,
+            receiver_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            created_at INTEGER NOT NULL
+        );
+        CREATE INDEX idx_pointLedger_created ON pointLedger (created_at);
+        CREATE INDEX idx_pointLedger_guild_receiver ON pointLedger (guild_id, receiver_id, created_at);
+        CREATE INDEX idx_pointLedger_guild_giver ON pointLedger (guild_id, giver_id, created_at);
+
+        CREATE TABLE pointLedgerSnapshots (
+            guild_id INTEGER NOT NULL,
+            day_start INTEGER NOT NULL,
+            giver_id INTEGER NOT NULL,
+            receiver_id INTEGER NOT NULL,
+            delta INTEGER NOT NULL,
+            entries INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, day_start, giver_id, receiver_id)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE pointRollups (
+            guild_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            period_start INTEGER NOT NULL,
+            userid INTEGER NOT NULL,
+            points INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, period, period_start, userid)
+        ) WITHOUT ROWID;
+        CREATE INDEX idx_pointRollups_board ON pointRollups (guild_id, period, period_start, points DESC, userid);
+    """),
+    (7, """
+        CREATE TABLE botState (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """),
+    (8, """
+        CREATE TABLE cacheInvalidations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            guild_id INTEGER,
+            created_at INTEGER NOT NULL
+        );
+        CREATE INDEX idx_cacheInvalidations_created ON cacheInvalidations (created_at);
+    """),
+    (9, """
+        CREATE TABLE seasons (
+            season INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at INTEGER,
+            ended_at INTEGER NOT NULL,
+            last_point_id INTEGER NOT NULL,
+            users INTEGER NOT NULL DEFAULT 0,
+            completed_at INTEGER
+        );
+
+        CREATE TABLE seasonPoints (
+            season INTEGER NOT NULL,
+            guild_id INTEGER NOT NULL,
+            userid INTEGER NOT NULL,
+            name TEXT,
+            points INTEGER NOT NULL,
+            PRIMARY KEY (season, guild_id, userid)
+        ) WITHOUT ROWID;
+    """),
+    (10, """
+        ALTER TABLE cacheInvalidations ADD COLUMN userid INTEGER;
+    """),
+]
+
+
+def run_migrations(conn: sqlite3.Connection, legacy_guild_id: int = 0) -> int:
+    """
+    Applies every migration newer than the database's current schema version.
+
+    Args:
+        conn (sqlite3.Connection): An open connection.
+        legacy_guild_id (int): The guild that owns rows created before points were partitioned per guild.
+
+    Returns:
+        int: The schema version after migrating.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, script in MIGRATIONS:
+        if target <= version:
+            continue
+        script = script.format(legacy_guild_id=int(legacy_guild_id))
+        try:
+            conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {target};\nCOMMIT;")
+        except sqlite3.Error as ex:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Another process sharing the database may have applied it first
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= target:
+                continue
+            logging.error(f"Error applying database migration {target}: {ex}")
+            raise
+        logging.info(f"Applied database migration {target}.")
+        version = target
+    return version
+
+
+def fts_query(text: str, guild_id: Optional[int] = None) -> Optional[str]:
+    """
+    Turns free text into an FTS5 query, so user input never reaches FTS5 syntax.
+
+    Every word must match, the last one as a prefix so partially typed words still find results. Single letters
+    match as whole words, a one letter prefix would expand to most of the index.
+
+    Args:
+        text (str): The text the user typed.
+        guild_id (Optional[int]): Restricts matches to the posts of this guild.
+
+    Returns:
+        Optional[str]: The MATCH expression, None if the text contains no words.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) > 1:
+        terms[-1] += "*"
+    if guild_id is not None:
+        terms.insert(0, f'guild_id : "{int(guild_id)}" AND')
+    return " ".join(terms)
+
+
+def period_start(period: str, timestamp: Optional[float] = None) -> int:
+    """
+    Returns the start of the day or week, in UTC, that a timestamp falls in. Weeks start on Monday.
+
+    Args:
+        period (str): PERIOD_DAY or PERIOD_WEEK.
+        timestamp (Optional[float]): Seconds since the epoch, now by default.
+
+    Returns:
+        int: The start of the period in seconds since the epoch.
+    """
+    day = int(time.time() if timestamp is None else timestamp) // 86400
+    if period == PERIOD_WEEK:
+        # The epoch was a Thursday, three days after a Monday
+        day -= (day + 3) % 7
+    return day * 86400
+
+
+def query_label(func: Callable) -> str:
+    """
+    Names a unit of work after the DatabaseManager method that defined it, used to label query metrics.
+
+    Args:
+        func (Callable): The unit of work, usually a nested function or lambda.
+
+    Returns:
+        str: The name of the enclosing method, e.g. 'get_leaderboard_page'.
+    """
+    return func.__qualname__.split(".<locals>")[0].rsplit(".", 1)[-1]
+
+
+def _timed(runner: Callable[[Callable[[sqlite3.Connection], T]], T], func: Callable[[sqlite3.Connection], T],
+           submitted: float) -> T:
+    """
+    Runs a unit of work on its database thread, recording how long it queued and how long it executed.
+
+    Args:
+        runner (Callable): The method that provides the connection and runs the work.
+        func (Callable[[sqlite3.Connection], T]): The unit of work.
+        submitted (float): perf_counter() value taken when the work was submitted.
+
+    Returns:
+        T: Whatever the unit of work returned.
+    """
+    label = query_label(func)
+    started = time.perf_counter()
+    DB_QUEUE_SECONDS.observe(started - submitted, label)
+    try:
+        return runner(func)
+    finally:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, label)
+
+
+class BatchJobReport(NamedTuple):
+    """
+    How a batch job over the points table went, see DatabaseManager.decay_points and reset_season.
+
+    Attributes:
+        job (str): The name of the job.
+        rows (int): The rows the job changed.
+        chunks (int): The transactions it was split into.
+        seconds (float): Time from start to end, including the queries that ran between its chunks.
+        lock_seconds (float): Time its chunks held the write lock in total.
+        max_lock_seconds (float): The longest a single chunk held the write lock, the longest a point write had to
+                                  wait for the job.
+    """
+    job: str
+    rows: int
+    chunks: int
+    seconds: float
+    lock_seconds: float
+    max_lock_seconds: float
 
 
 class DatabaseManager:
@@ -10,18 +370,61 @@ class DatabaseManager:
 
     This class provides methods for initializing the database, connecting to it, disconnecting from it,
     setting up the required tables, retrieving leaderboard data, and managing user data such as creating new users
-    and updating their cute points.
+    and updating their cute points. Point data and configuration are partitioned per guild.
+
+    Two storage engines are available, selected with the DB_ENGINE environment variable:
+        async  - (default) a single persistent WAL connection owned by a dedicated writer thread, plus a small pool
+                 of reader connections for bulk reads, every query runs off the event loop.
+        legacy - the original behaviour, a fresh connection per query executed directly on the event loop.
     """
 
-    def __init__(self, db_file: str = 'owodb.db') -> None:
+    def __init__(self, db_file: str = 'owodb.db', engine: Optional[str] = None,
+                 bus: Optional[InvalidationBus] = None) -> None:
         """
         Initialize the DatabaseManager with the specified database file.
 
         Args:
             db_file (str): The filename of the SQLite database file. Default is 'owodb.db'.
+            engine (Optional[str]): The storage engine to use, 'async' or 'legacy'. Defaults to DB_ENGINE.
+            bus (Optional[InvalidationBus]): Exchanges cache invalidations with other processes using the same
+                                             database. Defaults to the one selected by CACHE_INVALIDATION.
         """
         self.db_file = db_file
         self.conn = None
+        self.engine = (engine or os.environ.get("DB_ENGINE", ENGINE_ASYNC)).lower()
+        if self.engine not in (ENGINE_ASYNC, ENGINE_LEGACY):
+            raise ValueError(f"Unknown database engine: {self.engine}")
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._worker_conn: Optional[sqlite3.Connection] = None
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        self._read_workers = int(os.environ.get("DB_READ_WORKERS", 2))
+        self._reader_local = threading.local()
+        self._reader_conns: List[sqlite3.Connection] = []
+
+        # Every committed point batch gets a sequence number so rank indexes know which batches they already contain
+        self._commit_lock = threading.Lock()
+        self._commit_seq = 0
+
+        self.max_cached_guilds = int(os.environ.get("MAX_CACHED_GUILDS", 64))
+        self._rank_cache: "OrderedDict[int, RankIndex]" = OrderedDict()
+        self._rank_loading: Dict[int, asyncio.Task] = {}
+        self._rank_backlog: Dict[int, List[Tuple[int, int, str, Optional[int]]]] = {}
+
+        self._guild_configs: Dict[int, GuildConfig] = {}
+        # Profession post names by guild (None for direct messages), for autocomplete
+        self._profession_names: "OrderedDict[Optional[int], PrefixIndex]" = OrderedDict()
+        self._profession_names_loading: Dict[Optional[int], asyncio.Task] = {}
+
+        self.bus = bus if bus is not None else bus_from_env()
+        # Bumped per (topic, guild_id) by invalidations from other processes, and for everything by drop_caches, so a
+        # load that overlapped an invalidation does not cache what it read
+        self._generations: Dict[Event, int] = {}
+        self._generation_all = 0
+
+        self.write_queue = PointWriteQueue(self._write_point_batch,
+                                           flush_interval=float(os.environ.get("WRITE_FLUSH_INTERVAL", 0.05)),
+                                           max_pending=int(os.environ.get("WRITE_BATCH_SIZE", 500)))
 
     def connect(self) -> sqlite3.Connection:
         """
@@ -43,45 +446,662 @@ class DatabaseManager:
             self.conn.close()
             self.conn = None  # Set to None after closing to avoid potential issues
 
+    def _open_persistent_connection(self, isolation_level: Optional[str] = "") -> sqlite3.Connection:
+        """
+        Opens a long-lived connection with the tuned pragmas and a statement cache.
+
+        Args:
+            isolation_level (Optional[str]): How implicit transactions begin, see sqlite3.Connection.isolation_level.
+
+        Returns:
+            sqlite3.Connection: The connection object.
+        """
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, cached_statements=256,
+                               isolation_level=isolation_level)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _run_in_worker(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Runs a unit of work on the worker thread's connection inside a single transaction.
+
+        Args:
+            func (Callable[[sqlite3.Connection], T]): The work to run against the connection.
+
+        Returns:
+            T: Whatever the unit of work returned.
+        """
+        if self._worker_conn is None:
+            # Transactions begun implicitly, after a unit of work commits part way, also take the write lock up front
+            self._worker_conn = self._open_persistent_connection("IMMEDIATE")
+        with self._worker_conn:
+            # The implicit BEGIN only comes before the first write, too late for work that reads first. Taking the
+            # write lock up front makes it wait for writers of other processes sharing the database instead of
+            # acting on rows they change before it writes, or failing when they commit first
+            self._worker_conn.execute("BEGIN IMMEDIATE")
+            return func(self._worker_conn)
+
+    def _run_in_reader(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Runs a read-only unit of work on the calling reader thread's own connection.
+
+        Args:
+            func (Callable[[sqlite3.Connection], T]): The work to run against the connection.
+
+        Returns:
+            T: Whatever the unit of work returned.
+        """
+        conn = getattr(self._reader_local, "conn", None)
+        if conn is None:
+            conn = self._reader_local.conn = self._open_persistent_connection()
+            self._reader_conns.append(conn)
+        return func(conn)
+
+    async def run(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Executes a unit of work against the database using the configured engine.
+
+        With the async engine the work is handed to the dedicated worker thread so the event loop never blocks on
+        disk I/O. With the legacy engine it runs inline on a fresh connection.
+
+        Args:
+            func (Callable[[sqlite3.Connection], T]): The work to run, it receives an open connection.
+
+        Returns:
+            T: Whatever the unit of work returned.
+        """
+        with tracer.span(f"db {query_label(func)}", engine=self.engine):
+            if self.engine == ENGINE_LEGACY:
+                with DB_QUERY_SECONDS.time(query_label(func)), self.connect() as conn:
+                    return func(conn)
+
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="owodb")
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, _timed, self._run_in_worker, func,
+                                              time.perf_counter())
+
+    async def read(self, func: Callable[[sqlite3.Connection], T]) -> T:
+        """
+        Executes a read-only unit of work on the reader pool.
+
+        Bulk reads, like loading a large guild's rank index, run here so they never hold up the writer thread or
+        another guild's queries.
+
+        Args:
+            func (Callable[[sqlite3.Connection], T]): The work to run, it receives an open connection.
+
+        Returns:
+            T: Whatever the unit of work returned.
+        """
+        if self.engine == ENGINE_LEGACY:
+            return await self.run(func)
+
+        with tracer.span(f"db {query_label(func)}", engine=self.engine, reader=True):
+            if self._read_executor is None:
+                self._read_executor = ThreadPoolExecutor(max_workers=self._read_workers,
+                                                         thread_name_prefix="owodb-read")
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._read_executor, _timed, self._run_in_reader, func,
+                                              time.perf_counter())
+
+    async def close(self) -> None:
+        """
+        Flushes queued point changes, then shuts down the worker threads and closes their persistent connections.
+        """
+        await self.write_queue.close()
+        await self.bus.close()
+        for task in self._rank_loading.values():
+            task.cancel()
+
+        if self._read_executor is not None:
+            self._read_executor.shutdown(wait=True)
+            self._read_executor = None
+            for conn in self._reader_conns:
+                conn.close()
+            self._reader_conns.clear()
+
+        if self._executor is None:
+            return
+
+        def _close() -> None:
+            if self._worker_conn is not None:
+                self._worker_conn.close()
+                self._worker_conn = None
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, _close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
     def setup_database(self) -> None:
         """
-        Creates the 'cutePoints' table if it doesn't exist.
+        Brings the database schema up to date by applying any pending migrations.
 
-        The 'cutePoints' table has columns: 'id', 'name', 'points', and 'userid'.
+        The 'cutePoints' table has columns: 'id', 'guild_id', 'name', 'points', and 'userid'. The guild described
+        by GUILD_ID, CUTE_ROLE_ID and CUTE_CHANNEL is added to 'guildConfig' if it is not configured yet.
         """
+        legacy_config = legacy_guild_config()
         with self.connect() as conn:
-            cur = conn.cursor()
+            run_migrations(conn, legacy_config.guild_id if legacy_config else 0)
+            if legacy_config:
+                conn.execute("INSERT OR IGNORE INTO guildConfig (guild_id, cute_role_id, log_channel_id, style_dir) "
+                             "VALUES (?, ?, ?, ?)", legacy_config)
+            conn.commit()
+        self.disconnect()
 
-            cur.execute('''
-                CREATE TABLE IF NOT EXISTS cutePoints (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT,
-                    points INTEGER,
-                    userid INTEGER NOT NULL UNIQUE
-                )
-            ''')
+    async def load_guild_configs(self) -> None:
+        """
+        Loads the configuration of every guild into memory.
+        """
+        def _query(conn: sqlite3.Connection) -> List[tuple]:
+            return conn.execute("SELECT guild_id, cute_role_id, log_channel_id, style_dir FROM guildConfig").fetchall()
 
-            conn.commit()
+        self._guild_configs = {row[0]: GuildConfig(*row) for row in await self.read(_query)}
+        logging.info(f"Loaded configuration for {len(self._guild_configs)} guilds.")
+
+    def guild_config(self, guild_id: int) -> GuildConfig:
+        """
+        Returns a guild's configuration.
+
+        Args:
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            GuildConfig: The guild's configuration, with every setting unset if the guild was never configured.
+        """
+        config = self._guild_configs.get(guild_id)
+        return config if config is not None else GuildConfig(guild_id)
+
+    async def set_guild_config(self, config: GuildConfig) -> None:
+        """
+        Stores a guild's configuration.
+
+        Args:
+            config (GuildConfig): The new configuration.
+        """
+        def _upsert(conn: sqlite3.Connection) -> None:
+            conn.execute("INSERT OR REPLACE INTO guildConfig (guild_id, cute_role_id, log_channel_id, style_dir) "
+                         "VALUES (?, ?, ?, ?)", config)
+            self.bus.publish(conn, TOPIC_CONFIG, [config.guild_id])
+
+        await self.run(_upsert)
+        self._guild_configs[config.guild_id] = config
+        self.bus.notify(TOPIC_CONFIG, [config.guild_id])
+
+    async def get_state(self, key: str) -> Optional[str]:
+        """
+        Reads a value the bot keeps between restarts.
+
+        Args:
+            key (str): The name of the value.
+
+        Returns:
+            Optional[str]: The value, or None if it was never stored.
+        """
+        def _query(conn: sqlite3.Connection) -> Optional[tuple]:
+            return conn.execute("SELECT value FROM botState WHERE key = ?", (key,)).fetchone()
+
+        row = await self.read(_query)
+        return row[0] if row else None
+
+    async def set_state(self, key: str, value: str) -> None:
+        """
+        Stores a value the bot keeps between restarts.
+
+        Args:
+            key (str): The name of the value.
+            value (str): The value.
+        """
+        def _upsert(conn: sqlite3.Connection) -> None:
+            conn.execute("INSERT INTO botState (key, value) VALUES (?, ?) "
+                         "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+        await self.run(_upsert)
+
+    async def replace_state(self, key: str, expected: Optional[str], value: str) -> bool:
+        """
+        Stores a value the bot keeps between restarts, but only if it still holds the expected value, so of several
+        processes sharing the database exactly one succeeds in changing it.
+
+        Args:
+            key (str): The name of the value.
+            expected (Optional[str]): The value it must hold, None if it must not be stored yet.
+            value (str): The new value.
+
+        Returns:
+            bool: Whether the value was stored.
+        """
+        def _swap(conn: sqlite3.Connection) -> bool:
+            if expected is None:
+                return conn.execute("INSERT OR IGNORE INTO botState (key, value) VALUES (?, ?)",
+                                    (key, value)).rowcount == 1
+            return conn.execute("UPDATE botState SET value = ? WHERE key = ? AND value = ?",
+                                (value, key, expected)).rowcount == 1
+
+        return await self.run(_swap)
+
+    def cache_stats(self) -> Dict[str, int]:
+        """
+        Reports the size of the in-memory caches.
+
+        Returns:
+            Dict[str, int]: The number of cached rank indexes, the users ranked in them, the cached profession name
+                            indexes and the guild configurations.
+        """
+        return {
+            "rank indexes": len(self._rank_cache),
+            "ranked users": sum(len(index) for index in self._rank_cache.values()),
+            "profession name indexes": len(self._profession_names),
+            "guild configs": len(self._guild_configs),
+        }
+
+    async def drop_caches(self) -> None:
+        """
+        Forgets every cached rank index and profession name index and reloads the guild configurations.
+
+        Used after data was written behind the cache's back, e.g. by an import. Other processes sharing the
+        database are told to drop theirs too.
+        """
+        self._generation_all += 1
+        self._rank_cache.clear()
+        self._profession_names.clear()
+        await self.load_guild_configs()
+        await self.run(lambda conn: self.bus.publish(conn, TOPIC_ALL, [None]))
+        self.bus.notify(TOPIC_ALL, [None])
+
+    def _generation(self, topic: str, guild_id: Optional[int]) -> Tuple[int, int]:
+        return self._generation_all, self._generations.get((topic, guild_id), 0)
+
+    async def invalidate(self, events: Iterable[Event], rows: Iterable[PointRow] = ()) -> None:
+        """
+        Drops the cached data other processes changed, called by the invalidation bus.
+
+        Rank indexes and profession name indexes of the named guilds are reloaded on next use, guild configurations
+        are read again right away. Changed point rows are read again into the rank indexes they belong to.
+
+        Args:
+            events (Iterable[Event]): The changes as (topic, guild_id).
+            rows (Iterable[PointRow]): Point rows changed in guilds without an event, as (guild_id, userid).
+        """
+        events = set(events)
+        refresh: Dict[int, Set[int]] = {}
+        for guild_id, user_id in rows:
+            if guild_id in self._rank_cache and guild_id not in self._rank_loading:
+                refresh.setdefault(guild_id, set()).add(user_id)
+            else:
+                # Nothing loaded to refresh, but a load that is running may have read the row before it changed
+                events.add((TOPIC_POINTS, guild_id))
+        if any(topic == TOPIC_ALL for topic, _ in events):
+            self._generation_all += 1
+            self._rank_cache.clear()
+            self._profession_names.clear()
+            await self.load_guild_configs()
+            return
+
+        configs = []
+        for topic, guild_id in events:
+            self._generations[(topic, guild_id)] = self._generations.get((topic, guild_id), 0) + 1
+            if topic == TOPIC_POINTS:
+                self._rank_cache.pop(guild_id, None)
+            elif topic == TOPIC_PROFESSIONS:
+                self._profession_names.pop(guild_id, None)
+            elif topic == TOPIC_CONFIG:
+                configs.append(guild_id)
+
+        if configs:
+            def _query(conn: sqlite3.Connection) -> List[tuple]:
+                return conn.execute(f"SELECT guild_id, cute_role_id, log_channel_id, style_dir FROM guildConfig "
+                                    f"WHERE guild_id IN ({', '.join('?' * len(configs))})", configs).fetchall()
+
+            for guild_id in configs:
+                self._guild_configs.pop(guild_id, None)
+            self._guild_configs.update({row[0]: GuildConfig(*row) for row in await self.read(_query)})
 
-    def get_leaderboard_data(self) -> List[Tuple[str, int]]:
+        for guild_id, user_ids in refresh.items():
+            if (TOPIC_POINTS, guild_id) not in events:
+                await self._refresh_ranks(guild_id, user_ids)
+
+    async def _refresh_ranks(self, guild_id: int, user_ids: Iterable[int]) -> None:
         """
-        Retrieves the top 10 members with the highest cute points from the database.
+        Reads the current points and names of some users into the guild's loaded rank index.
+
+        The rows are read on the writer thread, so batches this process committed before the read were already
+        applied to the index and are overwritten with the same totals, while later ones are applied on top.
+
+        Args:
+            guild_id (int): The ID of the guild.
+            user_ids (Iterable[int]): The users whose rows changed.
+        """
+        ranks = self._rank_cache.get(guild_id)
+        user_ids = list(user_ids)
+
+        def _query(conn: sqlite3.Connection) -> List[Tuple[int, str, int]]:
+            rows = []
+            for start in range(0, len(user_ids), REFRESH_CHUNK_SIZE):
+                chunk = user_ids[start:start + REFRESH_CHUNK_SIZE]
+                rows += conn.execute(f"SELECT userid, name, points FROM cutePoints WHERE guild_id = ? "
+                                     f"AND userid IN ({', '.join('?' * len(chunk))})", (guild_id, *chunk)).fetchall()
+            return rows
+
+        rows = await self.run(_query)
+        if self._rank_cache.get(guild_id) is not ranks:
+            # Dropped or reloaded in the meantime, a new load already contains the rows
+            return
+        for user_id, name, points in rows:
+            ranks.set(user_id, name, points)
+
+    async def get_rank_index(self, guild_id: int) -> Optional[RankIndex]:
+        """
+        Returns a guild's in-memory rank index, loading it on first use.
+
+        Only the most recently used MAX_CACHED_GUILDS indexes are kept, the others are dropped and reloaded when
+        needed again. The legacy engine has no rank index and keeps querying the database directly.
+
+        Args:
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            Optional[RankIndex]: The guild's rank index, or None with the legacy engine.
+        """
+        if self.engine == ENGINE_LEGACY:
+            return None
+
+        index = self._rank_cache.get(guild_id)
+        if index is not None:
+            self._rank_cache.move_to_end(guild_id)
+            return index
+
+        task = self._rank_loading.get(guild_id)
+        if task is None:
+            task = self._rank_loading[guild_id] = asyncio.create_task(self._load_rank_index(guild_id))
+        return await asyncio.shield(task)
+
+    async def _load_rank_index(self, guild_id: int) -> RankIndex:
+        """
+        Loads every point holder of a guild into a new rank index and caches it.
+
+        Batches committed while the load is running are collected in a backlog and replayed once the index is
+        built, skipping the ones the loaded snapshot already contains.
+
+        Args:
+            guild_id (int): The ID of the guild.
+
+        Returns:
+            RankIndex: The loaded index.
+        """
+        self._rank_backlog[guild_id] = []
+        generation = self._generation(TOPIC_POINTS, guild_id)
+
+        def _load(conn: sqlite3.Connection) -> RankIndex:
+            with self._commit_lock:
+                # Pin the read snapshot and note which batch it ends at, without a batch committing in between
+                conn.execute("BEGIN")
+                conn.execute("SELECT 1 FROM cutePoints LIMIT 1").fetchall()
+                seq = self._commit_seq
+            try:
+                rows = conn.execute("SELECT userid, name, points FROM cutePoints WHERE guild_id = ?",
+                                    (guild_id,)).fetchall()
+            finally:
+                conn.execute("COMMIT")
+            index = RankIndex()
+            index.load(rows, seq)
+            return index
+
+        try:
+            index = await self.read(_load)
+            for seq, user_id, name, delta in self._rank_backlog[guild_id]:
+                if seq > index.loaded_seq:
+                    # A None delta is a rename
+                    if delta is None:
+                        index.rename(user_id, name)
+                    else:
+                        index.add(user_id, name, delta)
+            if self._generation(TOPIC_POINTS, guild_id) != generation:
+                # Another process changed the guild's points during the load, the snapshot may predate it
+                return index
+            self._rank_cache[guild_id] = index
+            while len(self._rank_cache) > self.max_cached_guilds:
+                evicted, _ = self._rank_cache.popitem(last=False)
+                logging.info(f"Evicted rank index of guild {evicted}.")
+            logging.info(f"Rank index of guild {guild_id} loaded with {len(index)} users.")
+            return index
+        finally:
+            del self._rank_backlog[guild_id]
+            del self._rank_loading[guild_id]
+
+    @staticmethod
+    def _leaderboard_source(guild_id: int, period: Optional[str]) -> Tuple[str, tuple]:
+        """
+        Returns the FROM and WHERE clauses selecting (userid, name, points) rows of a leaderboard, and their
+        parameters. Period leaderboards read the rollup of the current day or week.
+        """
+        if period is None:
+            return "cutePoints WHERE guild_id = ?", (guild_id,)
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"Unknown leaderboard period: {period}")
+        return ("(SELECT r.userid, COALESCE(c.name, r.userid) AS name, r.points FROM pointRollups r "
+                "LEFT JOIN cutePoints c ON c.guild_id = r.guild_id AND c.userid = r.userid "
+                "WHERE r.guild_id = ? AND r.period = ? AND r.period_start = ? AND r.points <> 0) WHERE 1",
+                (guild_id, period, period_start(period)))
+
+    async def get_leaderboard_page(self, guild_id: int, cursor: Optional[Tuple[int, int]] = None,
+                                   forward: bool = True, size: int = LEADERBOARD_PAGE_SIZE,
+                                   period: Optional[str] = None
+                                   ) -> Tuple[Optional[int], List[Tuple[int, str, int]], bool]:
+        """
+        Retrieves one page of a guild's leaderboard using keyset pagination on (points DESC, userid).
+
+        Every page costs the same no matter how deep it is, there is no OFFSET scan.
+
+        Args:
+            guild_id (int): The ID of the guild.
+            cursor (Optional[Tuple[int, int]]): The (points, userid) of the last row of the current page when moving
+                                                forward, or of its first row when moving back. None for the first page.
+            forward (bool): Whether to fetch the page after the cursor or the one before it.
+            size (int): The number of rows per page.
+            period (Optional[str]): PERIOD_DAY or PERIOD_WEEK to rank the points given this day or week, read from
+                                    the rollups. None for all-time points.
+
+        Returns:
+            Tuple[Optional[int], List[Tuple[int, str, int]], bool]: The rank of the first row (None if only known to
+                the caller), the rows as (userid, name, points) and whether more rows exist past this page.
+        """
+        ranks = await self.get_rank_index(guild_id) if period is None else None
+        if ranks is not None:
+            if cursor is None:
+                start = 0
+            elif forward:
+                start = ranks.count_before(cursor, inclusive=True)
+            else:
+                start = max(ranks.count_before(cursor) - size, 0)
+            rows = ranks.page(start, size)
+            has_more = start + len(rows) < len(ranks) if forward else start > 0
+            return start + 1, rows, has_more
+
+        source, params = self._leaderboard_source(guild_id, period)
+
+        def _query(conn: sqlite3.Connection) -> List[Tuple[int, str, int]]:
+            if cursor is None:
+                return conn.execute(f"SELECT userid, name, points FROM {source} "
+                                    "ORDER BY points DESC, userid LIMIT ?", (*params, size + 1)).fetchall()
+            points, user_id = cursor
+            if forward:
+                return conn.execute(f"SELECT userid, name, points FROM {source} "
+                                    "AND (points < ? OR (points = ? AND userid > ?)) "
+                                    "ORDER BY points DESC, userid LIMIT ?",
+                                    (*params, points, points, user_id, size + 1)).fetchall()
+            return conn.execute(f"SELECT userid, name, points FROM {source} "
+                                "AND (points > ? OR (points = ? AND userid < ?)) "
+                                "ORDER BY points, userid DESC LIMIT ?",
+                                (*params, points, points, user_id, size + 1)).fetchall()
+
+        rows = await self.read(_query)
+        has_more = len(rows) > size
+        rows = rows[:size]
+        if not forward:
+            rows.reverse()
+        return (1 if cursor is None else None), rows, has_more
+
+    async def get_leaderboard_data(self, guild_id: int) -> List[Tuple[str, int]]:
+        """
+        Retrieves the top 10 members of a guild with the highest cute points from the database.
+
+        Args:
+            guild_id (int): The ID of the guild.
 
         Returns:
             List[Tuple[str, int]]: A list of tuples containing the names and points of the top 10 members,
                                     sorted by points in descending order.
         """
-        with self.connect() as conn:
-            cur = conn.cursor()
-            cur.execute("SELECT name, points FROM cutePoints ORDER BY points DESC LIMIT 10")
-            leaderboard_data = cur.fetchall()
-        return leaderboard_data
+        _, rows, _ = await self.get_leaderboard_page(guild_id)
+        return [(name, points) for _, name, points in rows]
+
+    async def get_leaderboard_page_of(self, guild_id: int, user_id: int, size: int = LEADERBOARD_PAGE_SIZE,
+                                      period: Optional[str] = None) -> Tuple[int, List[Tuple[int, str, int]], bool]:
+        """
+        Retrieves the leaderboard page containing a user, or the first page if the user has no points yet.
 
-    async def get_or_create_user(self, user: discord.User) -> tuple:
+        Args:
+            guild_id (int): The ID of the guild.
+            user_id (int): The Discord user ID.
+            size (int): The number of rows per page.
+            period (Optional[str]): The leaderboard period, see get_leaderboard_page.
+
+        Returns:
+            Tuple[int, List[Tuple[int, str, int]], bool]: The rank of the first row, the rows as (userid, name, points)
+                and whether more rows exist past this page.
+        """
+        ranks = await self.get_rank_index(guild_id) if period is None else None
+        if ranks is not None:
+            rank = ranks.rank(user_id)
+            start = (rank - 1) // size * size if rank else 0
+            rows = ranks.page(start, size)
+            return start + 1, rows, start + len(rows) < len(ranks)
+
+        source, params = self._leaderboard_source(guild_id, period)
+
+        def _query(conn: sqlite3.Connection) -> Tuple[int, List[Tuple[int, str, int]]]:
+            row = conn.execute(f"SELECT points FROM {source} AND userid = ?", (*params, user_id)).fetchone()
+            start = 0
+            if row is not None:
+                ahead = conn.execute(f"SELECT COUNT(*) FROM {source} AND (points > ? OR (points = ? AND userid < ?))",
+                                     (*params, row[0], row[0], user_id)).fetchone()[0]
+                start = ahead // size * size
+            return start, conn.execute(f"SELECT userid, name, points FROM {source} "
+                                       "ORDER BY points DESC, userid LIMIT ? OFFSET ?",
+                                       (*params, size + 1, start)).fetchall()
+
+        start, rows = await self.read(_query)
+        return start + 1, rows[:size], len(rows) > size
+
+    async def complete_member_names(self, guild_id: int, prefix: str, limit: int = MAX_CHOICES
+                                    ) -> List[Tuple[int, str]]:
+        """
+        Finds point holders of a guild with a name starting with a prefix, served from the rank index.
+
+        Args:
+            guild_id (int): The ID of the guild.
+            prefix (str): The text typed so far.
+            limit (int): The maximum number of results.
+
+        Returns:
+            List[Tuple[int, str]]: The matching users as (userid, name).
+        """
+        ranks = await self.get_rank_index(guild_id)
+        if ranks is not None:
+            return ranks.names.complete(prefix, limit)
+
+        pattern = prefix.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return await self.read(lambda conn: conn.execute(
+            "SELECT userid, name FROM cutePoints WHERE guild_id = ? AND name LIKE ? ESCAPE '\\' "
+            "ORDER BY name LIMIT ?", (guild_id, pattern, limit)).fetchall())
+
+    async def _get_profession_names(self, guild_id: Optional[int]) -> PrefixIndex:
+        """
+        Returns a guild's profession name index, loading it on first use. Like rank indexes, only the most recently
+        used MAX_CACHED_GUILDS are kept.
+        """
+        index = self._profession_names.get(guild_id)
+        if index is not None:
+            self._profession_names.move_to_end(guild_id)
+            return index
+
+        task = self._profession_names_loading.get(guild_id)
+        if task is None:
+            task = self._profession_names_loading[guild_id] = asyncio.create_task(
+                self._load_profession_names(guild_id))
+        return await asyncio.shield(task)
+
+    async def _load_profession_names(self, guild_id: Optional[int]) -> PrefixIndex:
+        # The load runs on the writer, so every post change queued after it is applied to the index once it exists,
+        # and changes queued before it are already in the rows it reads
+        generation = self._generation(TOPIC_PROFESSIONS, guild_id)
+        try:
+            rows = await self.run(lambda conn: conn.execute(
+                "SELECT message_id, name FROM professionPosts WHERE guild_id IS ?", (guild_id,)).fetchall())
+            index = PrefixIndex()
+            index.load(rows)
+            if self._generation(TOPIC_PROFESSIONS, guild_id) != generation:
+                return index
+            self._profession_names[guild_id] = index
+            while len(self._profession_names) > self.max_cached_guilds:
+                self._profession_names.popitem(last=False)
+            return index
+        finally:
+            del self._profession_names_loading[guild_id]
+
+    async def complete_profession_names(self, guild_id: Optional[int], prefix: str, limit: int = MAX_CHOICES
+                                        ) -> List[str]:
+        """
+        Finds the distinct names of a guild's profession posts with a word starting with a prefix.
+
+        Args:
+            guild_id (Optional[int]): The ID of the guild, None for posts made in direct messages.
+            prefix (str): The text typed so far.
+            limit (int): The maximum number of names.
+
+        Returns:
+            List[str]: The matching names.
+        """
+        index = await self._get_profession_names(guild_id)
+        return [name for _, name in index.complete(prefix, limit, distinct=True)]
+
+    def _set_profession_name(self, guild_id: Optional[int], message_id: int, name: Optional[str]) -> None:
+        index = self._profession_names.get(guild_id)
+        if index is not None:
+            index.set(message_id, name)
+
+    @staticmethod
+    def _get_or_create_user(conn: sqlite3.Connection, guild_id: int, user_id: int, display_name: str) -> tuple:
+        """
+        Fetches a user's row, inserting a fresh row with zero points if none exists.
+
+        Args:
+            conn (sqlite3.Connection): An open connection.
+            guild_id (int): The ID of the guild.
+            user_id (int): The Discord user ID.
+            display_name (str): The name stored for a newly created row.
+
+        Returns:
+            tuple: The row as (id, name, points, userid), id is None for a newly created user.
+        """
+        # Insert first, a process sharing the database may create the row between a lookup and the insert
+        created = conn.execute("INSERT INTO cutePoints (guild_id, name, points, userid) VALUES (?, ?, ?, ?) "
+                               "ON CONFLICT(guild_id, userid) DO NOTHING",
+                               (guild_id, display_name, 0, user_id)).rowcount
+        if created:
+            return None, display_name, 0, user_id
+        return conn.execute("SELECT id, name, points, userid FROM cutePoints WHERE guild_id = ? AND userid = ?",
+                            (guild_id, user_id)).fetchone()
+
+    async def get_or_create_user(self, guild_id: int, user: discord.User) -> tuple:
         """
         Retrieve an existing user's data or create a new user if not found.
 
         Args:
+            guild_id (int): The ID of the guild.
             user (discord.User): The Discord user.
 
         Returns:
@@ -89,35 +1109,636 @@ class DatabaseManager:
                    The tuple structure is (id, name, points, userid).
         """
         try:
-            with self.connect() as conn:
-                cur = conn.cursor()
-                cur.execute("SELECT * FROM cutePoints WHERE userid = ?", (user.id,))
-                existing_user = cur.fetchone()
-                if existing_user:
-                    return existing_user
-                else:
-                    cur.execute("INSERT INTO cutePoints (name, points, userid) VALUES (?, ?, ?)",
-                                (user.display_name, 0, user.id))
-                    conn.commit()
-                    return None, user.display_name, 0, user.id
+            user_info = await self.run(lambda conn: self._get_or_create_user(conn, guild_id, user.id,
+                                                                             user.display_name))
+            pending = self.write_queue.pending_delta(guild_id, user.id)
+            if pending:
+                # Changes still waiting in the write queue are included so callers read their own writes
+                user_info = (*user_info[:2], user_info[2] + pending, *user_info[3:])
+            ranks = self._rank_cache.get(guild_id)
+            if ranks is not None and user.id not in ranks:
+                ranks.set(user.id, user_info[1], user_info[2] - pending)
+            return user_info
         except Exception as ex:
             logging.error(f"Error in get_or_create_user: {ex}")
             raise
 
-    async def give_points(self, user: discord.User, points: int) -> None:
+    def _query_rank(self, conn: sqlite3.Connection, guild_id: int, user_id: int,
+                    display_name: str) -> Tuple[int, int, Optional[int]]:
+        """
+        Computes a user's points, rank and distance to the next place with SQL, used when there is no rank index.
+        """
+        points = self._get_or_create_user(conn, guild_id, user_id, display_name)[2]
+        ahead = "guild_id = ? AND (points > ? OR (points = ? AND userid < ?))"
+        params = (guild_id, points, points, user_id)
+        rank = conn.execute(f"SELECT COUNT(*) + 1 FROM cutePoints WHERE {ahead}", params).fetchone()[0]
+        if rank == 1:
+            return points, rank, None
+        above = conn.execute(f"SELECT MIN(points) FROM cutePoints WHERE {ahead}", params).fetchone()[0]
+        return points, rank, above - points
+
+    async def get_rank(self, guild_id: int, user: discord.User) -> Tuple[int, int, Optional[int]]:
+        """
+        Retrieve a user's points, rank and distance to the next place from the guild's rank index.
+
+        Args:
+            guild_id (int): The ID of the guild.
+            user (discord.User): The Discord user.
+
+        Returns:
+            Tuple[int, int, Optional[int]]: The user's points, one-based rank and the points separating them from
+                                            the user ranked directly above (None when ranked first).
+        """
+        ranks = await self.get_rank_index(guild_id)
+        if ranks is None:
+            return await self.run(lambda conn: self._query_rank(conn, guild_id, user.id, user.display_name))
+        if user.id not in ranks:
+            await self.get_or_create_user(guild_id, user)
+
+        points = ranks.points(user.id)
+        rank = ranks.rank(user.id)
+        if rank == 1:
+            return points, rank, None
+        above = ranks.page(rank - 2, 1)[0]
+        return points, rank, above[2] - points
+
+    async def _write_point_batch(self, rows: List[Tuple[int, str, int, int]], ledger: List[LedgerEntry] = ()) -> None:
+        """
+        Applies a batch of point deltas as atomic upserts inside a single transaction, then to the rank indexes.
+
+        The ledger entries behind the deltas are appended in the same transaction, and the daily and weekly rollups
+        are brought up to date with them.
+
+        Args:
+            rows (List[Tuple[int, str, int, int]]): The changes as (guild_id, name, delta, userid).
+            ledger (List[LedgerEntry]): The individual changes as (guild_id, giver_id, receiver_id, delta,
+                                        created_at).
+        """
+        rollups: Dict[Tuple[int, str, int, int], int] = {}
+        for guild_id, _, receiver_id, delta, created_at in ledger:
+            for period in ROLLUP_PERIODS:
+                key = (guild_id, period, period_start(period, created_at), receiver_id)
+                rollups[key] = rollups.get(key, 0) + delta
+
+        changed = {(guild_id, user_id) for guild_id, _, _, user_id in rows}
+
+        def _write(conn: sqlite3.Connection) -> int:
+            conn.executemany(UPSERT_POINTS, rows)
+            conn.executemany("INSERT INTO pointLedger (guild_id, giver_id, receiver_id, delta, created_at) "
+                             "VALUES (?, ?, ?, ?, ?)", ledger)
+            conn.executemany(UPSERT_ROLLUP, [(*key, points) for key, points in rollups.items()])
+            self.bus.publish(conn, TOPIC_POINTS, (), changed)
+            with self._commit_lock:
+                conn.commit()
+                self._commit_seq += 1
+                return self._commit_seq
+
+        seq = await self.run(_write)
+        self.bus.notify(TOPIC_POINTS, (), changed)
+        for guild_id, name, delta, user_id in rows:
+            backlog = self._rank_backlog.get(guild_id)
+            if backlog is not None:
+                backlog.append((seq, user_id, name, delta))
+            ranks = self._rank_cache.get(guild_id)
+            if ranks is not None and ranks.loaded_seq < seq:
+                ranks.add(user_id, name, delta)
+
+    async def give_points(self, guild_id: int, user: discord.User, points: int, durable: bool = False,
+                          giver: Optional[discord.User] = None) -> None:
         """
         Add points to a user's existing cute points.
 
+        The change is applied as an atomic delta, so concurrent gives never overwrite each other. With the async
+        engine it goes through the write queue and is merged with other pending changes before being committed.
+        Either way it is recorded in the ledger on its own.
+
         Args:
+            guild_id (int): The ID of the guild.
             user (discord.User): The Discord user.
             points (int): The number of points to add.
+            durable (bool): Wait until the change has been committed before returning.
+            giver (Optional[discord.User]): The user who gave the points.
         """
-        user_info = await self.get_or_create_user(user)
-        with self.connect() as conn:
-            cur = conn.cursor()
-            new_points = user_info[2] + points
-            cur.execute("UPDATE cutePoints SET points = ? WHERE userid = ?", (new_points, user.id))
+        giver_id = giver.id if giver is not None else None
+        if self.engine == ENGINE_LEGACY:
+            await self._write_point_batch([(guild_id, user.display_name, points, user.id)],
+                                          [(guild_id, giver_id, user.id, points, int(time.time()))])
+            return
+        await self.write_queue.add(guild_id, user.id, user.display_name, points, durable=durable, giver_id=giver_id)
+
+    async def give_points_bulk(self, guild_id: int, grants: List[Tuple[int, str, int]],
+                               giver: Optional[discord.User] = None) -> None:
+        """
+        Gives points to many users at once, in a single transaction with batched upserts.
+
+        The grants bypass the write queue, they are already one batch. Point changes are deltas, so they combine
+        correctly with anything still waiting in the queue.
+
+        Args:
+            guild_id (int): The ID of the guild.
+            grants (List[Tuple[int, str, int]]): The grants as (userid, name, points), one per user.
+            giver (Optional[discord.User]): The user who gave the points.
+        """
+        giver_id = giver.id if giver is not None else None
+        created_at = int(time.time())
+        await self._write_point_batch([(guild_id, name, points, user_id) for user_id, name, points in grants],
+                                      [(guild_id, giver_id, user_id, points, created_at)
+                                       for user_id, _, points in grants])
+
+    async def update_names(self, names: List[Tuple[int, int, str]]) -> None:
+        """
+        Stores the current names of point holders in one transaction and applies them to the rank indexes.
+
+        Users without points in a guild are skipped, names are only stored for leaderboard rows.
+
+        Args:
+            names (List[Tuple[int, int, str]]): The names as (guild_id, userid, name).
+        """
+        changed = {(guild_id, user_id) for guild_id, user_id, _ in names}
+
+        def _write(conn: sqlite3.Connection) -> int:
+            conn.executemany("UPDATE cutePoints SET name = ? WHERE guild_id = ? AND userid = ? AND name IS NOT ?",
+                             [(name, guild_id, user_id, name) for guild_id, user_id, name in names])
+            self.bus.publish(conn, TOPIC_POINTS, (), changed)
+            with self._commit_lock:
+                conn.commit()
+                self._commit_seq += 1
+                return self._commit_seq
+
+        seq = await self.run(_write)
+        self.bus.notify(TOPIC_POINTS, (), changed)
+        for guild_id, user_id, name in names:
+            backlog = self._rank_backlog.get(guild_id)
+            if backlog is not None:
+                backlog.append((seq, user_id, name, None))
+            ranks = self._rank_cache.get(guild_id)
+            if ranks is not None and ranks.loaded_seq < seq:
+                ranks.rename(user_id, name)
+
+    async def compact_ledger(self, retention_days: int = 90, chunk_size: int = 50_000) -> int:
+        """
+        Folds ledger entries older than the retention period into daily snapshots and deletes them.
+
+        Snapshots keep the total given per day, giver and receiver, so "who gave what" stays answerable at daily
+        granularity. Entries are compacted in chunks, each in its own short transaction, so point writes are not
+        held up for long.
+
+        Args:
+            retention_days (int): The number of days ledger entries are kept individually.
+            chunk_size (int): The maximum number of entries compacted per transaction.
+
+        Returns:
+            int: The number of entries compacted.
+        """
+        cutoff = period_start(PERIOD_DAY) - retention_days * 86400
+
+        def _compact(conn: sqlite3.Connection) -> int:
+            # Ledger IDs grow with time, so everything up to the last old ID in the chunk is older than the cutoff
+            last_id = conn.execute("SELECT MAX(id) FROM (SELECT id FROM pointLedger WHERE created_at < ? "
+                                   "ORDER BY created_at LIMIT ?)", (cutoff, chunk_size)).fetchone()[0]
+            if last_id is None:
+                return 0
+            conn.execute(COMPACT_LEDGER, (last_id,))
+            return conn.execute("DELETE FROM pointLedger WHERE id <= ?", (last_id,)).rowcount
+
+        compacted = 0
+        while True:
+            count = await self.run(_compact)
+            compacted += count
+            if count < chunk_size:
+                break
+        if compacted:
+            logging.info(f"Compacted {compacted} ledger entries older than {retention_days} days.")
+        return compacted
+
+    async def compact_ledger_periodically(self, interval: float = 3600.0, retention_days: int = 90) -> None:
+        """
+        Runs compact_ledger every interval until cancelled.
+
+        Args:
+            interval (float): Seconds between compactions.
+            retention_days (int): The number of days ledger entries are kept individually.
+        """
+        while True:
+            try:
+                await self.compact_ledger(retention_days)
+            except Exception as ex:
+                logging.error(f"Error in compact_ledger: {ex}")
+            await asyncio.sleep(interval)
+
+    async def _run_point_job(self, job: str, chunk: Callable[[sqlite3.Connection], Optional[Tuple[int, float]]],
+                             finish: Optional[Callable[[sqlite3.Connection], None]] = None) -> BatchJobReport:
+        """
+        Runs a batch job over cutePoints chunk by chunk, then drops the rank indexes of the guilds it covered.
+
+        Every chunk is a transaction of its own on the writer thread, queued behind the writes already waiting
+        there, so commands keep working while the job runs and a point write waits for one chunk at most.
+
+        Args:
+            job (str): The name of the job, for the report and metrics.
+            chunk (Callable[[sqlite3.Connection], Optional[Tuple[int, float]]]): Processes and commits the next
+                chunk, returning the rows it changed and the seconds it held the write lock, or None once every
+                row was covered.
+            finish (Optional[Callable[[sqlite3.Connection], None]]): Runs after the last chunk, in the transaction
+                that tells other processes about the change.
+
+        Returns:
+            BatchJobReport: How the job went.
+        """
+        started = time.perf_counter()
+        guild_ids = await self.read(lambda conn: [row[0] for row in conn.execute(
+            "SELECT DISTINCT guild_id FROM cutePoints")])
+        rows = chunks = 0
+        lock_seconds = max_lock_seconds = 0.0
+        while True:
+            result = await self.run(chunk)
+            if result is None:
+                break
+            changed, locked = result
+            rows += changed
+            chunks += 1
+            lock_seconds += locked
+            max_lock_seconds = max(max_lock_seconds, locked)
+            BATCH_JOB_LOCK_SECONDS.observe(locked, job)
+
+        def _publish(conn: sqlite3.Connection) -> None:
+            if finish is not None:
+                finish(conn)
+            self.bus.publish(conn, TOPIC_POINTS, guild_ids)
+
+        await self.run(_publish)
+        self.bus.notify(TOPIC_POINTS, guild_ids)
+        # Cached rank indexes still rank the points from before the job, and loads that overlapped it are not cached
+        await self.invalidate((TOPIC_POINTS, guild_id) for guild_id in guild_ids)
+
+        seconds = time.perf_counter() - started
+        BATCH_JOB_SECONDS.observe(seconds, job)
+        logging.info(f"Job {job} changed {rows} rows in {chunks} chunks in {seconds:.3f}s, holding the write lock for "
+                     f"{lock_seconds:.3f}s, at most {max_lock_seconds * 1000:.1f}ms at a time.")
+        return BatchJobReport(job, rows, chunks, seconds, lock_seconds, max_lock_seconds)
+
+    async def decay_points(self, rate: float, scheduled_at: Optional[int] = None,
+                           chunk_size: int = POINT_JOB_CHUNK_SIZE) -> BatchJobReport:
+        """
+        Takes a share of every point balance away, in every guild, as chunked set-based updates.
+
+        Balances are rounded towards zero, so small ones keep shrinking instead of getting stuck. Point changes
+        still in the write queue are committed first and decay with the rest, rows created while the job runs are
+        left alone. The ledger and the daily and weekly rollups keep recording what was given.
+
+        The job's progress is stored with every chunk. An interrupted decay is finished before a new one starts, and
+        a decay that already ran for scheduled_at is not repeated, so retrying a failed run is safe.
+
+        Args:
+            rate (float): The share taken away, e.g. 0.05 for 5%.
+            scheduled_at (Optional[int]): The due time the decay is for, now by default.
+            chunk_size (int): The maximum number of rows updated per transaction.
+
+        Returns:
+            BatchJobReport: How the job went.
+
+        Raises:
+            ValueError: If the rate is not above 0 and at most 1.
+        """
+        if not 0 < rate <= 1:
+            raise ValueError(f"Decay rate must be above 0 and at most 1, got {rate}")
+        scheduled_at = int(time.time()) if scheduled_at is None else scheduled_at
+        await self.write_queue.flush()
+
+        state = await self.get_state(DECAY_STATE_KEY)
+        if state is not None:
+            progress = json.loads(state)
+            report = None
+            if progress["position"] is not None:
+                logging.info(f"Resuming the interrupted decay scheduled at {progress['scheduled_at']}.")
+                report = await self._decay_rows(progress, chunk_size)
+            if progress["scheduled_at"] == scheduled_at:
+                return report or BatchJobReport("decay", 0, 0, 0.0, 0.0, 0.0)
+
+        def _start(conn: sqlite3.Connection) -> Dict[str, Any]:
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cutePoints").fetchone()[0]
+            # The share kept in basis points, so balances are computed with integer arithmetic
+            progress = {"scheduled_at": scheduled_at, "keep": round((1 - rate) * 10000), "last_id": last_id,
+                        "position": 0}
+            self._store_decay_progress(conn, progress)
+            return progress
+
+        return await self._decay_rows(await self.run(_start), chunk_size)
+
+    @staticmethod
+    def _store_decay_progress(conn: sqlite3.Connection, progress: Dict[str, Any]) -> None:
+        conn.execute("INSERT INTO botState (key, value) VALUES (?, ?) "
+                     "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (DECAY_STATE_KEY, json.dumps(progress)))
+
+    async def _decay_rows(self, progress: Dict[str, Any], chunk_size: int) -> BatchJobReport:
+        """
+        Decays the rows of a started decay from its stored position on, see decay_points.
+
+        Args:
+            progress (Dict[str, Any]): The decay's stored progress, its position is updated as chunks commit.
+            chunk_size (int): The maximum number of rows updated per transaction.
+
+        Returns:
+            BatchJobReport: How the job went.
+        """
+        def _decay(conn: sqlite3.Connection) -> Optional[Tuple[int, float]]:
+            position = progress["position"]
+            end = conn.execute(NEXT_POINT_CHUNK, (position, progress["last_id"], chunk_size)).fetchone()[0]
+            if end is None:
+                return None
+            locked = time.perf_counter()
+            changed = conn.execute("UPDATE cutePoints SET points = points * ? / 10000 "
+                                   "WHERE id > ? AND id <= ? AND points <> 0",
+                                   (progress["keep"], position, end)).rowcount
+            progress["position"] = end
+            self._store_decay_progress(conn, progress)
             conn.commit()
+            return changed, time.perf_counter() - locked
+
+        def _complete(conn: sqlite3.Connection) -> None:
+            # Kept with its due time, so a retry for the same due time knows it is done
+            progress["position"] = None
+            self._store_decay_progress(conn, progress)
+
+        return await self._run_point_job("decay", _decay, _complete)
+
+    async def reset_season(self, ended_at: Optional[int] = None,
+                           chunk_size: int = POINT_JOB_CHUNK_SIZE) -> BatchJobReport:
+        """
+        Ends the current season: moves every point balance, in every guild, into the season's archive in
+        seasonPoints, which empties the leaderboards for the next season.
+
+        Each chunk archives and deletes its rows in one transaction, so every balance ends up either in the archived
+        season or in the new one. Point changes still in the write queue are committed first and archived, users
+        who get points for the first time while the reset runs start the new season with them.
+
+        An interrupted reset is finished before the new season's reset starts, and a season that already ended at
+        ended_at is not ended again, so retrying a failed run is safe.
+
+        Args:
+            ended_at (Optional[int]): The due time the season ends at, now by default.
+            chunk_size (int): The maximum number of rows moved per transaction.
+
+        Returns:
+            BatchJobReport: How the job went, rows are the users archived with points.
+        """
+        ended_at = int(time.time()) if ended_at is None else ended_at
+        await self.write_queue.flush()
+
+        def _find(conn: sqlite3.Connection) -> Tuple[Optional[tuple], bool]:
+            interrupted = conn.execute("SELECT season, last_point_id, ended_at FROM seasons "
+                                       "WHERE completed_at IS NULL").fetchone()
+            ended = conn.execute("SELECT 1 FROM seasons WHERE ended_at = ?", (ended_at,)).fetchone() is not None
+            return interrupted, ended
+
+        interrupted, ended = await self.read(_find)
+        report = None
+        if interrupted is not None:
+            logging.info(f"Finishing the interrupted reset of season {interrupted[0]}.")
+            report = await self._archive_season(interrupted[0], interrupted[1], chunk_size)
+        if ended:
+            return report or BatchJobReport("season_reset", 0, 0, 0.0, 0.0, 0.0)
+
+        def _start(conn: sqlite3.Connection) -> Tuple[int, int]:
+            started_at = conn.execute("SELECT MAX(ended_at) FROM seasons").fetchone()[0]
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM cutePoints").fetchone()[0]
+            cursor = conn.execute("INSERT INTO seasons (started_at, ended_at, last_point_id) VALUES (?, ?, ?)",
+                                  (started_at, ended_at, last_id))
+            return cursor.lastrowid, last_id
+
+        season, last_id = await self.run(_start)
+        return await self._archive_season(season, last_id, chunk_size)
+
+    async def _archive_season(self, season: int, last_id: int, chunk_size: int) -> BatchJobReport:
+        """
+        Archives and deletes the point rows of a season that is being reset, from the first one left on.
+
+        Args:
+            season (int): The season being reset.
+            last_id (int): The last cutePoints row that belongs to it.
+            chunk_size (int): The maximum number of rows moved per transaction.
+
+        Returns:
+            BatchJobReport: How the job went.
+        """
+        position = 0
+
+        def _archive(conn: sqlite3.Connection) -> Optional[Tuple[int, float]]:
+            nonlocal position
+            end = conn.execute(NEXT_POINT_CHUNK, (position, last_id, chunk_size)).fetchone()[0]
+            if end is None:
+                return None
+            locked = time.perf_counter()
+            archived = conn.execute("INSERT INTO seasonPoints (season, guild_id, userid, name, points) "
+                                    "SELECT ?, guild_id, userid, name, points FROM cutePoints "
+                                    "WHERE id > ? AND id <= ? AND points <> 0", (season, position, end)).rowcount
+            conn.execute("DELETE FROM cutePoints WHERE id > ? AND id <= ?", (position, end))
+            conn.execute("UPDATE seasons SET users = users + ? WHERE season = ?", (archived, season))
+            conn.commit()
+            position = end
+            return archived, time.perf_counter() - locked
+
+        def _complete(conn: sqlite3.Connection) -> None:
+            conn.execute("UPDATE seasons SET completed_at = ? WHERE season = ?", (int(time.time()), season))
+
+        report = await self._run_point_job("season_reset", _archive, _complete)
+        logging.info(f"Season {season} archived with {report.rows} users.")
+        return report
+
+    async def finish_point_jobs(self) -> None:
+        """
+        Finishes a season reset or decay that was interrupted, e.g. by a crash, called on startup.
+        """
+        def _find(conn: sqlite3.Connection) -> Tuple[Optional[tuple], Optional[tuple]]:
+            return (conn.execute("SELECT ended_at FROM seasons WHERE completed_at IS NULL").fetchone(),
+                    conn.execute("SELECT value FROM botState WHERE key = ?", (DECAY_STATE_KEY,)).fetchone())
+
+        season, decay = await self.read(_find)
+        if season is not None:
+            await self.reset_season(season[0])
+        if decay is not None:
+            progress = json.loads(decay[0])
+            if progress["position"] is not None:
+                await self.write_queue.flush()
+                logging.info(f"Resuming the interrupted decay scheduled at {progress['scheduled_at']}.")
+                await self._decay_rows(progress, POINT_JOB_CHUNK_SIZE)
+
+    async def add_profession_post(self, message_id: int, guild_id: Optional[int], channel_id: Optional[int],
+                                  owner_id: int, name: str, description: str, requirements: str) -> None:
+        """
+        Stores a profession post so its buttons keep working across restarts.
+
+        Args:
+            message_id (int): The ID of the posted message.
+            guild_id (Optional[int]): The ID of the guild, None in direct messages.
+            channel_id (Optional[int]): The ID of the channel the post was sent to.
+            owner_id (int): The ID of the user who created the post.
+            name (str): The title of the profession.
+            description (str): The description of the service.
+            requirements (str): The comma separated requirements.
+        """
+        def _insert(conn: sqlite3.Connection) -> None:
+            # An upsert rather than INSERT OR REPLACE, whose implicit delete would skip the search index triggers
+            conn.execute("INSERT INTO professionPosts (message_id, guild_id, channel_id, owner_id, name, description, "
+                         "requirements, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(message_id) DO UPDATE "
+                         "SET name = excluded.name, description = excluded.description, "
+                         "requirements = excluded.requirements",
+                         (message_id, guild_id, channel_id, owner_id, name, description, requirements,
+                          int(time.time())))
+            self.bus.publish(conn, TOPIC_PROFESSIONS, [guild_id])
+
+        await self.run(_insert)
+        self._set_profession_name(guild_id, message_id, name)
+        self.bus.notify(TOPIC_PROFESSIONS, [guild_id])
+
+    async def get_profession_post(self, message_id: int) -> Optional[Tuple[int, str, str, str]]:
+        """
+        Looks up a stored profession post.
+
+        Args:
+            message_id (int): The ID of the posted message.
+
+        Returns:
+            Optional[Tuple[int, str, str, str]]: (owner_id, name, description, requirements), None if the message is
+            not a stored post.
+        """
+        def _query(conn: sqlite3.Connection) -> Optional[Tuple[int, str, str, str]]:
+            return conn.execute("SELECT owner_id, name, description, requirements FROM professionPosts "
+                                "WHERE message_id = ?", (message_id,)).fetchone()
+
+        return await self.run(_query)
+
+    async def update_profession_post(self, message_id: int, name: str, description: str, requirements: str) -> None:
+        """
+        Replaces the content of a stored profession post.
+
+        Args:
+            message_id (int): The ID of the posted message.
+            name (str): The new title.
+            description (str): The new description.
+            requirements (str): The new comma separated requirements.
+        """
+        def _update(conn: sqlite3.Connection) -> Optional[tuple]:
+            conn.execute("UPDATE professionPosts SET name = ?, description = ?, requirements = ? WHERE message_id = ?",
+                         (name, description, requirements, message_id))
+            row = conn.execute("SELECT guild_id FROM professionPosts WHERE message_id = ?", (message_id,)).fetchone()
+            if row is not None:
+                self.bus.publish(conn, TOPIC_PROFESSIONS, [row[0]])
+            return row
+
+        row = await self.run(_update)
+        if row is not None:
+            self._set_profession_name(row[0], message_id, name)
+            self.bus.notify(TOPIC_PROFESSIONS, [row[0]])
+
+    async def delete_profession_post(self, message_id: int) -> None:
+        """
+        Removes a stored profession post.
+
+        Args:
+            message_id (int): The ID of the posted message.
+        """
+        def _delete(conn: sqlite3.Connection) -> Optional[tuple]:
+            row = conn.execute("SELECT guild_id FROM professionPosts WHERE message_id = ?", (message_id,)).fetchone()
+            conn.execute("DELETE FROM professionPosts WHERE message_id = ?", (message_id,))
+            if row is not None:
+                self.bus.publish(conn, TOPIC_PROFESSIONS, [row[0]])
+            return row
+
+        row = await self.run(_delete)
+        if row is not None:
+            self._set_profession_name(row[0], message_id, None)
+            self.bus.notify(TOPIC_PROFESSIONS, [row[0]])
+
+    async def forget_deleted_messages(self, message_ids: Iterable[int]) -> None:
+        """
+        Removes the stored profession posts among messages that were deleted on Discord.
+
+        Deletions from every channel end up here, so the lookup runs on the reader pool and the writer is only used
+        when a post was among them.
+
+        Args:
+            message_ids (Iterable[int]): The IDs of the deleted messages.
+        """
+        message_ids = tuple(message_ids)
+        if message_ids:
+            await self._delete_profession_posts(f"message_id IN ({', '.join('?' * len(message_ids))})", message_ids)
+
+    async def forget_deleted_channel(self, channel_id: int) -> None:
+        """
+        Removes the stored profession posts of a channel or thread that was deleted on Discord.
+
+        Args:
+            channel_id (int): The ID of the deleted channel.
+        """
+        await self._delete_profession_posts("channel_id = ?", (channel_id,))
+
+    async def _delete_profession_posts(self, condition: str, params: tuple) -> None:
+        """
+        Removes the stored profession posts matching a condition on the professionPosts table.
+
+        Args:
+            condition (str): The WHERE clause.
+            params (tuple): Its parameters.
+        """
+        def _find(conn: sqlite3.Connection) -> bool:
+            row = conn.execute(f"SELECT 1 FROM professionPosts WHERE {condition} LIMIT 1", params).fetchone()
+            return row is not None
+
+        if not await self.read(_find):
+            return
+
+        def _delete(conn: sqlite3.Connection) -> List[tuple]:
+            rows = conn.execute(f"SELECT guild_id, message_id FROM professionPosts WHERE {condition}",
+                                params).fetchall()
+            conn.execute(f"DELETE FROM professionPosts WHERE {condition}", params)
+            if rows:
+                self.bus.publish(conn, TOPIC_PROFESSIONS, {guild_id for guild_id, _ in rows})
+            return rows
+
+        rows = await self.run(_delete)
+        for guild_id, message_id in rows:
+            self._set_profession_name(guild_id, message_id, None)
+        if rows:
+            self.bus.notify(TOPIC_PROFESSIONS, {guild_id for guild_id, _ in rows})
+
+    async def search_professions(self, guild_id: Optional[int], query: str, offset: int = 0,
+                                 size: int = PROFESSION_SEARCH_PAGE_SIZE
+                                 ) -> Tuple[List[Tuple[int, Optional[int], int, str, str]], bool]:
+        """
+        Searches a guild's profession posts through the full-text index, best matches first.
+
+        Args:
+            guild_id (Optional[int]): The ID of the guild, None for posts made in direct messages.
+            query (str): The words to search for, see fts_query.
+            offset (int): The number of results to skip.
+            size (int): The number of results per page.
+
+        Returns:
+            Tuple[List[Tuple[int, Optional[int], int, str, str]], bool]: The results as (message_id, channel_id,
+                owner_id, name, description snippet) and whether more results exist past this page.
+        """
+        match = fts_query(query, guild_id)
+        if match is None:
+            return [], False
+
+        def _query(conn: sqlite3.Connection) -> List[Tuple[int, Optional[int], int, str, str]]:
+            # Message IDs grow over time, so the rowid bound keeps the newest PROFESSION_SEARCH_CANDIDATES matches
+            return conn.execute(
+                "SELECT p.message_id, p.channel_id, p.owner_id, p.name, "
+                "snippet(professionSearch, 2, '**', '**', '…', 16) "
+                "FROM professionSearch JOIN professionPosts p ON p.message_id = professionSearch.rowid "
+                "WHERE professionSearch MATCH :match AND p.guild_id IS :guild_id "
+                "AND professionSearch.rowid >= coalesce((SELECT min(rowid) FROM (SELECT rowid FROM professionSearch "
+                "WHERE professionSearch MATCH :match ORDER BY rowid DESC LIMIT :candidates)), 0) "
+                "ORDER BY bm25(professionSearch, :w_guild, :w_name, :w_description, :w_requirements) "
+                "LIMIT :limit OFFSET :offset",
+                dict(zip(("w_guild", "w_name", "w_description", "w_requirements"), PROFESSION_SEARCH_WEIGHTS),
+                     match=match, guild_id=guild_id, candidates=PROFESSION_SEARCH_CANDIDATES, limit=size + 1,
+                     offset=offset)).fetchall()
+
+        rows = await self.read(_query)
+        return rows[:size], len(rows) > size
 
     def __enter__(self) -> sqlite3.Connection:
         """
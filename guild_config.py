@@ -0,0 +1,65 @@
+import os
+from typing import List, NamedTuple, Optional, Union
+
+import discord
+from discord.utils import MISSING
+
+
+class GuildConfig(NamedTuple):
+    """
+    Per-guild settings, stored in the 'guildConfig' table.
+
+    Attributes:
+        guild_id (int): The ID of the guild.
+        cute_role_id (Optional[int]): ID of the role that is allowed to distribute points.
+        log_channel_id (Optional[int]): ID of the channel point changes are logged to.
+        style_dir (Optional[str]): Subdirectory of styles/ with style overrides for the guild.
+    """
+    guild_id: int
+    cute_role_id: Optional[int] = None
+    log_channel_id: Optional[int] = None
+    style_dir: Optional[str] = None
+
+
+def _env_int(name: str) -> Optional[int]:
+    """
+    Reads an integer from the environment.
+
+    Args:
+        name (str): The name of the environment variable.
+
+    Returns:
+        Optional[int]: The value, or None if the variable is unset or not a number.
+    """
+    value = os.environ.get(name, "").strip()
+    return int(value) if value.isdigit() else None
+
+
+def legacy_guild_config() -> Optional[GuildConfig]:
+    """
+    Builds the configuration of the single guild described by GUILD_ID, CUTE_ROLE_ID and CUTE_CHANNEL.
+
+    Used to seed the 'guildConfig' table so single-guild deployments keep working without any changes.
+
+    Returns:
+        Optional[GuildConfig]: The configuration, or None if GUILD_ID is not set.
+    """
+    guild_id = _env_int("GUILD_ID")
+    if guild_id is None:
+        return None
+    return GuildConfig(guild_id, _env_int("CUTE_ROLE_ID"), _env_int("CUTE_CHANNEL"))
+
+
+def command_guilds() -> Union[List[discord.Object], object]:
+    """
+    Returns the guilds slash commands are registered to.
+
+    GUILD_IDS (comma separated) or GUILD_ID register commands per guild, which makes them available instantly.
+    Without either, commands are registered globally so every guild the bot joins gets them.
+
+    Returns:
+        Union[List[discord.Object], object]: The guilds to pass to add_cog, or MISSING for global commands.
+    """
+    ids = [part.strip() for part in os.environ.get("GUILD_IDS", os.environ.get("GUILD_ID", "")).split(",")]
+    guilds = [discord.Object(id=int(part)) for part in ids if part.isdigit()]
+    return guilds or MISSING
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, Iterable, List, Optional, Set, Tuple
+
+# What changed, every event also names the guild it changed in
+TOPIC_POINTS = "points"
+TOPIC_CONFIG = "config"
+TOPIC_PROFESSIONS = "professions"
+# Anything may have changed, e.g. after an import
+TOPIC_ALL = "all"
+
+# (topic, guild_id)
+Event = Tuple[str, Optional[int]]
+# (guild_id, userid) of a changed cutePoints row
+PointRow = Tuple[Optional[int], int]
+
+
+class InvalidationBus:
+    """
+    Tells other bot processes sharing the database which of their cached data went stale.
+
+    DatabaseManager calls publish inside the transaction of every write and notify once it committed, a bus
+    implements whichever fits how it delivers events. Received events are handed to DatabaseManager.invalidate.
+
+    Point writes that only change some users name those rows instead of their guilds, so other processes refresh
+    the rows in their rank indexes rather than reloading the guilds' whole ranking.
+
+    This base class delivers nothing, which is right for a single process.
+    """
+
+    def publish(self, conn: sqlite3.Connection, topic: str, guild_ids: Iterable[Optional[int]],
+                rows: Iterable[PointRow] = ()) -> None:
+        """
+        Records a change as part of the transaction making it, on the database thread.
+
+        Args:
+            conn (sqlite3.Connection): The connection of the open write transaction.
+            topic (str): What changed, one of the TOPIC_* constants.
+            guild_ids (Iterable[Optional[int]]): The guilds anything may have changed in.
+            rows (Iterable[PointRow]): For TOPIC_POINTS, the only rows it changed in other guilds.
+        """
+
+    def notify(self, topic: str, guild_ids: Iterable[Optional[int]], rows: Iterable[PointRow] = ()) -> None:
+        """
+        Announces a change after it was committed, on the event loop.
+
+        Args:
+            topic (str): What changed, one of the TOPIC_* constants.
+            guild_ids (Iterable[Optional[int]]): The guilds anything may have changed in.
+            rows (Iterable[PointRow]): For TOPIC_POINTS, the only rows it changed in other guilds.
+        """
+
+    def start(self, db: Any) -> None:
+        """
+        Starts delivering other processes' events to a DatabaseManager.
+
+        Args:
+            db (Any): The DatabaseManager whose caches are invalidated.
+        """
+
+    async def close(self) -> None:
+        """
+        Stops delivering events.
+        """
+
+
+class LocalInvalidationBus(InvalidationBus):
+    """
+    An in-process stand-in for a shared bus, used to run several DatabaseManagers side by side in tests and
+    benchmarks. Every bus created with the same channel list receives the events of the others after they committed.
+    """
+
+    def __init__(self, channel: Optional[List["LocalInvalidationBus"]] = None) -> None:
+        """
+        Initializes an instance of the LocalInvalidationBus.
+
+        Args:
+            channel (Optional[List[LocalInvalidationBus]]): The buses to connect to, the new bus adds itself.
+        """
+        self.channel = channel if channel is not None else []
+        self.channel.append(self)
+        self._db: Any = None
+
+    def notify(self, topic: str, guild_ids: Iterable[Optional[int]], rows: Iterable[PointRow] = ()) -> None:
+        events = {(topic, guild_id) for guild_id in guild_ids}
+        rows = set(rows)
+        for peer in self.channel:
+            if peer is not self and peer._db is not None:
+                asyncio.create_task(peer._db.invalidate(events, rows))
+
+    def start(self, db: Any) -> None:
+        self._db = db
+
+    async def close(self) -> None:
+        self._db = None
+
+
+class SQLiteInvalidationBus(InvalidationBus):
+    """
+    Passes events through the shared database file, for processes on the same host.
+
+    Every write adds its events to the cacheInvalidations table in its own transaction, so an event exists exactly
+    when its change was committed. Each process polls the table for events of other processes and hands over
+    everything new at once, so a row changed many times is refreshed once. Polling is one indexed read per interval,
+    events older than the retention are pruned.
+    """
+
+    def __init__(self, interval: float = 0.5, retention: float = 600.0) -> None:
+        """
+        Initializes an instance of the SQLiteInvalidationBus.
+
+        Args:
+            interval (float): Seconds between polls, the longest another process' caches may stay stale.
+            retention (float): Seconds events are kept, must be far longer than the interval.
+        """
+        self.interval = interval
+        self.retention = retention
+        # Identifies this process' events, which it skips since its own caches are already current
+        self.origin = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+
+    def publish(self, conn: sqlite3.Connection, topic: str, guild_ids: Iterable[Optional[int]],
+                rows: Iterable[PointRow] = ()) -> None:
+        created_at = int(time.time())
+        conn.executemany("INSERT INTO cacheInvalidations (origin, topic, guild_id, userid, created_at) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         [(self.origin, topic, guild_id, None, created_at) for guild_id in set(guild_ids)]
+                         + [(self.origin, topic, guild_id, user_id, created_at) for guild_id, user_id in set(rows)])
+
+    def start(self, db: Any) -> None:
+        self._task = asyncio.create_task(self._poll(db), name="owobot-cache-invalidation")
+
+    async def _poll(self, db: Any) -> None:
+        """
+        Delivers new events of other processes every interval until cancelled.
+        """
+        last_id = await db.read(lambda conn: conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM cacheInvalidations").fetchone()[0])
+        pruned = time.monotonic()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                rows = await db.read(lambda conn, last_id=last_id: conn.execute(
+                    "SELECT id, origin, topic, guild_id, userid FROM cacheInvalidations WHERE id > ? ORDER BY id",
+                    (last_id,)).fetchall())
+                if rows:
+                    last_id = rows[-1][0]
+                    events: Set[Event] = set()
+                    changed: Set[PointRow] = set()
+                    for _, origin, topic, guild_id, user_id in rows:
+                        if origin == self.origin:
+                            continue
+                        if user_id is None:
+                            events.add((topic, guild_id))
+                        else:
+                            changed.add((guild_id, user_id))
+                    if events or changed:
+                        self.received += len(events) + len(changed)
+                        await db.invalidate(events, changed)
+
+                if time.monotonic() - pruned > self.retention:
+                    pruned = time.monotonic()
+                    cutoff = int(time.time() - self.retention)
+                    await db.run(lambda conn: conn.execute("DELETE FROM cacheInvalidations WHERE created_at < ?",
+                                                           (cutoff,)))
+            except sqlite3.Error as ex:
+                logging.error(f"Error in cache invalidation poll: {ex}")
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+def bus_from_env() -> InvalidationBus:
+    """
+    Returns the bus selected by CACHE_INVALIDATION: 'none' (default) for a single process, 'sqlite' for several
+    processes sharing the database file. INVALIDATION_POLL_INTERVAL sets how often the sqlite bus polls.
+
+    Returns:
+        InvalidationBus: The bus.
+
+    Raises:
+        ValueError: If CACHE_INVALIDATION names an unknown bus.
+    """
+    kind = os.environ.get("CACHE_INVALIDATION", "none").lower()
+    if kind == "none":
+        return InvalidationBus()
+    if kind == "sqlite":
+        return SQLiteInvalidationBus(float(os.environ.get("INVALIDATION_POLL_INTERVAL", 0.5)))
+    raise ValueError(f"Unknown cache invalidation bus: {kind}")
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import discord
+
+from metrics import LOG_QUEUE_DEPTH, LOG_SEND_SECONDS
+from tracing import tracer
+
+# Discord accepts at most 10 embeds and 6000 embed characters per message
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARACTERS = 6000
+
+# (sequence number, embed dict) as stored in the spool
+SpoolEntry = Tuple[int, Dict[str, Any]]
+
+
+class LogDelivery:
+    """
+    Posts log embeds from a background task, so commands never wait on the log channel.
+
+    Embeds are grouped per channel and sent up to ten per message. Every embed is appended to a small on-disk spool
+    before it is queued and acknowledged once posted, so embeds still queued when the bot stops are posted after the
+    next start. Failed sends back off exponentially, per channel.
+    """
+
+    def __init__(self, bot: Any, spool_path: str = "log_spool.jsonl", linger: float = 0.25,
+                 max_backoff: float = 60.0) -> None:
+        """
+        Initializes an instance of the LogDelivery.
+
+        Args:
+            bot (Any): The bot used to look up channels.
+            spool_path (str): The file queued embeds are persisted to.
+            linger (float): Seconds to wait after the first queued embed so bursts share messages.
+            max_backoff (float): Upper bound, in seconds, of the delay between failed attempts.
+        """
+        self.bot = bot
+        self.spool_path = spool_path
+        self.linger = linger
+        self.max_backoff = max_backoff
+
+        self._pending: "OrderedDict[int, Deque[SpoolEntry]]" = OrderedDict()
+        self._size = 0
+        self._seq = 0
+        self._spool = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.delivered = 0
+        self.messages = 0
+        self.dropped = 0
+
+    def _load_spool(self) -> None:
+        """
+        Restores embeds that were queued but not posted before the last shutdown and compacts the spool.
+        """
+        entries: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+        if os.path.exists(self.spool_path):
+            with open(self.spool_path, encoding="utf8") as spool:
+                for line in spool:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash, everything before it is intact
+                        continue
+                    if "ack" in record:
+                        for seq in record["ack"]:
+                            entries.pop(seq, None)
+                    else:
+                        entries[record["seq"]] = (record["channel_id"], record["embed"])
+                        self._seq = max(self._seq, record["seq"])
+
+        # The compacted spool replaces the old one in a single step, so a crash while writing it loses nothing
+        compacted_path = self.spool_path + ".tmp"
+        with open(compacted_path, "w", encoding="utf8") as compacted:
+            for seq, (channel_id, embed) in sorted(entries.items()):
+                compacted.write(json.dumps({"seq": seq, "channel_id": channel_id, "embed": embed},
+                                           separators=(",", ":")) + "\n")
+                self._pending.setdefault(channel_id, deque()).append((seq, embed))
+                self._size += 1
+            compacted.flush()
+            os.fsync(compacted.fileno())
+        os.replace(compacted_path, self.spool_path)
+        self._spool = open(self.spool_path, "a", encoding="utf8")
+        if entries:
+            logging.info(f"Restored {len(entries)} undelivered log embeds.")
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._spool.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._spool.flush()
+
+    def start(self) -> None:
+        """
+        Restores the spool and starts the delivery task on the running loop.
+        """
+        self._load_spool()
+        self._wakeup = asyncio.Event()
+        if self._size:
+            self._wakeup.set()
+        self._task = asyncio.create_task(self._run(), name="owobot-log-delivery")
+
+    def enqueue(self, channel_id: int, embed: discord.Embed) -> None:
+        """
+        Queues an embed for a channel and returns immediately.
+
+        Args:
+            channel_id (int): The ID of the channel to post to.
+            embed (discord.Embed): The embed to post.
+        """
+        self._seq += 1
+        embed_dict = embed.to_dict()
+        with tracer.span("log_delivery enqueue", channel_id=channel_id, seq=self._seq):
+            self._write({"seq": self._seq, "channel_id": channel_id, "embed": embed_dict})
+        self._pending.setdefault(channel_id, deque()).append((self._seq, embed_dict))
+        self._size += 1
+        LOG_QUEUE_DEPTH.set(self._size)
+        self._wakeup.set()
+
+    def _take_batch(self, queue: Deque[SpoolEntry]) -> List[SpoolEntry]:
+        """
+        Takes the next entries of a channel that fit in a single message, without removing them from the queue.
+        """
+        batch: List[SpoolEntry] = []
+        characters = 0
+        for seq, embed in queue:
+            length = len(discord.Embed.from_dict(embed))
+            if batch and (len(batch) == MAX_EMBEDS_PER_MESSAGE or characters + length > MAX_EMBED_CHARACTERS):
+                break
+            batch.append((seq, embed))
+            characters += length
+        return batch
+
+    def _ack(self, channel_id: int, batch: List[SpoolEntry]) -> None:
+        queue = self._pending[channel_id]
+        for _ in batch:
+            queue.popleft()
+        if not queue:
+            del self._pending[channel_id]
+        self._size -= len(batch)
+        LOG_QUEUE_DEPTH.set(self._size)
+        self._write({"ack": [seq for seq, _ in batch]})
+        if not self._size:
+            # Nothing is outstanding, start the spool over so it never grows
+            self._spool.seek(0)
+            self._spool.truncate()
+
+    async def _send(self, channel_id: int, batch: List[SpoolEntry]) -> bool:
+        """
+        Posts one batch of embeds.
+
+        Returns:
+            bool: False if the send should be retried later, True if the batch is done with.
+        """
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            logging.error(f"Log channel {channel_id} not found, dropping {len(batch)} log embeds.")
+            self.dropped += len(batch)
+            return True
+        # Every message is its own trace, the seq attribute links it to the enqueue spans of the commands
+        span = tracer.start_root("log_delivery send", channel_id=channel_id, seq=[seq for seq, _ in batch])
+        try:
+            with LOG_SEND_SECONDS.time():
+                await channel.send(embeds=[discord.Embed.from_dict(embed) for _, embed in batch])
+        except discord.HTTPException as ex:
+            tracer.end(span, type(ex).__name__)
+            if 400 <= ex.status < 500 and ex.status != 429:
+                # Missing permissions, a deleted channel or an embed Discord rejects, retrying cannot help
+                logging.error(f"Cannot post to log channel {channel_id}, dropping {len(batch)} log embeds: {ex}")
+                self.dropped += len(batch)
+                return True
+            logging.warning(f"Posting to log channel {channel_id} failed, retrying: {ex}")
+            return False
+        except (OSError, asyncio.TimeoutError) as ex:
+            logging.warning(f"Posting to log channel {channel_id} failed, retrying: {ex}")
+            tracer.end(span, type(ex).__name__)
+            return False
+        tracer.end(span)
+        self.delivered += len(batch)
+        self.messages += 1
+        return True
+
+    async def _run(self) -> None:
+        """
+        Delivery loop, posts queued embeds channel by channel. A channel whose sends fail backs off on its own, the
+        other channels keep being served.
+        """
+        await self.bot.wait_until_ready()
+        backoff: Dict[int, float] = {}
+        retry_at: Dict[int, float] = {}
+        while True:
+            if retry_at:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), max(min(retry_at.values()) - time.monotonic(), 0.0))
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await self._wakeup.wait()
+            self._wakeup.clear()
+            if self.linger:
+                await asyncio.sleep(self.linger)
+
+            sent = True
+            while sent:
+                sent = False
+                for channel_id in list(self._pending):
+                    if retry_at.get(channel_id, 0.0) > time.monotonic():
+                        continue
+                    batch = self._take_batch(self._pending[channel_id])
+                    if await self._send(channel_id, batch):
+                        self._ack(channel_id, batch)
+                        backoff.pop(channel_id, None)
+                        retry_at.pop(channel_id, None)
+                        sent = True
+                    else:
+                        backoff[channel_id] = min(max(backoff.get(channel_id, 0.0) * 2, 1.0), self.max_backoff)
+                        retry_at[channel_id] = time.monotonic() + backoff[channel_id]
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """
+        Gives queued embeds a short time to be posted, then stops the task. Anything left stays in the spool.
+
+        Args:
+            timeout (float): Seconds to wait for the queue to drain.
+        """
+        if self._task is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._size and time.monotonic() < deadline and not self.bot.is_closed():
+            await asyncio.sleep(0.1)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._spool.close()
@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import discord
+from aiohttp import web
+from discord import app_commands
+
+from tracing import tracer
+
+# Latency buckets in seconds, from sub-millisecond cache hits up to Discord's 3 second interaction deadline
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 3.0, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """
+    Formats label pairs the way the Prometheus text format expects them.
+    """
+    pairs = [name + '="' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    Base class for metrics, every metric keeps one series per combination of label values.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        """
+        Initializes a metric and registers it with the default registry.
+
+        Args:
+            name (str): The metric name.
+            documentation (str): The help text.
+            labelnames (Sequence[str]): The names of the labels every observation provides.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Observations come from worker threads as well as the event loop
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing count.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram(Metric):
+    """
+    Counts observations into fixed buckets, cheap enough to record on every call.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: bucket counts (the last one is +Inf), sum of observations
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """
+        Records one observation.
+
+        Args:
+            value (float): The observed value, in seconds for latencies.
+            *labels (str): The label values, in the order of labelnames.
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """
+        Context manager observing how long its body took.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + ("+Inf" if bound == float("inf") else repr(bound)) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    """
+    Collects every metric and renders them in the Prometheus text exposition format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+COMMAND_SECONDS = Histogram("owobot_command_duration_seconds",
+                            "Time spent handling an app command, from its checks to its completion.",
+                            ("command", "status"))
+DB_QUERY_SECONDS = Histogram("owobot_db_query_duration_seconds",
+                             "Time a DatabaseManager query spent executing on its database thread.", ("query",))
+DB_QUEUE_SECONDS = Histogram("owobot_db_queue_wait_seconds",
+                             "Time a DatabaseManager query waited for a free database thread.", ("query",))
+STYLE_RENDER_SECONDS = Histogram("owobot_style_render_duration_seconds",
+                                 "Time spent rendering a style template into an embed dict.", ("style",))
+LOG_SEND_SECONDS = Histogram("owobot_log_channel_send_duration_seconds",
+                             "Time spent posting a message of log embeds to a points log channel.")
+LOG_QUEUE_DEPTH = Gauge("owobot_log_queue_depth", "Log embeds waiting to be posted to their log channel.")
+COMMANDS_THROTTLED = Counter("owobot_commands_throttled_total", "App command calls refused by a per-user rate limit.",
+                             ("command",))
+RESPONSES_DEFERRED = Counter("owobot_responses_deferred_total",
+                             "Interactions deferred because their response was not ready within the response budget.",
+                             ("command",))
+READS_COALESCED = Counter("owobot_reads_coalesced_total",
+                          "Reads that joined an identical read already in flight instead of running their own.",
+                          ("read",))
+# Batch jobs take seconds to minutes, their chunks milliseconds
+BATCH_JOB_SECONDS = Histogram("owobot_batch_job_duration_seconds",
+                              "Time a scheduled batch job over the points table took from start to end.", ("job",),
+                              buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0))
+BATCH_JOB_LOCK_SECONDS = Histogram("owobot_batch_job_lock_seconds",
+                                   "Time one chunk of a batch job held the database write lock.", ("job",))
+EVENT_LOOP_LAG_SECONDS = Histogram("owobot_event_loop_lag_seconds",
+                                   "How late the event loop woke up a periodic probe.")
+EVENT_LOOP_STALLS = Counter("owobot_event_loop_stalls_total",
+                            "Times the event loop was blocked for longer than the stall threshold.")
+EVENT_LOOP_LAG_LAST = Gauge("owobot_event_loop_lag_last_seconds", "The most recent event loop lag measurement.")
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    """
+    Measures event loop lag until cancelled, by checking how late a periodic sleep wakes up.
+
+    Args:
+        interval (float): Seconds between probes.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - expected, 0.0)
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
+
+
+async def start_http_server(host: str = "127.0.0.1", port: int = 9108) -> web.AppRunner:
+    """
+    Serves the metrics at /metrics over HTTP.
+
+    Args:
+        host (str): The address to listen on, local only by default.
+        port (int): The port to listen on.
+
+    Returns:
+        web.AppRunner: The runner, call its cleanup() to stop the server.
+    """
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(body=REGISTRY.render().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return runner
+
+
+def _command_name(interaction: discord.Interaction) -> str:
+    command = interaction.command
+    return command.qualified_name if command is not None else "unknown"
+
+
+class MetricsCommandTree(app_commands.CommandTree):
+    """
+    A command tree that times every app command callback.
+
+    The timer starts in interaction_check, which runs before any command, and stops when the command completes
+    or fails. The same two points start and end the command's trace. Autocomplete requests are not timed.
+    """
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.type == discord.InteractionType.autocomplete:
+            # Autocomplete also passes here but never completes a command, which would leave its trace open
+            return True
+        interaction.extras["started"] = time.perf_counter()
+        interaction.extras["span"] = tracer.start_root(f"command {_command_name(interaction)}",
+                                                       interaction_id=interaction.id, guild_id=interaction.guild_id,
+                                                       user_id=interaction.user.id)
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError) -> None:
+        if isinstance(error, app_commands.CommandOnCooldown):
+            # Rate limited calls are expected, answer them instead of logging a traceback
+            record_command(interaction, "throttled")
+            if not interaction.response.is_done():
+                await interaction.response.send_message(
+                    embed=discord.Embed(title="Slow down", description=f"Try again in {error.retry_after:.1f}s.",
+                                        color=discord.Color.red()),
+                    ephemeral=True)
+            return
+        record_command(interaction, "error")
+        await super().on_error(interaction, error)
+
+
+def record_command(interaction: discord.Interaction, status: str = "ok") -> None:
+    """
+    Records how long an app command took, if its start was recorded by MetricsCommandTree, and ends its trace.
+
+    Args:
+        interaction (discord.Interaction): The interaction context.
+        status (str): 'ok' for completed commands, 'error' for failed ones, 'throttled' for rate limited ones.
+    """
+    started: Optional[float] = interaction.extras.get("started")
+    if started is not None:
+        COMMAND_SECONDS.observe(time.perf_counter() - started, _command_name(interaction), status)
+    tracer.end(interaction.extras.pop("span", None), status)
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import discord
+
+
+class Profile(NamedTuple):
+    """
+    What the embeds show of a member.
+
+    Attributes:
+        name (str): The member's display name.
+        avatar_url (str): URL of the member's avatar, the default avatar for members without a custom one.
+    """
+    name: str
+    avatar_url: str
+
+
+class ProfileCache:
+    """
+    A bounded cache of member display names and avatar URLs, used by the embed builders.
+
+    Entries are keyed by guild and user, since nicknames differ per guild, and expire after a TTL so a missed
+    update event is corrected eventually. The least recently used entries are dropped once the cache is full.
+
+    Member and user update events keep the cache current and collect name changes, which are written to the
+    database in periodic batches so leaderboard names follow renames without a write per event.
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        """
+        Initializes an instance of the ProfileCache.
+
+        Args:
+            max_size (Optional[int]): The maximum number of cached profiles, PROFILE_CACHE_SIZE by default.
+            ttl (Optional[float]): Seconds a profile stays cached, PROFILE_CACHE_TTL by default.
+        """
+        self.max_size = max_size if max_size is not None else int(os.environ.get("PROFILE_CACHE_SIZE", 10_000))
+        self.ttl = ttl if ttl is not None else float(os.environ.get("PROFILE_CACHE_TTL", 600))
+        # (guild_id, user_id) -> (expiry time, profile), guild_id is 0 outside of guilds
+        self._profiles: "OrderedDict[Tuple[int, int], Tuple[float, Profile]]" = OrderedDict()
+        # Name changes waiting to be written, the latest one per (guild_id, user_id) wins
+        self._renames: Dict[Tuple[int, int], str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    @staticmethod
+    def _key(user: Any) -> Tuple[int, int]:
+        guild = getattr(user, "guild", None)
+        return (guild.id if guild is not None else 0), user.id
+
+    def _store(self, key: Tuple[int, int], profile: Profile) -> None:
+        self._profiles[key] = (time.monotonic() + self.ttl, profile)
+        self._profiles.move_to_end(key)
+        while len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+
+    def get(self, user: Any) -> Profile:
+        """
+        Returns a member's or user's profile, from the cache while it is fresh.
+
+        Args:
+            user (Any): The discord.Member or discord.User.
+
+        Returns:
+            Profile: The display name and avatar URL.
+        """
+        key = self._key(user)
+        entry = self._profiles.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._profiles.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        profile = Profile(user.display_name, user.display_avatar.url)
+        self._store(key, profile)
+        return profile
+
+    def update(self, member: discord.Member) -> None:
+        """
+        Refreshes a member's profile and queues their name for writing if it changed.
+
+        Args:
+            member (discord.Member): The member as it is now.
+        """
+        key = self._key(member)
+        entry = self._profiles.get(key)
+        if entry is None or entry[1].name != member.display_name:
+            self._renames[key] = member.display_name
+        self._store(key, Profile(member.display_name, member.display_avatar.url))
+
+    def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        """
+        Handles a nickname or guild avatar change.
+        """
+        if before.display_name != after.display_name or before.display_avatar != after.display_avatar:
+            self.update(after)
+
+    def on_user_update(self, before: discord.User, after: discord.User) -> None:
+        """
+        Handles a username, global name or avatar change, which shows in every guild the user is in.
+        """
+        if before.display_name == after.display_name and before.display_avatar == after.display_avatar:
+            return
+        self._profiles.pop((0, after.id), None)
+        for guild in after.mutual_guilds:
+            member = guild.get_member(after.id)
+            if member is not None:
+                self.update(member)
+
+    def take_renames(self) -> List[Tuple[int, int, str]]:
+        """
+        Removes and returns the queued name changes.
+
+        Returns:
+            List[Tuple[int, int, str]]: The changes as (guild_id, userid, name).
+        """
+        renames, self._renames = self._renames, {}
+        return [(guild_id, user_id, name) for (guild_id, user_id), name in renames.items() if guild_id]
+
+    async def flush(self, db: Any) -> int:
+        """
+        Writes the queued name changes to the database in one batch.
+
+        Args:
+            db (Any): The DatabaseManager to write to.
+
+        Returns:
+            int: The number of name changes written.
+        """
+        renames = self.take_renames()
+        if renames:
+            try:
+                await db.update_names(renames)
+            except Exception:
+                # Put them back unless a newer name was queued in the meantime
+                for guild_id, user_id, name in renames:
+                    self._renames.setdefault((guild_id, user_id), name)
+                raise
+        return len(renames)
+
+    async def flush_periodically(self, db: Any, interval: float = 30.0) -> None:
+        """
+        Writes queued name changes every interval until cancelled.
+
+        Args:
+            db (Any): The DatabaseManager to write to.
+            interval (float): Seconds between writes.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush(db)
+            except Exception as ex:
+                logging.error(f"Error in flush_periodically: {ex}")
+
+
+profiles = ProfileCache()
@@ -0,0 +1,386 @@
+import random
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from autocomplete import PrefixIndex
+
+# Entries are ordered by this key: highest points first, ties broken by the lower user ID.
+RankKey = Tuple[int, int]
+
+MAX_LEVELS = 32
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: Optional[RankKey], levels: int) -> None:
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * levels
+        self.width: List[int] = [1] * levels
+
+
+class IndexableSkipList:
+    """
+    A skip list that also tracks link widths, giving O(log n) insert, remove, lookup by position and rank of a key.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty IndexableSkipList.
+        """
+        self.head = _Node(None, MAX_LEVELS)
+        self.size = 0
+        self.levels = 1
+
+    def __len__(self) -> int:
+        return self.size
+
+    @classmethod
+    def from_sorted(cls, keys: Iterable[RankKey]) -> "IndexableSkipList":
+        """
+        Builds a skip list in a single pass from keys that are already sorted.
+
+        Args:
+            keys (Iterable[RankKey]): The keys in ascending order, without duplicates.
+
+        Returns:
+            IndexableSkipList: The populated skip list.
+        """
+        skip_list = cls()
+        last: List[_Node] = [skip_list.head] * MAX_LEVELS
+        last_position = [0] * MAX_LEVELS
+        position = 0
+        for position, key in enumerate(keys, start=1):
+            levels = skip_list._random_level()
+            skip_list.levels = max(skip_list.levels, levels)
+            node = _Node(key, levels)
+            for level in range(levels):
+                last[level].next[level] = node
+                last[level].width[level] = position - last_position[level]
+                last[level] = node
+                last_position[level] = position
+        for level in range(skip_list.levels):
+            last[level].width[level] = position + 1 - last_position[level]
+        skip_list.size = position
+        return skip_list
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVELS and random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key: RankKey) -> None:
+        """
+        Inserts a key.
+
+        Args:
+            key (RankKey): The key to insert.
+        """
+        levels = self._random_level()
+        if levels > self.levels:
+            # Levels above the current height were not maintained, their head link spans the whole list
+            for level in range(self.levels, levels):
+                self.head.width[level] = self.size + 1
+            self.levels = levels
+
+        chain: List[_Node] = [self.head] * self.levels
+        steps_at_level = [0] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        new_node = _Node(key, levels)
+        steps = 0
+        for level in range(levels):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(levels, self.levels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, key: RankKey) -> None:
+        """
+        Removes a key.
+
+        Args:
+            key (RankKey): The key to remove.
+
+        Raises:
+            KeyError: If the key is not in the list.
+        """
+        chain: List[_Node] = [self.head] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            chain[level] = node
+
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+
+        for level in range(len(target.next)):
+            prev = chain[level]
+            prev.width[level] += target.width[level] - 1
+            prev.next[level] = target.next[level]
+        for level in range(len(target.next), self.levels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def position(self, key: RankKey) -> int:
+        """
+        Returns the zero-based position of a key.
+
+        Args:
+            key (RankKey): The key to look up.
+
+        Returns:
+            int: The position of the key.
+
+        Raises:
+            KeyError: If the key is not in the list.
+        """
+        node = self.head
+        position = -1
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.next[level].key <= key:
+                position += node.width[level]
+                node = node.next[level]
+        if node.key != key:
+            raise KeyError(key)
+        return position
+
+    def count_less(self, key: RankKey, inclusive: bool = False) -> int:
+        """
+        Counts the keys ordered before a key, which does not need to be in the list.
+
+        Args:
+            key (RankKey): The key to compare against.
+            inclusive (bool): Also count a key equal to the given one.
+
+        Returns:
+            int: The number of keys before the given key.
+        """
+        node = self.head
+        count = 0
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and (node.next[level].key < key or
+                                                    (inclusive and node.next[level].key == key)):
+                count += node.width[level]
+                node = node.next[level]
+        return count
+
+    def __getitem__(self, index: int) -> RankKey:
+        """
+        Returns the key at a zero-based position.
+
+        Args:
+            index (int): The position.
+
+        Returns:
+            RankKey: The key at that position.
+        """
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        node = self.head
+        index += 1
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.width[level] <= index:
+                index -= node.width[level]
+                node = node.next[level]
+        return node.key
+
+    def slice(self, start: int, count: int) -> List[RankKey]:
+        """
+        Returns up to count keys starting at a zero-based position.
+
+        Args:
+            start (int): The position of the first key.
+            count (int): The maximum number of keys to return.
+
+        Returns:
+            List[RankKey]: The keys in order.
+        """
+        if start >= self.size or count <= 0:
+            return []
+        start = max(start, 0)
+        node = self.head
+        index = start + 1
+        for level in reversed(range(self.levels)):
+            while node.next[level] is not None and node.width[level] <= index:
+                index -= node.width[level]
+                node = node.next[level]
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+class RankIndex:
+    """
+    An in-memory ranking of every point holder, kept in sync with the cutePoints table.
+
+    The ranking answers top-N, rank-of-user and users-around-user queries in O(log n) without touching the database.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty RankIndex.
+        """
+        self._ranking = IndexableSkipList()
+        self._users: Dict[int, Tuple[str, int]] = {}
+        # Member names by prefix, for autocomplete
+        self.names = PrefixIndex()
+        self.loaded = False
+        self.loaded_seq = 0
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def load(self, rows: Iterable[Tuple[int, str, int]], seq: int = 0) -> None:
+        """
+        Replaces the index contents with rows read from the database.
+
+        Args:
+            rows (Iterable[Tuple[int, str, int]]): The rows as (userid, name, points).
+            seq (int): The last committed write included in the rows, later writes still need to be applied.
+        """
+        self._users = {user_id: (name, points or 0) for user_id, name, points in rows}
+        self.names.load((user_id, name) for user_id, (name, _) in self._users.items())
+        self._ranking = IndexableSkipList.from_sorted(
+            sorted((-points, user_id) for user_id, (_, points) in self._users.items()))
+        self.loaded = True
+        self.loaded_seq = seq
+
+    def set(self, user_id: int, name: str, points: int) -> None:
+        """
+        Sets a user's points, adding the user if they are not ranked yet.
+
+        Args:
+            user_id (int): The Discord user ID.
+            name (str): The user's name.
+            points (int): The user's total points.
+        """
+        current = self._users.get(user_id)
+        if current is not None:
+            self._ranking.remove((-current[1], user_id))
+        if current is None or current[0] != name:
+            self.names.set(user_id, name)
+        self._users[user_id] = (name, points)
+        self._ranking.insert((-points, user_id))
+
+    def add(self, user_id: int, name: str, delta: int) -> int:
+        """
+        Adds a delta to a user's points and updates their name, adding the user if they are not ranked yet.
+
+        Args:
+            user_id (int): The Discord user ID.
+            name (str): The user's current name.
+            delta (int): The number of points to add.
+
+        Returns:
+            int: The user's new total.
+        """
+        current = self._users.get(user_id)
+        points = current[1] + delta if current is not None else delta
+        self.set(user_id, name, points)
+        return points
+
+    def rename(self, user_id: int, name: str) -> None:
+        """
+        Changes a ranked user's name, users who are not ranked are ignored.
+
+        Args:
+            user_id (int): The Discord user ID.
+            name (str): The user's new name.
+        """
+        current = self._users.get(user_id)
+        if current is not None and current[0] != name:
+            self.set(user_id, name, current[1])
+
+    def points(self, user_id: int) -> Optional[int]:
+        """
+        Returns a user's points, or None if the user is not ranked.
+        """
+        current = self._users.get(user_id)
+        return current[1] if current else None
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """
+        Returns a user's one-based rank, or None if the user is not ranked.
+        """
+        current = self._users.get(user_id)
+        if current is None:
+            return None
+        return self._ranking.position((-current[1], user_id)) + 1
+
+    def count_before(self, cursor: Tuple[int, int], inclusive: bool = False) -> int:
+        """
+        Counts the users ranked ahead of a (points, userid) position, which does not need to belong to a user.
+
+        Args:
+            cursor (Tuple[int, int]): The position as (points, userid).
+            inclusive (bool): Also count a user sitting exactly at the position.
+
+        Returns:
+            int: The number of users ranked ahead.
+        """
+        points, user_id = cursor
+        return self._ranking.count_less((-points, user_id), inclusive=inclusive)
+
+    def _entries(self, keys: List[RankKey]) -> List[Tuple[int, str, int]]:
+        return [(user_id, self._users[user_id][0], -negative_points) for negative_points, user_id in keys]
+
+    def page(self, start: int, count: int) -> List[Tuple[int, str, int]]:
+        """
+        Returns ranked entries starting at a zero-based position.
+
+        Args:
+            start (int): The position of the first entry.
+            count (int): The maximum number of entries.
+
+        Returns:
+            List[Tuple[int, str, int]]: The entries as (userid, name, points).
+        """
+        return self._entries(self._ranking.slice(start, count))
+
+    def top(self, count: int = 10) -> List[Tuple[str, int]]:
+        """
+        Returns the highest ranked users.
+
+        Args:
+            count (int): The number of users to return.
+
+        Returns:
+            List[Tuple[str, int]]: The users as (name, points), highest first.
+        """
+        return [(name, points) for _, name, points in self.page(0, count)]
+
+    def around(self, user_id: int, radius: int = 2) -> List[Tuple[int, int, str, int]]:
+        """
+        Returns the users ranked directly above and below a user, including the user.
+
+        Args:
+            user_id (int): The Discord user ID.
+            radius (int): How many neighbours to include on each side.
+
+        Returns:
+            List[Tuple[int, int, str, int]]: The entries as (rank, userid, name, points).
+        """
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        entries = self.page(start, rank - start + radius)
+        return [(start + offset + 1, *entry) for offset, entry in enumerate(entries)]
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import os
+import time
+from types import TracebackType
+from typing import Any, Optional, Type
+
+import discord
+
+import style_manager
+from metrics import RESPONSES_DEFERRED
+from tracing import Span, tracer
+
+# Seconds after an interaction arrived at which a response that is still being worked on is deferred, leaving the
+# rest of Discord's 3 second deadline for the defer request itself
+RESPONSE_BUDGET = float(os.environ.get("RESPONSE_BUDGET", 2.0))
+
+
+def _label(interaction: discord.Interaction) -> str:
+    command = interaction.command
+    if command is not None:
+        return command.qualified_name
+    return interaction.type.name if interaction.type is not None else "unknown"
+
+
+class Responder:
+    """
+    Answers an interaction within Discord's response deadline, however long the work before the answer takes.
+
+    A timer starts with the interaction, from the moment MetricsCommandTree received it when available. If no response
+    was sent once the budget is used up, the interaction is deferred: commands show the "thinking" state, components
+    and modals a deferred update. send, edit and error then go through the initial response or, after a deferral, the
+    followup webhook and the original response, so callers never pick the channel themselves. A lock keeps the timer's
+    deferral and the callers' responses from racing.
+
+    Interactions that are not app commands, and so have no trace from MetricsCommandTree yet, get one from the
+    responder, spanning the async with block.
+
+    Used as an async context manager around a command's body:
+
+        async with Responder(interaction, ephemeral=True) as reply:
+            ...
+            await reply.send(embed=embed)
+    """
+
+    def __init__(self, interaction: discord.Interaction, ephemeral: bool = False,
+                 budget: Optional[float] = None) -> None:
+        """
+        Initializes an instance of the Responder and starts its timer.
+
+        Args:
+            interaction (discord.Interaction): The interaction to answer.
+            ephemeral (bool): Whether messages sent, and the "thinking" state, are only shown to the user.
+            budget (Optional[float]): Seconds after the interaction arrived at which it is deferred, RESPONSE_BUDGET
+                                      by default.
+        """
+        self.interaction = interaction
+        self.ephemeral = ephemeral
+        self.deferred = False
+        self._lock = asyncio.Lock()
+        self._defer_task: Optional[asyncio.Task] = None
+        started = interaction.extras.get("started", time.perf_counter())
+        remaining = (RESPONSE_BUDGET if budget is None else budget) - (time.perf_counter() - started)
+        self._timer: Optional[asyncio.TimerHandle] = asyncio.get_running_loop().call_later(
+            max(remaining, 0.0), self._start_defer)
+        self._span: Optional[Span] = None
+
+    async def __aenter__(self) -> "Responder":
+        if tracer.current_trace_id() is None:
+            self._span = tracer.start_root(f"interaction {_label(self.interaction)}",
+                                           interaction_id=self.interaction.id, guild_id=self.interaction.guild_id,
+                                           user_id=self.interaction.user.id)
+        return self
+
+    async def __aexit__(self, exc_type: Optional[Type[BaseException]], exc_val: Optional[BaseException],
+                        exc_tb: Optional[TracebackType]) -> None:
+        await self.close()
+        tracer.end(self._span, exc_type.__name__ if exc_type is not None else "ok")
+        self._span = None
+
+    def _start_defer(self) -> None:
+        self._timer = None
+        self._defer_task = asyncio.create_task(self.defer())
+
+    async def defer(self) -> None:
+        """
+        Defers the interaction now unless it was already answered, e.g. before slow work that is known in advance.
+        """
+        async with self._lock:
+            if self.interaction.response.is_done():
+                return
+            with tracer.span("respond defer"):
+                try:
+                    if self.interaction.type == discord.InteractionType.application_command:
+                        await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+                    else:
+                        await self.interaction.response.defer()
+                except discord.HTTPException as ex:
+                    # Too late or already answered elsewhere, the response that follows reports the failure
+                    logging.error(f"Error deferring interaction: {ex}")
+                    return
+            self.deferred = True
+            RESPONSES_DEFERRED.inc(_label(self.interaction))
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> Optional[discord.Message]:
+        """
+        Sends a message as the response, or as a followup once the interaction was deferred or answered.
+
+        Args:
+            content (Optional[str]): The message text.
+            **kwargs: Further arguments for the message, e.g. embed or view.
+
+        Returns:
+            Optional[discord.Message]: The followup message, None when sent as the initial response.
+        """
+        self._cancel_timer()
+        kwargs.setdefault("ephemeral", self.ephemeral)
+        async with self._lock:
+            if self.interaction.response.is_done():
+                with tracer.span("respond followup"):
+                    return await self.interaction.followup.send(content, wait=True, **kwargs)
+            with tracer.span("respond send"):
+                await self.interaction.response.send_message(content, **kwargs)
+            return None
+
+    async def edit(self, **kwargs: Any) -> None:
+        """
+        Edits the message a component or modal belongs to, through the original response once deferred.
+
+        Args:
+            **kwargs: The message fields to change, e.g. embed or view.
+        """
+        self._cancel_timer()
+        async with self._lock:
+            with tracer.span("respond edit"):
+                if self.interaction.response.is_done():
+                    await self.interaction.edit_original_response(**kwargs)
+                else:
+                    await self.interaction.response.edit_message(**kwargs)
+
+    async def error(self, error_message: str) -> None:
+        """
+        Sends an error embed through whichever channel is still open, see style_manager.send_error_embed.
+
+        Args:
+            error_message (str): The error message to display.
+        """
+        self._cancel_timer()
+        async with self._lock:
+            with tracer.span("respond error", message=error_message):
+                await style_manager.send_error_embed(self.interaction, error_message)
+
+    async def close(self) -> None:
+        """
+        Stops the timer and waits for a deferral in progress.
+        """
+        self._cancel_timer()
+        if self._defer_task is not None:
+            await self._defer_task
+            self._defer_task = None
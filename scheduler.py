@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from tracing import tracer
+
+# Due times are counted from a Monday at midnight UTC, so daily jobs run at midnight and weekly ones at the start of
+# the week, like the weekly leaderboard
+SCHEDULE_EPOCH = 4 * 86400
+
+
+class ScheduledJob:
+    """
+    A job the Scheduler runs every interval, and what its last run returned.
+    """
+
+    def __init__(self, name: str, interval: float, run: Callable[[int], Awaitable[Any]]) -> None:
+        """
+        Initializes an instance of the ScheduledJob.
+
+        Args:
+            name (str): The name of the job, also the key its due time is stored under.
+            interval (float): Seconds between runs.
+            run (Callable[[int], Awaitable[Any]]): Runs the job once for the due time it is given. Must be safe to
+                                                   call again for the same due time after a failure.
+        """
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.due: Optional[int] = None
+        self.last_run: Optional[float] = None
+        self.last_result: Any = None
+        # Created on first use, jobs are added before the event loop runs
+        self.lock: Optional[asyncio.Lock] = None
+
+    def next_due(self, after: float) -> int:
+        """
+        Returns the first due time after a timestamp.
+
+        Args:
+            after (float): Seconds since the epoch.
+
+        Returns:
+            int: The due time in seconds since the epoch.
+        """
+        return int(SCHEDULE_EPOCH + ((after - SCHEDULE_EPOCH) // self.interval + 1) * self.interval)
+
+
+class Scheduler:
+    """
+    Runs jobs, like point decay and season resets, at fixed times.
+
+    Every job is due once per interval, counted from SCHEDULE_EPOCH. Its next due time is stored in the botState
+    table and only moved forward once a run succeeded, so a job that came due while the bot was offline, or whose run
+    failed or was interrupted, runs again on a later check. Of several processes sharing the database only the one
+    holding the job's lease runs it. The lease is renewed while the job runs and expires if its process dies.
+    """
+
+    def __init__(self, db: Any, check_interval: float = 60.0, lease: float = 300.0) -> None:
+        """
+        Initializes an instance of the Scheduler.
+
+        Args:
+            db (Any): The DatabaseManager due times are stored in.
+            check_interval (float): Seconds between checks for due jobs, the longest a job may start late.
+            lease (float): Seconds a claimed run is reserved for this process without being renewed.
+        """
+        self.db = db
+        self.check_interval = check_interval
+        self.lease = lease
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, interval: float, run: Callable[[int], Awaitable[Any]]) -> None:
+        """
+        Adds a job. Jobs due at the same time run in the order they were added.
+
+        Args:
+            name (str): The name of the job.
+            interval (float): Seconds between runs.
+            run (Callable[[int], Awaitable[Any]]): Runs the job once for the due time it is given.
+        """
+        self.jobs[name] = ScheduledJob(name, interval, run)
+
+    def start(self) -> None:
+        """
+        Starts checking for due jobs.
+        """
+        self._task = asyncio.create_task(self._loop(), name="owobot-scheduler")
+
+    async def _loop(self) -> None:
+        """
+        Runs every job that is due, every check interval, until cancelled.
+        """
+        while True:
+            for job in self.jobs.values():
+                try:
+                    due = await self._claim(job)
+                    if due is not None:
+                        await self._run_claimed(job, due)
+                except Exception as ex:
+                    logging.error(f"Error in scheduled job {job.name}: {ex}")
+            await asyncio.sleep(self.check_interval)
+
+    async def _claim(self, job: ScheduledJob) -> Optional[int]:
+        """
+        Takes the lease of a due job, which reserves its run for this process.
+
+        Args:
+            job (ScheduledJob): The job.
+
+        Returns:
+            Optional[int]: The due time to run the job for, None if it is not due or runs elsewhere.
+        """
+        key = f"job_due:{job.name}"
+        stored = await self.db.get_state(key)
+        now = time.time()
+        if stored is None or int(stored) > job.next_due(now):
+            # A new job, or one whose interval was shortened, waits for its next due time
+            job.due = job.next_due(now)
+            await self.db.replace_state(key, stored, str(job.due))
+            return None
+        job.due = int(stored)
+        if now < job.due:
+            return None
+        lease_key = f"job_lease:{job.name}"
+        lease = await self.db.get_state(lease_key)
+        if lease is not None and float(lease) > now:
+            # Running in another process
+            return None
+        if not await self.db.replace_state(lease_key, lease, str(now + self.lease)):
+            # Another process claimed it first
+            return None
+        return job.due
+
+    async def _run_claimed(self, job: ScheduledJob, due: int) -> None:
+        """
+        Runs a claimed job while renewing its lease, then moves its due time forward. The lease is released either
+        way, a failed run is retried on the next check.
+
+        Args:
+            job (ScheduledJob): The job.
+            due (int): The due time it was claimed for.
+        """
+        lease_key = f"job_lease:{job.name}"
+
+        async def _renew() -> None:
+            while True:
+                await asyncio.sleep(self.lease / 3)
+                try:
+                    await self.db.set_state(lease_key, str(time.time() + self.lease))
+                except Exception as ex:
+                    logging.error(f"Error renewing the lease of job {job.name}: {ex}")
+
+        renewal = asyncio.create_task(_renew())
+        try:
+            await self.run_job(job.name, due)
+            job.due = job.next_due(max(time.time(), due))
+            await self.db.replace_state(f"job_due:{job.name}", str(due), str(job.due))
+        finally:
+            renewal.cancel()
+            await self.db.set_state(lease_key, "0")
+
+    async def run_job(self, name: str, due: Optional[int] = None) -> Any:
+        """
+        Runs a job now, on schedule or e.g. from an owner command. A job never runs twice at the same time in one
+        process, a second call waits for the first.
+
+        Args:
+            name (str): The name of the job.
+            due (Optional[int]): The due time the run is for, now by default.
+
+        Returns:
+            Any: Whatever the job returned.
+
+        Raises:
+            ValueError: If no job has that name.
+        """
+        job = self.jobs.get(name)
+        if job is None:
+            raise ValueError(f"Unknown job {name!r}, scheduled jobs: {', '.join(self.jobs) or 'none'}")
+        if job.lock is None:
+            job.lock = asyncio.Lock()
+        async with job.lock:
+            span = tracer.start_root(f"job {name}")
+            status = "ok"
+            try:
+                job.last_result = await job.run(int(time.time()) if due is None else due)
+                job.last_run = time.time()
+                return job.last_result
+            except BaseException as ex:
+                status = type(ex).__name__
+                raise
+            finally:
+                tracer.end(span, status)
+                tracer.detach()
+
+    async def close(self) -> None:
+        """
+        Stops checking for due jobs. A job that is running is cancelled and finished after the next start.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
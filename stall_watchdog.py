@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from metrics import EVENT_LOOP_STALLS
+from tracing import tracer
+
+
+class StallWatchdog:
+    """
+    Finds the code that blocks the event loop.
+
+    A task on the loop records a heartbeat every interval. A watchdog thread checks the heartbeat, and once it is
+    overdue by the threshold it captures the loop thread's stack, which at that moment is the blocking call, e.g. a
+    synchronous sqlite3 query or file read. When the loop wakes up again, the stall is logged with its duration and
+    the captured stack, counted in the metrics and written to the trace file.
+
+    The heartbeat costs one timer per interval on the loop, the thread only reads a float.
+    """
+
+    def __init__(self, threshold: float = 0.25, interval: Optional[float] = None) -> None:
+        """
+        Initializes an instance of the StallWatchdog.
+
+        Args:
+            threshold (float): Seconds the loop must be blocked for to count as a stall.
+            interval (Optional[float]): Seconds between heartbeats and checks, half the threshold by default.
+        """
+        self.threshold = threshold
+        self.interval = interval if interval is not None else threshold / 2
+        self.stalls = 0
+        self._beat = time.monotonic()
+        # The stack captured during the current stall, handed from the watchdog thread to the loop
+        self._stack: Optional[str] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Starts the heartbeat on the running loop and the watchdog thread.
+        """
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat(), name="owobot-stall-watchdog")
+        self._thread = threading.Thread(target=self._watch, name="owobot-stall-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = time.monotonic() - self._beat - self.interval
+            if lag >= self.threshold:
+                self._report(lag)
+
+    def _watch(self) -> None:
+        captured_beat = None
+        while not self._stopped.wait(self.interval):
+            beat = self._beat
+            if beat != captured_beat and time.monotonic() - beat - self.interval >= self.threshold:
+                # Captured once per stall, while the loop is still stuck in the blocking call
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._stack = "".join(traceback.format_stack(frame))
+                captured_beat = beat
+
+    def _report(self, lag: float) -> None:
+        stack, self._stack = self._stack, None
+        self.stalls += 1
+        EVENT_LOOP_STALLS.inc()
+        logging.warning(f"Event loop stalled for {lag * 1000:.0f}ms"
+                        + (f", blocked in:\n{stack}" if stack else ", no stack captured"))
+        tracer.record("event_loop.stall", lag, stack=stack)
+
+    async def close(self) -> None:
+        """
+        Stops the heartbeat and the watchdog thread.
+        """
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
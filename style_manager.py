@@ -1,15 +1,34 @@
-from json import load
-import os
+from typing import Any, Optional
 import logging
 import discord
-
-
-def load_style(style: str) -> dict:
+from profile_cache import profiles
+from style_registry import registry
+from tracing import tracer
+
+# The placeholders every style is rendered with below, "name" is the author name filled in after rendering
+registry.provide({
+    "points_given.json": {"name", "points"},
+    "points_given_bulk.json": {"name", "count", "total"},
+    "point_view.json": {"name", "points", "rank", "rank_note"},
+    "leaderboard.json": {"name", "period"},
+    "professions.json": {"name", "service_name", "service_description", "service_requirements"},
+    "profession_search.json": {"name", "query", "page", "result_rank", "result_name", "result_snippet",
+                               "result_link"},
+    "points_log.json": {"name", "points", "giver", "taker"},
+    "points_log_bulk.json": {"name", "giver", "count", "total", "recipients"},
+})
+
+
+def load_style(style: str, style_dir: Optional[str] = None, **values: Any) -> dict:
     """
-    Load a style from a JSON file.
+    Load a style from the precompiled template registry.
+
+    The style file is parsed once and kept in memory, every call returns a fresh dict that is safe to modify.
 
     Args:
         style (str): The name of the style file.
+        style_dir (Optional[str]): A guild's style subdirectory, styles it does not override use the base file.
+        **values: Values for the style's placeholders, placeholders without a value are left untouched.
 
     Returns:
         dict: The style information loaded from the JSON file.
@@ -18,13 +37,11 @@ def load_style(style: str) -> dict:
         FileNotFoundError: If the specified style file is not found.
         Exception: If an error occurs while loading the style file.
     """
-    style_path = f"./styles/{style}"
     try:
-        with open(style_path, encoding="utf8") as json_data:
-            style_dict = load(json_data)
-            return style_dict
+        with tracer.span(f"render {style}", style_dir=style_dir):
+            return registry.render(style, style_dir, **values)
     except FileNotFoundError:
-        logging.error(f"Style file not found: {style_path}")
+        logging.error(f"Style file not found: {registry.directory}/{style}")
         raise
     except Exception as e:
         logging.error(f"Error loading style {style}: {e}")
@@ -41,26 +58,43 @@ async def send_error_embed(interaction: discord.Interaction, error_message: str)
     """
     logging.error(error_message)
     error_embed = discord.Embed(title="Error", description=error_message, color=discord.Color.red())
-    await interaction.response.send_message(embed=error_embed, ephemeral=True)
+    if interaction.response.is_done():
+        await interaction.followup.send(embed=error_embed, ephemeral=True)
+    else:
+        await interaction.response.send_message(embed=error_embed, ephemeral=True)
+
+
+def with_author(embed: discord.Embed, author: discord.User) -> discord.Embed:
+    """
+    Copy an embed rendered for one user and show another user as its author, so a rendered body can be shared.
+
+    Args:
+        embed (discord.Embed): The rendered embed, left unchanged.
+        author (discord.User): The user to show as the author.
+
+    Returns:
+        discord.Embed: The copy.
+    """
+    name, icon_url = profiles.get(author)
+    return embed.copy().set_author(name=name, icon_url=icon_url)
 
 
-def create_give_embed(points_given: int, author: discord.User) -> discord.Embed:
+def create_give_embed(points_given: int, author: discord.User, style_dir: Optional[str] = None) -> discord.Embed:
     """
         Create an embed for the points given.
 
         Args:
             points_given (int): The number of points given.
             author (discord.User): The author of the points.
+            style_dir (Optional[str]): The guild's style subdirectory.
 
         Returns:
             discord.Embed: The created embed.
         """
     try:
-        embed_dict = load_style("points_given.json")
+        embed_dict = load_style("points_given.json", style_dir, points=points_given)
 
-        embed_dict['description'] = embed_dict['description'].format(points=points_given)
-        embed_dict["author"]["name"] = author.display_name
-        embed_dict["author"]["icon_url"] = author.avatar.url
+        embed_dict["author"]["name"], embed_dict["author"]["icon_url"] = profiles.get(author)
 
         return discord.Embed().from_dict(embed_dict)
 
@@ -68,47 +102,81 @@ def create_give_embed(points_given: int, author: discord.User) -> discord.Embed:
         logging.error(f"Error in create_give_embed: {ex}")
 
 
-def create_view_embed(points: int, author: discord.User) -> discord.Embed:
+def create_bulk_give_embed(grants: list, author: discord.User, style_dir: Optional[str] = None) -> discord.Embed:
+    """
+        Create an embed for points given to many members at once.
+
+        Args:
+            grants (list): The grants as (userid, name, points) tuples.
+            author (discord.User): The author of the points.
+            style_dir (Optional[str]): The guild's style subdirectory.
+
+        Returns:
+            discord.Embed: The created embed.
+        """
+    try:
+        embed_dict = load_style("points_given_bulk.json", style_dir, count=len(grants),
+                                total=sum(points for _, _, points in grants))
+
+        embed_dict["author"]["name"], embed_dict["author"]["icon_url"] = profiles.get(author)
+
+        return discord.Embed().from_dict(embed_dict)
+
+    except Exception as ex:
+        logging.error(f"Error in create_bulk_give_embed: {ex}")
+
+
+def create_view_embed(points: int, author: discord.User, rank: int, gap: Optional[int],
+                      style_dir: Optional[str] = None) -> discord.Embed:
     """
         Create an embed for viewing points.
 
         Args:
             points (int): The number of points to display.
             author (discord.User): The author of the points.
+            rank (int): The author's position on the leaderboard.
+            gap (Optional[int]): Points separating the author from the next place, None when ranked first.
+            style_dir (Optional[str]): The guild's style subdirectory.
 
         Returns:
             discord.Embed: The created embed.
         """
     try:
-        embed_dict = load_style("point_view.json")
-        embed_dict["description"] = embed_dict["description"].format(points=points)
-        embed_dict["author"]["name"] = author.display_name
-        embed_dict["author"]["icon_url"] = author.avatar.url
+        rank_note = "top of the board!" if gap is None else f"{gap} behind #{rank - 1}"
+        embed_dict = load_style("point_view.json", style_dir, points=points, rank=rank, rank_note=rank_note)
+        embed_dict["author"]["name"], embed_dict["author"]["icon_url"] = profiles.get(author)
         return discord.Embed().from_dict(embed_dict)
 
     except Exception as ex:
         logging.error(f"Error in create_view_embed: {ex}")
 
 
-def create_leaderboard_embed(leaderboard_data: list, author: discord.User) -> discord.Embed:
+def create_leaderboard_embed(leaderboard_data: list, author: discord.User, start_rank: int = 1,
+                             style_dir: Optional[str] = None, period: str = "All time") -> discord.Embed:
     """
     Create an embed for the cute leaderboard.
 
     Args:
         leaderboard_data (list): The list of tuples containing name and points.
         author (discord.User): The author of the leaderboard.
+        start_rank (int): The rank of the first entry, used when showing later pages.
+        style_dir (Optional[str]): The guild's style subdirectory.
+        period (str): The name of the period the points were collected in.
 
     Returns:
         discord.Embed: The created embed.
     """
     try:
-        embed_dict = load_style("leaderboard.json")
-        embed_dict["author"]["name"] = author.display_name
-        embed_dict["author"]["icon_url"] = author.avatar.url
+        embed_dict = load_style("leaderboard.json", style_dir, period=period)
+        embed_dict["author"]["name"], embed_dict["author"]["icon_url"] = profiles.get(author)
 
-        for i, (name, points) in enumerate(leaderboard_data, start=1):
-            embed_dict["fields"][1]["value"] += f"{name}\nㅤㅤㅤ" if i < len(leaderboard_data) else f"{name}"
-            embed_dict["fields"][2]["value"] += f"{points}\nㅤㅤㅤㅤ" if i < len(leaderboard_data) else f"{points}"
+        # Each field value in the style is the padding that prefixes every row of its column
+        rank_field, name_field, points_field = embed_dict["fields"][:3]
+        rank_pad, name_pad, points_pad = rank_field["value"], name_field["value"], points_field["value"]
+        rank_field["value"] = rank_pad + f"\n{rank_pad}".join(
+            f"#{rank}" for rank in range(start_rank, start_rank + len(leaderboard_data)))
+        name_field["value"] = name_pad + f"\n{name_pad}".join(str(name) for name, _ in leaderboard_data)
+        points_field["value"] = points_pad + f"\n{points_pad}".join(str(points) for _, points in leaderboard_data)
 
         return discord.Embed().from_dict(embed_dict)
 
@@ -117,7 +185,7 @@ def create_leaderboard_embed(leaderboard_data: list, author: discord.User) -> di
 
 
 def create_profession_embed(name: str, service_description: str, service_requirements: str,
-                            author: discord.User) -> discord.Embed:
+                            author: discord.User, style_dir: Optional[str] = None) -> discord.Embed:
     """
     Create an embed for the profession message.
 
@@ -126,37 +194,111 @@ def create_profession_embed(name: str, service_description: str, service_require
         service_description (str): The first row of the service description.
         service_requirements (str): The service requirements.
         author (discord.User): The author of the profession message.
+        style_dir (Optional[str]): The guild's style subdirectory.
 
     Returns:
         discord.Embed: The created embed.
     """
     try:
-        embed_dict = load_style("professions.json")
-        service_requirements = service_requirements.replace(",", "\n")
-        embed_dict["author"]["name"] = author.display_name
-        embed_dict["author"]["icon_url"] = author.avatar.url
-        embed_dict["description"] = embed_dict["description"].format(service_name=name)
-        embed_dict["fields"][0]["value"] = embed_dict["fields"][0]["value"].format(
-            service_description=service_description)
-        embed_dict["fields"][1]["value"] = embed_dict["fields"][1]["value"].format(
-            service_requirements=service_requirements)
+        embed_dict = load_style("professions.json", style_dir,
+                                service_name=name,
+                                service_description=service_description,
+                                service_requirements=service_requirements.replace(",", "\n"))
+        embed_dict["author"]["name"], embed_dict["author"]["icon_url"] = profiles.get(author)
 
         return discord.Embed().from_dict(embed_dict)
     except Exception as ex:
         logging.error(f"Error in create_log_embed: {ex}")
 
 
-def create_log_embed(points_given: int, initiator: discord.User, target: discord.User) -> discord.Embed:
+def create_profession_search_embed(query: str, results: list, author: discord.User, guild_id: Optional[int],
+                                   page: int = 1, start_rank: int = 1,
+                                   style_dir: Optional[str] = None) -> discord.Embed:
+    """
+    Create an embed listing profession search results.
+
+    Args:
+        query (str): The search text.
+        results (list): The results as (message_id, channel_id, owner_id, name, snippet) tuples.
+        author (discord.User): The user who searched.
+        guild_id (Optional[int]): The guild the posts were made in, None for direct messages.
+        page (int): The page number shown in the footer.
+        start_rank (int): The position of the first result, used when showing later pages.
+        style_dir (Optional[str]): The guild's style subdirectory.
+
+    Returns:
+        discord.Embed: The created embed.
+    """
+    try:
+        embed_dict = load_style("profession_search.json", style_dir, query=query, page=page)
+        embed_dict["author"]["name"], embed_dict["author"]["icon_url"] = profiles.get(author)
+
+        # The style's first field is rendered once per result, the second one is shown when nothing matched
+        if not results:
+            embed_dict["fields"] = embed_dict["fields"][1:2]
+        else:
+            guild = guild_id or "@me"
+            result_field = registry.get("profession_search.json", style_dir).part("fields", 0)
+            embed_dict["fields"] = [
+                result_field.render(result_rank=rank, result_name=name, result_snippet=snippet,
+                                    result_link=f"https://discord.com/channels/{guild}/{channel_id}/{message_id}")
+                for rank, (message_id, channel_id, _, name, snippet) in enumerate(results, start_rank)
+            ]
+
+        return discord.Embed().from_dict(embed_dict)
+
+    except Exception as ex:
+        logging.error(f"Error in create_profession_search_embed: {ex}")
+
+
+def create_log_embed(points_given: int, initiator: discord.User, target: discord.User,
+                     style_dir: Optional[str] = None) -> discord.Embed:
     try:
-        embed_dict = load_style("points_log.json")
+        embed_dict = load_style("points_log.json", style_dir,
+                                points=points_given,
+                                giver=profiles.get(initiator).name,
+                                taker=target.mention)
 
-        embed_dict['description'] = embed_dict['description'].format(points=points_given,
-                                                                     giver=initiator.display_name,
-                                                                     taker=target.mention)
-        embed_dict["author"]["name"] = initiator.display_name
-        embed_dict["author"]["icon_url"] = initiator.avatar.url
+        embed_dict["author"]["name"], embed_dict["author"]["icon_url"] = profiles.get(initiator)
 
         return discord.Embed().from_dict(embed_dict)
 
     except Exception as ex:
         logging.error(f"Error in create_log_embed: {ex}")
+
+
+def create_bulk_log_embed(grants: list, initiator: discord.User, style_dir: Optional[str] = None) -> discord.Embed:
+    """
+    Create a single log embed summarizing points given to many members at once.
+
+    Args:
+        grants (list): The grants as (userid, name, points) tuples.
+        initiator (discord.User): The user who gave the points.
+        style_dir (Optional[str]): The guild's style subdirectory.
+
+    Returns:
+        discord.Embed: The created embed.
+    """
+    try:
+        # Field values are limited to 1024 characters, list as many recipients as fit and count the rest
+        lines, length = [], 0
+        for index, (user_id, _, points) in enumerate(grants):
+            line = f"<@{user_id}> {points:+}"
+            rest = f"… and {len(grants) - index} more"
+            if length + len(line) + len(rest) + 2 > 1024:
+                lines.append(rest)
+                break
+            lines.append(line)
+            length += len(line) + 1
+        embed_dict = load_style("points_log_bulk.json", style_dir,
+                                giver=profiles.get(initiator).name,
+                                count=len(grants),
+                                total=sum(points for _, _, points in grants),
+                                recipients="\n".join(lines))
+
+        embed_dict["author"]["name"], embed_dict["author"]["icon_url"] = profiles.get(initiator)
+
+        return discord.Embed().from_dict(embed_dict)
+
+    except Exception as ex:
+        logging.error(f"Error in create_bulk_log_embed: {ex}")
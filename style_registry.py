@@ -0,0 +1,377 @@
+import asyncio
+import logging
+import os
+import time
+from json import load
+from string import Formatter
+from typing import Any, Callable, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+from metrics import STYLE_RENDER_SECONDS
+
+# A compiled node takes the placeholder values and returns a freshly built value.
+Renderer = Callable[[Dict[str, Any]], Any]
+
+STYLES_DIR = "./styles"
+
+# The format conversions a placeholder may use, e.g. "{name!r}"
+CONVERSIONS: Dict[str, Callable[[Any], str]] = {"r": repr, "s": str, "a": ascii}
+
+
+def _compile_string(text: str, placeholders: Set[str]) -> Any:
+    """
+    Compiles a template string into a renderer, or returns the string itself if it has no placeholders.
+
+    Placeholders without a value at render time are kept verbatim, so a template may contain fields like
+    "{name}" that the embed builder overwrites afterwards.
+
+    Args:
+        text (str): The template string.
+        placeholders (Set[str]): Collects the names of every placeholder found.
+
+    Returns:
+        Any: Either the unchanged string or a renderer producing the formatted string.
+
+    Raises:
+        ValueError: If the string contains malformed placeholder syntax or an unknown conversion.
+    """
+    parts = []
+    for literal, field, spec, conversion in Formatter().parse(text):
+        if field is None:
+            parts.append((literal, None, None))
+            continue
+        if not field.isidentifier():
+            raise ValueError(f"Unsupported placeholder {{{field}}} in {text!r}")
+        if conversion and conversion not in CONVERSIONS:
+            raise ValueError(f"Unknown conversion !{conversion} in {text!r}")
+        placeholders.add(field)
+        fallback = "{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}"
+        parts.append((literal, field, (CONVERSIONS.get(conversion), spec, fallback)))
+
+    if all(field is None for _, field, _ in parts):
+        return text
+
+    def render(values: Dict[str, Any]) -> str:
+        out = []
+        for literal, field, extra in parts:
+            out.append(literal)
+            if field is None:
+                continue
+            convert, spec, fallback = extra
+            if field in values:
+                value = convert(values[field]) if convert else values[field]
+                out.append(format(value, spec) if spec else str(value))
+            else:
+                out.append(fallback)
+        return "".join(out)
+
+    return render
+
+
+def _compile_node(node: Any, placeholders: Set[str]) -> Renderer:
+    """
+    Compiles a parsed JSON node into a renderer that rebuilds every container on each call.
+
+    Containers are always rebuilt so callers can freely mutate the result (discord.Embed keeps references to the
+    nested dicts and lists), while static strings and numbers are shared instead of copied.
+
+    Args:
+        node (Any): A parsed JSON value.
+        placeholders (Set[str]): Collects the names of every placeholder found.
+
+    Returns:
+        Renderer: The compiled renderer.
+    """
+    if isinstance(node, dict):
+        items = [(key, _compile_node(value, placeholders)) for key, value in node.items()]
+        return lambda values: {key: render(values) for key, render in items}
+    if isinstance(node, list):
+        items = [_compile_node(value, placeholders) for value in node]
+        return lambda values: [render(values) for render in items]
+    if isinstance(node, str):
+        compiled = _compile_string(node, placeholders)
+        if callable(compiled):
+            return compiled
+    return lambda values: node
+
+
+class StyleTemplate:
+    """
+    A style file parsed once and precompiled into a renderer.
+    """
+
+    def __init__(self, name: str, source: dict, mtime: float) -> None:
+        """
+        Initializes an instance of the StyleTemplate.
+
+        Args:
+            name (str): The name of the style file.
+            source (dict): The parsed JSON content of the style file.
+            mtime (float): Modification time of the file the template was loaded from.
+
+        Raises:
+            ValueError: If the style is not a JSON object or has malformed placeholders.
+        """
+        if not isinstance(source, dict):
+            raise ValueError(f"Style {name} must be a JSON object")
+        self.name = name
+        self.mtime = mtime
+        self.placeholders: Set[str] = set()
+        self._render = _compile_node(source, self.placeholders)
+        self._source = source
+        # Nodes of the style compiled on their own, see part
+        self._parts: Dict[Tuple[Any, ...], "StyleTemplate"] = {}
+        self.renders = 0
+        self.render_seconds = 0.0
+
+    def render(self, **values: Any) -> dict:
+        """
+        Renders the template into a fresh dict, filling in the given placeholder values.
+
+        Returns:
+            dict: The rendered style, safe to mutate.
+        """
+        started = time.perf_counter()
+        rendered = self._render(values)
+        elapsed = time.perf_counter() - started
+        self.render_seconds += elapsed
+        self.renders += 1
+        STYLE_RENDER_SECONDS.observe(elapsed, self.name)
+        return rendered
+
+    def part(self, *path: Any) -> "StyleTemplate":
+        """
+        Returns one JSON object inside the style as a template of its own, compiled on first use. Rendering a part
+        repeatedly, e.g. one embed field per list entry, skips rebuilding the rest of the style.
+
+        Args:
+            *path: The keys and list indexes leading to the object, e.g. "fields", 0.
+
+        Returns:
+            StyleTemplate: The compiled part.
+
+        Raises:
+            KeyError: If a key on the path does not exist.
+            IndexError: If a list index on the path is out of range.
+            ValueError: If the node at the path is not a JSON object.
+        """
+        part = self._parts.get(path)
+        if part is None:
+            node = self._source
+            for key in path:
+                node = node[key]
+            part = StyleTemplate(f"{self.name}:{'.'.join(str(key) for key in path)}", node, self.mtime)
+            self._parts[path] = part
+        return part
+
+
+class StyleRegistry:
+    """
+    Keeps every style in the styles directory parsed and compiled in memory, reloading files that change on disk.
+    """
+
+    def __init__(self, directory: str = STYLES_DIR) -> None:
+        """
+        Initializes an instance of the StyleRegistry.
+
+        Args:
+            directory (str): The directory containing the style JSON files.
+        """
+        self.directory = directory
+        self._templates: Dict[str, StyleTemplate] = {}
+        # Guild style keys without an override file, mapped to the base style they fall back to
+        self._fallbacks: Dict[str, str] = {}
+        # Modification times of guild style directories when their fallbacks were looked up, None if missing
+        self._style_dir_mtimes: Dict[str, Optional[float]] = {}
+        # Base style names mapped to the placeholders their renderers supply, see provide
+        self._provided: Dict[str, FrozenSet[str]] = {}
+        self.reloads = 0
+        self.failed_reloads = 0
+
+    def provide(self, provided: Dict[str, Iterable[str]]) -> None:
+        """
+        Declares the placeholders each style's renderer supplies, including ones it fills in after rendering.
+
+        A reloaded style may use any of them, so an edit can add or drop placeholders. Styles without a declaration
+        may only keep or drop the placeholders they were first loaded with.
+
+        Args:
+            provided (Dict[str, Iterable[str]]): Base style names mapped to their placeholder names.
+        """
+        for style, placeholders in provided.items():
+            self._provided[style] = frozenset(placeholders)
+
+    def _read(self, style: str) -> Tuple[dict, float]:
+        """
+        Reads and parses a style file.
+
+        Args:
+            style (str): The name of the style file.
+
+        Returns:
+            Tuple[dict, float]: The parsed content and the file's modification time.
+        """
+        style_path = os.path.join(self.directory, style)
+        mtime = os.stat(style_path).st_mtime
+        with open(style_path, encoding="utf8") as json_data:
+            return load(json_data), mtime
+
+    def load(self, style: str) -> StyleTemplate:
+        """
+        Parses and compiles a style file, replacing any previously loaded version.
+
+        Args:
+            style (str): The name of the style file.
+
+        Returns:
+            StyleTemplate: The compiled template.
+        """
+        source, mtime = self._read(style)
+        template = StyleTemplate(style, source, mtime)
+        self._templates[style] = template
+        return template
+
+    def load_all(self) -> None:
+        """
+        Parses and compiles every JSON file in the styles directory.
+        """
+        for filename in sorted(os.listdir(self.directory)):
+            if filename.endswith(".json"):
+                self.load(filename)
+        logging.info(f"Loaded {len(self._templates)} style templates.")
+
+    def get(self, style: str, style_dir: Optional[str] = None) -> StyleTemplate:
+        """
+        Returns the compiled template for a style, loading it on first use.
+
+        Args:
+            style (str): The name of the style file.
+            style_dir (Optional[str]): A guild's style subdirectory, styles it does not override use the base file.
+
+        Returns:
+            StyleTemplate: The compiled template.
+        """
+        key = f"{style_dir}/{style}" if style_dir else style
+        template = self._templates.get(key)
+        if template is not None:
+            return template
+        if key in self._fallbacks:
+            return self.get(style)
+        if style_dir:
+            if style_dir not in self._style_dir_mtimes:
+                self._style_dir_mtimes[style_dir] = self._style_dir_mtime(style_dir)
+            if not os.path.isfile(os.path.join(self.directory, key)):
+                self._fallbacks[key] = style
+                return self.get(style)
+        return self.load(key)
+
+    def _style_dir_mtime(self, style_dir: str) -> Optional[float]:
+        """
+        Returns the modification time of a guild style directory, which changes when override files are added.
+
+        Args:
+            style_dir (str): The guild's style subdirectory.
+
+        Returns:
+            Optional[float]: The modification time, None if the directory does not exist.
+        """
+        try:
+            return os.stat(os.path.join(self.directory, style_dir)).st_mtime
+        except OSError:
+            return None
+
+    def render(self, style: str, style_dir: Optional[str] = None, **values: Any) -> dict:
+        """
+        Renders a style into a fresh dict.
+
+        Args:
+            style (str): The name of the style file.
+            style_dir (Optional[str]): A guild's style subdirectory, see get.
+            **values: Values for the style's placeholders.
+
+        Returns:
+            dict: The rendered style.
+        """
+        return self.get(style, style_dir).render(**values)
+
+    def reload_changed(self) -> None:
+        """
+        Reloads every loaded style whose file changed since it was compiled.
+
+        A changed file only replaces the current template if it parses, compiles and only uses placeholders its
+        renderer supplies, otherwise the error is logged and the previous version stays in use. Guild styles that fell
+        back to the base file are looked up again once their directory changed, so newly added override files are
+        picked up.
+
+        Templates and fallbacks are replaced one key at a time, so this may run on a worker thread while the event
+        loop renders.
+        """
+        for style_dir, seen in list(self._style_dir_mtimes.items()):
+            mtime = self._style_dir_mtime(style_dir)
+            if mtime == seen:
+                continue
+            self._style_dir_mtimes[style_dir] = mtime
+            prefix = f"{style_dir}/"
+            for key in [key for key in list(self._fallbacks) if key.startswith(prefix)]:
+                self._fallbacks.pop(key, None)
+
+        for style, current in list(self._templates.items()):
+            try:
+                source, mtime = self._read(style)
+                if mtime == current.mtime:
+                    continue
+                candidate = StyleTemplate(style, source, mtime)
+                # Guild overrides are rendered with the values of the base style they replace
+                supplied = self._provided.get(os.path.basename(style), current.placeholders)
+                unknown = candidate.placeholders - supplied
+                if unknown:
+                    raise ValueError(f"unknown placeholders {sorted(unknown)}, the style is rendered with "
+                                     f"{sorted(supplied)}")
+            except FileNotFoundError:
+                continue
+            except Exception as ex:
+                self.failed_reloads += 1
+                # Remember the mtime so a broken file is reported once instead of on every poll
+                try:
+                    current.mtime = os.stat(os.path.join(self.directory, style)).st_mtime
+                except OSError:
+                    pass
+                logging.error(f"Rejected reload of style {style}: {ex}")
+                continue
+
+            candidate.renders, candidate.render_seconds = current.renders, current.render_seconds
+            self._templates[style] = candidate
+            self.reloads += 1
+            logging.info(f"Reloaded style {style}.")
+
+    async def watch(self, interval: float = 2.0) -> None:
+        """
+        Polls the styles directory and hot-reloads changed files until cancelled. The file I/O and compiling run on a
+        worker thread, off the event loop.
+
+        Args:
+            interval (float): Seconds between checks.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload_changed)
+            except Exception as ex:
+                logging.error(f"Error in style reload: {ex}")
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Reports how often each style was rendered and how long rendering took.
+
+        Returns:
+            Dict[str, Dict[str, Optional[float]]]: Per style render count, total and average render time in seconds.
+        """
+        return {
+            style: {
+                "renders": template.renders,
+                "total_seconds": template.render_seconds,
+                "avg_seconds": template.render_seconds / template.renders if template.renders else None,
+            }
+            for style, template in self._templates.items()
+        }
+
+
+registry = StyleRegistry()
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_manager import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _single_process_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Keeps the tests independent of the environment they run in.
+    """
+    for name in ("DB_ENGINE", "CACHE_INVALIDATION", "GUILD_ID", "CUTE_ROLE_ID", "CUTE_CHANNEL"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.fixture
+def db_file(tmp_path) -> str:
+    """
+    The path of a database file that does not exist yet.
+    """
+    return str(tmp_path / "owodb.db")
+
+
+@asynccontextmanager
+async def open_db(db_file: str) -> AsyncIterator[DatabaseManager]:
+    """
+    Opens a migrated DatabaseManager and closes it again, for use inside a test's event loop.
+
+    Args:
+        db_file (str): The database file.
+    """
+    db = DatabaseManager(db_file)
+    db.setup_database()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+def run(coro):
+    """
+    Runs a test scenario on a fresh event loop.
+    """
+    return asyncio.run(coro)
@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import run
+from db_manager import DatabaseManager, ENGINE_ASYNC, ENGINE_LEGACY
+
+
+@pytest.mark.parametrize("engine", [ENGINE_ASYNC, ENGINE_LEGACY])
+def test_engines_store_the_same_points(db_file, engine):
+    async def scenario():
+        db = DatabaseManager(db_file, engine=engine)
+        db.setup_database()
+        try:
+            await db.give_points(1, SimpleNamespace(id=10, display_name="ten"), 5, durable=True)
+            await db.give_points(1, SimpleNamespace(id=10, display_name="ten"), -2, durable=True)
+            await db.give_points(1, SimpleNamespace(id=11, display_name="eleven"), 4, durable=True)
+            assert await db.get_leaderboard_data(1) == [("eleven", 4), ("ten", 3)]
+        finally:
+            await db.close()
+
+    run(scenario())
+
+
+def test_writes_share_one_worker_thread_and_connection(db_file):
+    async def scenario():
+        db = DatabaseManager(db_file, engine=ENGINE_ASYNC)
+        db.setup_database()
+        try:
+            seen = [await db.run(lambda conn: (threading.get_ident(), conn)) for _ in range(3)]
+            assert len(set(seen)) == 1
+            assert seen[0][0] != threading.get_ident()
+            assert await db.read(lambda conn: conn.execute("PRAGMA journal_mode").fetchone()[0]) == "wal"
+        finally:
+            await db.close()
+
+    run(scenario())
+
+
+def test_a_failed_unit_of_work_is_rolled_back(db_file):
+    async def scenario():
+        db = DatabaseManager(db_file, engine=ENGINE_ASYNC)
+        db.setup_database()
+        try:
+            def _fail(conn: sqlite3.Connection) -> None:
+                conn.execute("INSERT INTO botState (key, value) VALUES ('half', 'done')")
+                raise ValueError("interrupted")
+
+            with pytest.raises(ValueError):
+                await db.run(_fail)
+            assert await db.get_state("half") is None
+            await db.set_state("whole", "done")
+            assert await db.read(lambda conn: conn.execute("SELECT value FROM botState").fetchall()) == [("done",)]
+        finally:
+            await db.close()
+
+    run(scenario())
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from conftest import run
+from db_manager import DatabaseManager
+from invalidation import SQLiteInvalidationBus
+
+
+async def wait_for_poll(bus: SQLiteInvalidationBus) -> None:
+    await asyncio.sleep(bus.interval * 4)
+
+
+def test_peer_point_changes_refresh_rows_in_place(db_file):
+    async def scenario():
+        first = DatabaseManager(db_file, bus=SQLiteInvalidationBus(interval=0.02))
+        first.setup_database()
+        second = DatabaseManager(db_file, bus=SQLiteInvalidationBus(interval=0.02))
+        first.bus.start(first)
+        second.bus.start(second)
+        try:
+            await first.give_points_bulk(1, [(10, "ten", 5), (11, "eleven", 3)])
+            ranks = await second.get_rank_index(1)
+            assert ranks.top() == [("ten", 5), ("eleven", 3)]
+
+            await first.give_points(1, SimpleNamespace(id=11, display_name="Eleven"), 7, durable=True)
+            await first.give_points_bulk(1, [(12, "twelve", 20)])
+            await second.give_points(1, SimpleNamespace(id=10, display_name="ten"), 1, durable=True)
+            await wait_for_poll(second.bus)
+
+            assert second._rank_cache.get(1) is ranks
+            assert ranks.top() == [("twelve", 20), ("Eleven", 10), ("ten", 6)]
+            assert (await first.get_rank_index(1)).top() == ranks.top()
+        finally:
+            await first.close()
+            await second.close()
+
+    run(scenario())
+
+
+def test_peer_batch_jobs_drop_the_rank_index(db_file):
+    async def scenario():
+        first = DatabaseManager(db_file, bus=SQLiteInvalidationBus(interval=0.02))
+        first.setup_database()
+        second = DatabaseManager(db_file, bus=SQLiteInvalidationBus(interval=0.02))
+        first.bus.start(first)
+        second.bus.start(second)
+        try:
+            await first.give_points_bulk(1, [(10, "ten", 8), (11, "eleven", 4)])
+            await second.get_rank_index(1)
+
+            await first.decay_points(0.5)
+            await wait_for_poll(second.bus)
+
+            assert 1 not in second._rank_cache
+            assert (await second.get_rank_index(1)).top() == [("ten", 4), ("eleven", 2)]
+        finally:
+            await first.close()
+            await second.close()
+
+    run(scenario())
@@ -0,0 +1,76 @@
+import sqlite3
+from types import SimpleNamespace
+
+from conftest import open_db, run
+from db_manager import MIGRATIONS, run_migrations
+
+# The schema databases had before migrations existed
+BASELINE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cutePoints (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        points INTEGER,
+        userid INTEGER NOT NULL UNIQUE
+    )
+"""
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def create_baseline(db_file: str) -> None:
+    conn = sqlite3.connect(db_file)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO cutePoints (name, points, userid) VALUES (?, ?, ?)",
+                     [("alice", 5, 1), ("bob", 3, 2), ("carol", 0, 3)])
+    conn.commit()
+    conn.close()
+
+
+def test_versions_are_consecutive():
+    assert [version for version, _ in MIGRATIONS] == list(range(1, LATEST_VERSION + 1))
+
+
+def test_baseline_rows_move_to_the_legacy_guild(db_file):
+    create_baseline(db_file)
+    conn = sqlite3.connect(db_file)
+
+    assert run_migrations(conn, legacy_guild_id=42) == LATEST_VERSION
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == LATEST_VERSION
+    assert conn.execute("SELECT guild_id, userid, name, points FROM cutePoints ORDER BY userid").fetchall() == [
+        (42, 1, "alice", 5), (42, 2, "bob", 3), (42, 3, "carol", 0)]
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"guildConfig", "professionPosts", "professionSearch", "pointLedger", "pointRollups", "botState",
+            "cacheInvalidations", "seasons", "seasonPoints"} <= tables
+    conn.close()
+
+
+def test_migrating_again_changes_nothing(db_file):
+    create_baseline(db_file)
+    conn = sqlite3.connect(db_file)
+    run_migrations(conn, legacy_guild_id=42)
+    schema = conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall()
+
+    assert run_migrations(conn, legacy_guild_id=7) == LATEST_VERSION
+    assert conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall() == schema
+    assert {row[0] for row in conn.execute("SELECT guild_id FROM cutePoints")} == {42}
+    conn.close()
+
+
+def test_setup_database_seeds_the_legacy_guild(db_file, monkeypatch):
+    create_baseline(db_file)
+    monkeypatch.setenv("GUILD_ID", "42")
+    monkeypatch.setenv("CUTE_ROLE_ID", "100")
+    monkeypatch.setenv("CUTE_CHANNEL", "200")
+
+    async def scenario():
+        async with open_db(db_file) as db:
+            await db.load_guild_configs()
+            config = db.guild_config(42)
+            assert (config.cute_role_id, config.log_channel_id) == (100, 200)
+            assert await db.get_leaderboard_data(42) == [("alice", 5), ("bob", 3), ("carol", 0)]
+
+            await db.give_points(42, SimpleNamespace(id=2, display_name="bob"), 4, durable=True)
+            await db.give_points(42, SimpleNamespace(id=4, display_name="dave"), 1, durable=True)
+            assert await db.get_leaderboard_data(42) == [("bob", 7), ("alice", 5), ("dave", 1), ("carol", 0)]
+
+    run(scenario())
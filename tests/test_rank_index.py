@@ -0,0 +1,105 @@
+import random
+
+from rank_index import IndexableSkipList, RankIndex
+
+
+def expected_order(users):
+    """
+    The leaderboard order: highest points first, ties broken by the lower user ID.
+    """
+    return [(user_id, name, points) for user_id, (name, points) in
+            sorted(users.items(), key=lambda item: (-item[1][1], item[0]))]
+
+
+def assert_matches(index, users):
+    order = expected_order(users)
+    assert len(index) == len(order)
+    assert index.page(0, len(order) + 5) == order
+    for rank, (user_id, _, points) in enumerate(order, start=1):
+        assert index.rank(user_id) == rank
+        assert index.points(user_id) == points
+
+
+def test_ties_are_ordered_by_user_id():
+    index = RankIndex()
+    index.load([(30, "c", 5), (10, "a", 5), (20, "b", 7), (40, "d", None)])
+
+    assert index.page(0, 10) == [(20, "b", 7), (10, "a", 5), (30, "c", 5), (40, "d", 0)]
+    assert index.top(2) == [("b", 7), ("a", 5)]
+    assert index.rank(30) == 3
+    assert index.rank(99) is None
+
+
+def test_updates_move_users():
+    index = RankIndex()
+    index.load([(1, "a", 10), (2, "b", 5), (3, "c", 1)])
+
+    assert index.add(3, "c", 20) == 21
+    index.set(2, "b", 10)
+    index.add(4, "d", 2)
+    assert index.page(0, 10) == [(3, "c", 21), (1, "a", 10), (2, "b", 10), (4, "d", 2)]
+    assert index.around(2, radius=1) == [(2, 1, "a", 10), (3, 2, "b", 10), (4, 4, "d", 2)]
+    assert index.around(3, radius=1) == [(1, 3, "c", 21), (2, 1, "a", 10)]
+
+
+def test_count_before_a_cursor():
+    index = RankIndex()
+    index.load([(1, "a", 10), (2, "b", 5), (3, "c", 5)])
+
+    assert index.count_before((5, 2)) == 1
+    assert index.count_before((5, 2), inclusive=True) == 2
+    assert index.count_before((7, 0)) == 1
+    assert index.count_before((0, 0)) == 3
+
+
+def test_renames_update_the_name_index():
+    index = RankIndex()
+    index.load([(1, "alice", 10), (2, "bob", 5)])
+
+    index.rename(1, "zoe")
+    index.rename(3, "nobody")
+    assert index.page(0, 10) == [(1, "zoe", 10), (2, "bob", 5)]
+    assert [user_id for user_id, _ in index.names.complete("zo")] == [1]
+    assert index.names.complete("ali") == []
+    assert 3 not in index
+
+
+def test_random_changes_match_a_sorted_list():
+    rng = random.Random(7)
+    users = {user_id: (f"user{user_id}", rng.randint(-50, 50)) for user_id in range(200)}
+    index = RankIndex()
+    index.load((user_id, name, points) for user_id, (name, points) in users.items())
+    assert_matches(index, users)
+
+    for _ in range(2000):
+        user_id = rng.randint(0, 250)
+        delta = rng.randint(-20, 20)
+        name = users.get(user_id, (f"user{user_id}", 0))[0]
+        users[user_id] = (name, users.get(user_id, (name, 0))[1] + delta)
+        index.add(user_id, name, delta)
+    assert_matches(index, users)
+
+    order = expected_order(users)
+    for start in (0, 1, 17, len(order) - 3):
+        assert index.page(start, 10) == order[start:start + 10]
+
+
+def test_skip_list_positions():
+    rng = random.Random(3)
+    keys = sorted({(rng.randint(-100, 100), rng.randint(0, 1000)) for _ in range(300)})
+    skip_list = IndexableSkipList.from_sorted(keys)
+
+    removed = keys[::3]
+    for key in removed:
+        skip_list.remove(key)
+    kept = [key for key in keys if key not in set(removed)]
+    for key in [(1000, 0), (-1000, 0), (0, 5000)]:
+        skip_list.insert(key)
+        kept.append(key)
+    kept.sort()
+
+    assert len(skip_list) == len(kept)
+    assert skip_list.slice(0, len(kept)) == kept
+    for position, key in enumerate(kept):
+        assert skip_list[position] == key
+        assert skip_list.position(key) == position
@@ -0,0 +1,188 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from conftest import open_db, run
+from scheduler import Scheduler
+
+HOUR = 3600
+
+
+def fail_chunk_once(db, name: str, after: int) -> None:
+    """
+    Makes the unit of work called name fail once, after it ran the given number of times, like a crash between two
+    chunks of a batch job.
+    """
+    original = db.run
+    calls = 0
+
+    async def _run(func):
+        nonlocal calls
+        if func.__name__ == name:
+            calls += 1
+            if calls == after + 1:
+                raise sqlite3.OperationalError("disk I/O error")
+        return await original(func)
+
+    db.run = _run
+
+
+async def noop(due: int) -> None:
+    return None
+
+
+async def seed(db, users: int = 5, points: int = 100) -> None:
+    await db.give_points_bulk(1, [(user_id, f"user{user_id}", points) for user_id in range(1, users + 1)])
+
+
+async def balances(db):
+    return await db.read(lambda conn: conn.execute("SELECT userid, points FROM cutePoints ORDER BY userid").fetchall())
+
+
+def test_a_new_job_waits_for_its_next_due_time(db_file):
+    async def scenario():
+        async with open_db(db_file) as db:
+            scheduler = Scheduler(db)
+            scheduler.add("job", HOUR, noop)
+            job = scheduler.jobs["job"]
+
+            assert await scheduler._claim(job) is None
+            due = int(await db.get_state("job_due:job"))
+            assert due == job.next_due(time.time())
+            assert due % HOUR == 0
+            assert await scheduler._claim(job) is None
+
+    run(scenario())
+
+
+def test_only_one_process_claims_a_due_job(db_file):
+    async def scenario():
+        async with open_db(db_file) as db:
+            first, second = Scheduler(db), Scheduler(db)
+            for scheduler in (first, second):
+                scheduler.add("job", HOUR, noop)
+            due = int(time.time()) // HOUR * HOUR - HOUR
+            await db.set_state("job_due:job", str(due))
+
+            assert await first._claim(first.jobs["job"]) == due
+            assert float(await db.get_state("job_lease:job")) > time.time()
+            assert await second._claim(second.jobs["job"]) is None
+
+            # An expired lease, e.g. of a process that died, is taken over
+            await db.set_state("job_lease:job", str(time.time() - 1))
+            assert await second._claim(second.jobs["job"]) == due
+
+    run(scenario())
+
+
+def test_a_failed_run_is_retried_for_the_same_due_time(db_file):
+    async def scenario():
+        async with open_db(db_file) as db:
+            runs = []
+
+            async def job_run(due):
+                runs.append(due)
+                if len(runs) == 1:
+                    raise sqlite3.OperationalError("database is locked")
+                return "done"
+
+            scheduler = Scheduler(db)
+            scheduler.add("job", HOUR, job_run)
+            job = scheduler.jobs["job"]
+            due = int(time.time()) // HOUR * HOUR - 2 * HOUR
+            await db.set_state("job_due:job", str(due))
+
+            claimed = await scheduler._claim(job)
+            with pytest.raises(sqlite3.OperationalError):
+                await scheduler._run_claimed(job, claimed)
+            assert await db.get_state("job_due:job") == str(due)
+            assert await db.get_state("job_lease:job") == "0"
+
+            claimed = await scheduler._claim(job)
+            assert claimed == due
+            await scheduler._run_claimed(job, claimed)
+            assert runs == [due, due]
+            assert job.last_result == "done"
+            # Missed due times are not caught up one by one, the job is next due after now
+            assert int(await db.get_state("job_due:job")) == job.next_due(time.time())
+            assert await scheduler._claim(job) is None
+
+    run(scenario())
+
+
+def test_an_interrupted_decay_resumes_without_decaying_twice(db_file):
+    async def scenario():
+        async with open_db(db_file) as db:
+            await seed(db)
+            due = 1_000 * HOUR
+            scheduler = Scheduler(db)
+            scheduler.add("decay", HOUR, lambda due: db.decay_points(0.5, due, chunk_size=2))
+            await db.set_state("job_due:decay", str(due))
+
+            fail_chunk_once(db, "_decay", after=1)
+            job = scheduler.jobs["decay"]
+            with pytest.raises(sqlite3.OperationalError):
+                await scheduler._run_claimed(job, await scheduler._claim(job))
+            assert await balances(db) == [(1, 50), (2, 50), (3, 100), (4, 100), (5, 100)]
+
+            await scheduler._run_claimed(job, await scheduler._claim(job))
+            assert await balances(db) == [(1, 50), (2, 50), (3, 50), (4, 50), (5, 50)]
+
+            # Running again for the same due time, e.g. from a second process, changes nothing
+            report = await db.decay_points(0.5, due, chunk_size=2)
+            assert report.rows == 0
+            assert await balances(db) == [(1, 50), (2, 50), (3, 50), (4, 50), (5, 50)]
+
+    run(scenario())
+
+
+def test_an_interrupted_season_reset_is_finished_on_startup(db_file):
+    async def scenario():
+        async with open_db(db_file) as db:
+            await seed(db)
+            ended_at = 1_000 * HOUR
+            fail_chunk_once(db, "_archive", after=1)
+            with pytest.raises(sqlite3.OperationalError):
+                await db.reset_season(ended_at, chunk_size=2)
+            assert len(await balances(db)) == 3
+
+        async with open_db(db_file) as db:
+            await db.finish_point_jobs()
+            assert await balances(db) == []
+            seasons = await db.read(lambda conn: conn.execute(
+                "SELECT season, ended_at, users, completed_at IS NOT NULL FROM seasons").fetchall())
+            assert seasons == [(1, ended_at, 5, 1)]
+            archived = await db.read(lambda conn: conn.execute(
+                "SELECT userid, points FROM seasonPoints WHERE season = 1 ORDER BY userid").fetchall())
+            assert archived == [(user_id, 100) for user_id in range(1, 6)]
+
+            # The scheduled retry of the same reset finds the season already ended
+            await db.give_points_bulk(1, [(9, "user9", 10)])
+            report = await db.reset_season(ended_at)
+            assert report.rows == 0
+            assert await balances(db) == [(9, 10)]
+
+    run(scenario())
+
+
+def test_jobs_added_before_the_loop_runs_one_at_a_time(db_file):
+    # Like bot.py, which adds its jobs at import time
+    scheduler = Scheduler(None)
+    active = []
+
+    async def job_run(due):
+        active.append(due)
+        assert len(active) == 1
+        await asyncio.sleep(0.01)
+        active.remove(due)
+        return due
+
+    scheduler.add("job", HOUR, job_run)
+
+    async def scenario():
+        assert await asyncio.gather(scheduler.run_job("job", 1), scheduler.run_job("job", 2)) == [1, 2]
+
+    run(scenario())
+    assert scheduler.jobs["job"].last_result == 2
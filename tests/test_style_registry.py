@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+
+from style_registry import StyleRegistry
+
+
+def write_style(directory, name: str, source: dict) -> None:
+    (directory / name).write_text(json.dumps(source), encoding="utf8")
+
+
+def test_a_part_renders_only_its_own_node(tmp_path):
+    write_style(tmp_path, "search.json", {
+        "description": "Results for {query}",
+        "fields": [{"name": "{rank}. {title}", "value": "x"}, {"name": "Nothing found"}],
+    })
+    template = StyleRegistry(str(tmp_path)).get("search.json")
+
+    field = template.part("fields", 0)
+    assert field.placeholders == {"rank", "title"}
+    assert field.render(rank=1, title="a") == {"name": "1. a", "value": "x"}
+    assert field.render(rank=2, title="b") == {"name": "2. b", "value": "x"}
+    assert template.part("fields", 0) is field
+    assert template.renders == 0
+
+
+def edit_style(directory, name: str, source: dict, mtime: float) -> None:
+    write_style(directory, name, source)
+    os.utime(directory / name, (mtime, mtime))
+
+
+def test_a_reload_may_use_any_supplied_placeholder(tmp_path):
+    write_style(tmp_path, "given.json", {"description": "You got {points} points"})
+    registry = StyleRegistry(str(tmp_path))
+    registry.provide({"given.json": {"name", "points", "total"}})
+    registry.get("given.json")
+
+    edit_style(tmp_path, "given.json", {"description": "{points} of {total}", "author": {"name": "{name}"}}, 1)
+    registry.reload_changed()
+    assert registry.render("given.json", points=2, total=5)["description"] == "2 of 5"
+
+    edit_style(tmp_path, "given.json", {"description": "Points!"}, 2)
+    registry.reload_changed()
+    assert registry.render("given.json", points=2)["description"] == "Points!"
+
+    edit_style(tmp_path, "given.json", {"description": "{pionts}"}, 3)
+    registry.reload_changed()
+    assert registry.render("given.json", points=2)["description"] == "Points!"
+    assert (registry.reloads, registry.failed_reloads) == (2, 1)
+
+
+def test_undeclared_styles_keep_to_their_first_placeholders(tmp_path):
+    (tmp_path / "guild").mkdir()
+    write_style(tmp_path, "guild/other.json", {"title": "{a} {b}"})
+    registry = StyleRegistry(str(tmp_path))
+    registry.get("other.json", "guild")
+
+    edit_style(tmp_path, "guild/other.json", {"title": "{a}"}, 1)
+    registry.reload_changed()
+    edit_style(tmp_path, "guild/other.json", {"title": "{a} {c}"}, 2)
+    registry.reload_changed()
+    assert registry.render("other.json", "guild", a=1, c=2) == {"title": "1"}
+    assert (registry.reloads, registry.failed_reloads) == (1, 1)
+
+
+def test_conversions_are_applied_before_the_format_spec(tmp_path):
+    write_style(tmp_path, "quote.json", {"title": "{query!r:>8}|{query!s}|{query!a}|{missing!r}"})
+    registry = StyleRegistry(str(tmp_path))
+    assert registry.render("quote.json", query="né")["title"] == "    'né'|né|'n\\xe9'|{missing!r}"
+
+    write_style(tmp_path, "broken.json", {"title": "{query!x}"})
+    with pytest.raises(ValueError):
+        registry.get("broken.json")
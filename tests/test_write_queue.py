@@ -0,0 +1,130 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from conftest import run
+from write_queue import MAX_FLUSH_RETRIES, PointWriteQueue
+
+
+class FlakyFlush:
+    """
+    A flush callback that fails with the queued errors before it starts recording batches.
+    """
+
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.batches = []
+
+    async def __call__(self, rows, ledger) -> None:
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append((sorted(rows), [entry[:4] for entry in ledger]))
+
+
+def test_changes_for_the_same_user_are_merged():
+    flush = FlakyFlush()
+
+    async def scenario():
+        queue = PointWriteQueue(flush, flush_interval=60)
+        await queue.add(1, 10, "ten", 2)
+        await queue.add(1, 10, "Ten", 3)
+        await queue.add(1, 11, "eleven", 1)
+        assert queue.pending_delta(1, 10) == 5
+        await queue.flush()
+        assert queue.pending_delta(1, 10) == 0
+        await queue.close()
+
+    run(scenario())
+    assert flush.batches == [([(1, "Ten", 5, 10), (1, "eleven", 1, 11)],
+                              [(1, None, 10, 2), (1, None, 10, 3), (1, None, 11, 1)])]
+
+
+def test_a_locked_database_keeps_the_changes_for_the_next_flush():
+    flush = FlakyFlush(sqlite3.OperationalError("database is locked"))
+
+    async def scenario():
+        queue = PointWriteQueue(flush, flush_interval=60)
+        await queue.add(1, 10, "ten", 5)
+        await queue.add(1, 11, "eleven", 1)
+        waiter = asyncio.create_task(queue.add(1, 10, "ten", 3, durable=True))
+        await asyncio.sleep(0)
+
+        await queue.flush()
+        assert queue.failures == 1
+        assert not waiter.done()
+        assert queue.pending_delta(1, 10) == 8
+
+        # Queued while the batch was out, merged with it on the retry
+        await queue.add(1, 10, "ten", 1)
+        await queue.flush()
+        await asyncio.wait_for(waiter, 1)
+        assert queue.failures == 0
+        assert queue.transactions == 1
+        await queue.close()
+
+    run(scenario())
+    rows, ledger = flush.batches[0]
+    assert rows == [(1, "eleven", 1, 11), (1, "ten", 9, 10)]
+    assert ledger == [(1, None, 10, 5), (1, None, 11, 1), (1, None, 10, 3), (1, None, 10, 1)]
+
+
+def test_the_background_task_retries_on_its_own():
+    flush = FlakyFlush(sqlite3.OperationalError("database is locked"), sqlite3.OperationalError("database is busy"))
+
+    async def scenario():
+        queue = PointWriteQueue(flush, flush_interval=0.01)
+        await asyncio.wait_for(queue.add(1, 10, "ten", 5, durable=True), 2)
+        await queue.close()
+
+    run(scenario())
+    assert flush.batches == [([(1, "ten", 5, 10)], [(1, None, 10, 5)])]
+
+
+def test_other_errors_fail_the_waiting_callers():
+    flush = FlakyFlush(ValueError("bad row"))
+
+    async def scenario():
+        queue = PointWriteQueue(flush, flush_interval=0.01)
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(queue.add(1, 10, "ten", 5, durable=True), 2)
+        assert queue.pending_delta(1, 10) == 0
+        await queue.close()
+
+    run(scenario())
+    assert flush.batches == []
+
+
+def test_permanent_database_errors_are_not_retried():
+    flush = FlakyFlush(sqlite3.OperationalError("no such table: cutePoints"))
+
+    async def scenario():
+        queue = PointWriteQueue(flush, flush_interval=0.01)
+        with pytest.raises(sqlite3.OperationalError):
+            await asyncio.wait_for(queue.add(1, 10, "ten", 5, durable=True), 2)
+        assert queue.pending_delta(1, 10) == 0
+        assert queue.failures == 0
+        await queue.close()
+
+    run(scenario())
+    assert flush.batches == []
+
+
+def test_retries_stop_after_the_limit():
+    flush = FlakyFlush(*[sqlite3.OperationalError("database is locked")] * MAX_FLUSH_RETRIES)
+
+    async def scenario():
+        queue = PointWriteQueue(flush, flush_interval=60)
+        waiter = asyncio.create_task(queue.add(1, 10, "ten", 5, durable=True))
+        await asyncio.sleep(0)
+        for _ in range(MAX_FLUSH_RETRIES - 1):
+            await queue.flush()
+            assert not waiter.done()
+        await queue.flush()
+        with pytest.raises(sqlite3.OperationalError):
+            await asyncio.wait_for(waiter, 1)
+        assert queue.pending_delta(1, 10) == 0
+        await queue.close()
+
+    run(scenario())
+    assert flush.batches == []
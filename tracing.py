@@ -0,0 +1,284 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, ContextManager, Dict, Iterator, List, Optional
+
+# Spans a single trace may collect, further spans of e.g. a runaway loop are dropped
+MAX_SPANS_PER_TRACE = 1000
+
+_NOT_TRACED = nullcontext()
+
+
+class Span:
+    """
+    One timed step of a trace, e.g. a database query or an embed render.
+
+    Spans are written as one JSON object per line with OpenTelemetry's span field names, so the file can be read by
+    anything that understands those, or simply with jq.
+    """
+
+    __slots__ = ("name", "trace", "span_id", "parent_id", "start_ns", "started", "attributes", "status")
+
+    def __init__(self, name: str, trace: "_Trace", parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.started = time.perf_counter_ns()
+        self.attributes = attributes
+        self.status = "ok"
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Adds an attribute to the span.
+        """
+        self.attributes[key] = value
+
+    def to_dict(self, duration_ns: int) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.start_ns + duration_ns,
+            "duration_ms": round(duration_ns / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _Trace:
+    """
+    The spans of one trace, written together once its root span ends.
+    """
+
+    __slots__ = ("trace_id", "spans", "ended", "kept", "dropped")
+
+    def __init__(self) -> None:
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Dict[str, Any]] = []
+        # Whether the root span ended, and whether the trace was written then
+        self.ended = False
+        self.kept = False
+        self.dropped = 0
+
+
+_encode_json = json.JSONEncoder(default=str).encode
+
+
+class _SpanFormatter(logging.Formatter):
+    """
+    Encodes the spans of a record as JSON lines, on the writer thread.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        return "\n".join(map(_encode_json, record.msg))
+
+
+class _BatchingListener(logging.handlers.QueueListener):
+    """
+    A queue listener that merges every record waiting in the queue into one, so a busy bot writes its spans in a few
+    large writes instead of one flushed write per trace.
+    """
+
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        record = self.queue.get(block)
+        if record is self._sentinel:
+            return record
+        spans = list(record.msg)
+        while len(spans) < MAX_SPANS_PER_TRACE:
+            try:
+                following = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if following is self._sentinel:
+                # Stop after this batch
+                self.queue.put(following)
+                break
+            spans.extend(following.msg)
+        record.msg = spans
+        return record
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("owobot_current_span", default=None)
+
+
+class Tracer:
+    """
+    Records trace spans per interaction into a rotating file.
+
+    A root span starts when an interaction arrives, every span opened while handling it, in the same task or in
+    tasks it starts, becomes its child through a context variable. Spans opened outside of a trace are not recorded,
+    so background work costs nothing unless it starts its own root. When disabled, span() returns a shared no-op
+    context manager.
+
+    Spans are handed to a logging.handlers.QueueListener thread, which encodes and writes them to a
+    RotatingFileHandler, so the event loop never waits on the file.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = 10 * 1024 * 1024, backups: int = 5,
+                 min_duration: float = 0.0) -> None:
+        """
+        Initializes an instance of the Tracer.
+
+        Args:
+            path (Optional[str]): The file traces are written to, None disables tracing.
+            max_bytes (int): Size at which the file is rotated.
+            backups (int): Number of rotated files kept.
+            min_duration (float): Seconds a root span must take for its trace to be written, 0 writes every trace.
+        """
+        self.path = path
+        self.enabled = bool(path)
+        self.min_duration_ns = int(min_duration * 1e9)
+        self.written = 0
+        self._queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        self._listener: Optional[logging.handlers.QueueListener] = None
+        if self.enabled:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                           encoding="utf8")
+            handler.setFormatter(_SpanFormatter())
+            self._listener = _BatchingListener(self._queue, handler)
+            self._listener.start()
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        """
+        Creates a tracer configured by TRACE_FILE, TRACE_MAX_BYTES, TRACE_BACKUPS and TRACE_MIN_DURATION.
+
+        Returns:
+            Tracer: The tracer, disabled if TRACE_FILE is unset.
+        """
+        return cls(os.environ.get("TRACE_FILE") or None, int(os.environ.get("TRACE_MAX_BYTES", 10 * 1024 * 1024)),
+                   int(os.environ.get("TRACE_BACKUPS", 5)), float(os.environ.get("TRACE_MIN_DURATION", 0)))
+
+    def _emit(self, records: List[Dict[str, Any]]) -> None:
+        self.written += len(records)
+        self._queue.put(logging.makeLogRecord({"msg": records}))
+
+    def start_root(self, name: str, **attributes: Any) -> Optional[Span]:
+        """
+        Starts a new trace and makes its root span the current span of the calling context.
+
+        Args:
+            name (str): The name of the root span, e.g. 'command cute_give'.
+            **attributes: Attributes of the span.
+
+        Returns:
+            Optional[Span]: The root span, pass it to end(). None when tracing is disabled.
+        """
+        if not self.enabled:
+            return None
+        span = Span(name, _Trace(), None, attributes)
+        _current_span.set(span)
+        return span
+
+    def end(self, span: Optional[Span], status: str = "ok") -> None:
+        """
+        Ends a span. Ending a root span writes its trace, if it took at least the minimum duration.
+
+        Args:
+            span (Optional[Span]): The span, None is ignored.
+            status (str): 'ok', or how the step failed.
+        """
+        if span is None:
+            return
+        duration = time.perf_counter_ns() - span.started
+        span.status = status
+        trace = span.trace
+        if trace.ended:
+            # A child that outlived its root, e.g. a task the command started
+            if trace.kept:
+                self._emit([span.to_dict(duration)])
+        elif span.parent_id is not None:
+            if len(trace.spans) < MAX_SPANS_PER_TRACE:
+                trace.spans.append(span.to_dict(duration))
+            else:
+                trace.dropped += 1
+        else:
+            trace.ended = True
+            if duration >= self.min_duration_ns:
+                trace.kept = True
+                if trace.dropped:
+                    span.set("dropped_spans", trace.dropped)
+                self._emit([*trace.spans, span.to_dict(duration)])
+            trace.spans = []
+
+    @contextmanager
+    def _child(self, parent: Span, name: str, attributes: Dict[str, Any]) -> Iterator[Span]:
+        span = Span(name, parent.trace, parent.span_id, attributes)
+        token = _current_span.set(span)
+        status = "ok"
+        try:
+            yield span
+        except BaseException as ex:
+            status = type(ex).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end(span, status)
+
+    def span(self, name: str, **attributes: Any) -> ContextManager[Optional[Span]]:
+        """
+        Times a step of the current trace as a child span. Outside of a trace, or with tracing disabled, nothing is
+        recorded.
+
+        Args:
+            name (str): The name of the step, e.g. 'db get_rank'.
+            **attributes: Attributes of the span.
+
+        Returns:
+            ContextManager[Optional[Span]]: Yields the span, or None if it is not recorded.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return _NOT_TRACED
+        return self._child(parent, name, attributes)
+
+    def record(self, name: str, duration: float = 0.0, **attributes: Any) -> None:
+        """
+        Writes a single event that just ended as a span of its own trace, from any thread, e.g. an event loop stall.
+
+        Args:
+            name (str): The name of the event.
+            duration (float): Seconds the event lasted.
+            **attributes: Attributes of the event.
+        """
+        if self.enabled:
+            span = Span(name, _Trace(), None, attributes)
+            span.start_ns -= int(duration * 1e9)
+            self._emit([span.to_dict(int(duration * 1e9))])
+
+    def detach(self) -> None:
+        """
+        Takes the calling task out of the trace it inherited, for long-lived tasks that happen to be started while an
+        interaction is handled. Other tasks are unaffected, every task has its own copy of the context.
+        """
+        _current_span.set(None)
+
+    def current_trace_id(self) -> Optional[str]:
+        """
+        Returns the ID of the trace the calling context belongs to, to mention it in logs.
+        """
+        span = _current_span.get()
+        return span.trace.trace_id if span is not None else None
+
+    def close(self) -> None:
+        """
+        Writes the spans still queued and closes the file.
+        """
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+
+
+tracer = Tracer.from_env()
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from tracing import tracer
+
+# A single change as recorded in the ledger: (guild_id, giver_id, receiver_id, delta, created_at).
+LedgerEntry = Tuple[int, Optional[int], int, int, int]
+
+# Longest wait, in seconds, between retries of a flush that failed because the database was unavailable
+MAX_RETRY_INTERVAL = 5.0
+# Failed flushes in a row after which the pending changes are given up, about a minute and a half of retries
+MAX_FLUSH_RETRIES = 20
+
+# Receives the coalesced rows as (guild_id, name, delta, userid) and the uncoalesced ledger entries, and writes them
+# in one transaction.
+FlushCallback = Callable[[List[Tuple[int, str, int, int]], List[LedgerEntry]], Awaitable[None]]
+
+
+def _is_transient(ex: sqlite3.OperationalError) -> bool:
+    """
+    Returns whether an error means the database is only unavailable for now, as opposed to e.g. a missing table or a
+    failing disk.
+    """
+    message = str(ex).lower()
+    return "locked" in message or "busy" in message
+
+
+class PointWriteQueue:
+    """
+    An in-process queue that coalesces cute point changes before they reach the database.
+
+    Deltas for the same user are merged while they wait, and everything pending is written in a single transaction
+    once per tick or as soon as the number of pending users reaches the size limit. Every change is also kept
+    unmerged for the ledger. Callers that need to know the change is on disk can wait for a durable acknowledgement.
+    """
+
+    def __init__(self, flush: FlushCallback, flush_interval: float = 0.05, max_pending: int = 500) -> None:
+        """
+        Initializes an instance of the PointWriteQueue.
+
+        Args:
+            flush (FlushCallback): Coroutine that writes a batch of (guild_id, name, delta, userid) rows and the
+                                   ledger entries behind them.
+            flush_interval (float): How long, in seconds, changes may wait before being flushed.
+            max_pending (int): Number of distinct pending users that triggers an immediate flush.
+        """
+        self._flush = flush
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self._pending: Dict[Tuple[int, int], List] = {}
+        self._ledger: List[LedgerEntry] = []
+        self._waiters: List[asyncio.Future] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._closing = False
+
+        self.enqueued = 0
+        self.transactions = 0
+        # Flushes failed in a row, the queue waits longer between retries while the database is unavailable
+        self.failures = 0
+
+    def pending_delta(self, guild_id: int, user_id: int) -> int:
+        """
+        Returns the points change for a user that has not been written yet.
+
+        Args:
+            guild_id (int): The guild the points belong to.
+            user_id (int): The Discord user ID.
+
+        Returns:
+            int: The pending delta, 0 if nothing is queued for the user.
+        """
+        entry = self._pending.get((guild_id, user_id))
+        return entry[1] if entry else 0
+
+    def _ensure_started(self) -> None:
+        """
+        Starts the background flush task on the running loop if it is not running yet.
+        """
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._flush_loop(), name="owodb-write-queue")
+
+    async def add(self, guild_id: int, user_id: int, name: str, delta: int, durable: bool = False,
+                  giver_id: Optional[int] = None) -> None:
+        """
+        Queues a points change, merging it with any change already pending for the same user in the same guild.
+
+        Args:
+            guild_id (int): The guild the points belong to.
+            user_id (int): The Discord user ID.
+            name (str): The name stored if the user does not exist yet.
+            delta (int): The number of points to add, negative values take points away.
+            durable (bool): Wait until the change has been committed before returning.
+            giver_id (Optional[int]): The ID of the user who gave the points, recorded in the ledger.
+        """
+        self._ensure_started()
+        key = (guild_id, user_id)
+        entry = self._pending.get(key)
+        if entry:
+            entry[0] = name
+            entry[1] += delta
+        else:
+            self._pending[key] = [name, delta]
+        self._ledger.append((guild_id, giver_id, user_id, delta, int(time.time())))
+        self.enqueued += 1
+
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+        if durable:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            with tracer.span("write_queue wait", pending=len(self._pending)):
+                await waiter
+
+    async def flush(self) -> None:
+        """
+        Writes everything that is pending in a single transaction and resolves the waiting callers.
+
+        If the database is locked or busy, e.g. by another process, the changes stay queued and the callers keep
+        waiting for the next attempt, up to MAX_FLUSH_RETRIES attempts in a row. Any other error, or the last failed
+        attempt, drops the changes and fails the waiting callers.
+        """
+        if self._lock is None:
+            return
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            ledger, self._ledger = self._ledger, []
+            waiters, self._waiters = self._waiters, []
+            rows = [(guild_id, name, delta, user_id) for (guild_id, user_id), (name, delta) in pending.items()]
+
+            started = time.perf_counter()
+            try:
+                await self._flush(rows, ledger)
+            except Exception as ex:
+                if (isinstance(ex, sqlite3.OperationalError) and _is_transient(ex)
+                        and self.failures + 1 < MAX_FLUSH_RETRIES):
+                    # The changes go back into the queue and are retried
+                    self.failures += 1
+                    logging.error(f"Error flushing {len(rows)} point changes, retrying: {ex}")
+                    for key, (name, delta) in self._pending.items():
+                        entry = pending.get(key)
+                        if entry:
+                            entry[1] += delta
+                        else:
+                            pending[key] = [name, delta]
+                    self._pending = pending
+                    self._ledger = ledger + self._ledger
+                    self._waiters = waiters + self._waiters
+                    return
+                self.failures = 0
+                logging.error(f"Error flushing {len(rows)} point changes: {ex}")
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(ex)
+                return
+
+            self.failures = 0
+            self.transactions += 1
+            logging.debug(f"Flushed {len(rows)} point changes in {time.perf_counter() - started:.4f}s")
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def _flush_loop(self) -> None:
+        """
+        Background task flushing the queue every tick or whenever the size limit is hit.
+        """
+        # Started by whichever command queued the first change, the batches belong to no single trace
+        tracer.detach()
+        while not self._closing:
+            # Back off exponentially while flushes keep failing
+            timeout = min(self.flush_interval * 2 ** min(self.failures, 10), MAX_RETRY_INTERVAL)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def close(self) -> None:
+        """
+        Stops the background task after flushing whatever is still pending.
+        """
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await self.flush()
+        if self._pending:
+            logging.error(f"Discarding {len(self._pending)} point changes that could not be written.")
+            for waiter in self._waiters:
+                if not waiter.done():
+                    waiter.set_exception(RuntimeError("The write queue closed before the changes were written"))
+            self._waiters = []